@@ -0,0 +1,964 @@
+# ==============================================================================
+# ⏱️ BENCHMARKS E CONFERÊNCIAS DE DESEMPENHO
+# ==============================================================================
+# Rode esta célula depois da célula principal (main.py): usa as funções dela diretamente.
+import os
+import re
+import html
+import json
+import time
+import random
+import datetime
+import shutil
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from IPython.display import display, Markdown
+import pandas as pd
+import fitz  # pymupdf
+import gspread
+
+# ----------------------------
+# A. Leitura do status no HTML do portal
+# ----------------------------
+def _portal_page(situacao, label="Situação:", value_td=None, padding=400):
+    """Página no layout do portal (JSF): scripts, ViewState grande e a tabela de dados do processo."""
+    value_td = value_td if value_td is not None else f'<td class="valor">{situacao}</td>'
+    scripts = "".join(f'<script type="text/javascript">var cfg{i} = {{"a": {i}, "b": "<td>{i}</td>"}};</script>\n' for i in range(20))
+    campos = "".join(
+        f'<tr><td class="rotulo"><label for="f{i}">Campo {i}:</label></td><td class="valor">Valor {i} &amp; cia</td></tr>\n'
+        for i in range(padding // 20)
+    )
+    return f"""<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>PROA - Consulta Pública</title>
+<link type="text/css" rel="stylesheet" href="/pra-aj4/javax.faces.resource/theme.css" />
+<style>.rotulo {{ font-weight: bold; }} td.valor {{ color: #333; }}</style>
+{scripts}</head><body>
+<form id="formConsulta" method="post" action="/pra-aj4/public/proa_retorno_consulta_publica.xhtml">
+<input type="hidden" name="javax.faces.ViewState" value="{'x' * 20000}" />
+<table class="dados">
+<tr><td class="rotulo"><label>Número:</label></td><td class="valor">24/1900-0001234-5</td></tr>
+{campos}
+<tr><td class="rotulo"><label for="sit">{label}</label></td>{value_td}</tr>
+<tr><td class="rotulo"><label>Assunto:</label></td><td class="valor">Notificação</td></tr>
+</table></form></body></html>"""
+
+# Páginas de referência: o layout normal e as variações que já apareceram (ou que forçam o BeautifulSoup)
+STATUS_HTML_FIXTURES = {
+    "ativo": _portal_page("Ativo"),
+    "arquivado": _portal_page("Arquivado"),
+    "entidades": _portal_page("Em Tr&acirc;mita&ccedil;&atilde;o &amp; An&aacute;lise"),
+    "espacos": _portal_page("\n      Encerrado   \n   "),
+    "valor_com_span": _portal_page("", value_td='<td class="valor"><span class="st">Ativo</span> <b> (desde 2024)</b></td>'),
+    "valor_vazio": _portal_page("", value_td='<td class="valor">   </td>'),
+    "label_com_tag": _portal_page("Ativo", label="<b>Situação:</b>"),
+    "valor_com_comentario": _portal_page("", value_td='<td><!-- status -->Ativo</td>'),
+    "maiusculas": _portal_page("", value_td='<TD CLASS="valor">Suspenso</TD>'),
+    "sem_label": _portal_page("Ativo", label="Estado:"),
+}
+
+# Páginas reais do portal (capturar_pagina_portal): entram na conferência junto com as sintéticas acima
+def _pasta_capturas():
+    return os.path.join(CACHE_DIR, "portal_capturas")
+
+_RE_CELULA_ROTULADA = re.compile(r"(<label[^>]*>(.*?)</label>\s*</td>\s*<td[^>]*>)(.*?)(</td>)", re.I | re.S)
+_RE_ANONIMIZAR = [
+    (re.compile(r'(name="javax\.faces\.ViewState"[^>]*value=")[^"]*', re.I), r"\1x"),
+    (re.compile(r"\b\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}\b"), "00.000.000/0000-00"),
+    (re.compile(r"\b\d{3}\.\d{3}\.\d{3}-\d{2}\b"), "000.000.000-00"),
+    (re.compile(r"\b\d{2}/\d{4}-\d{7}-\d\b"), "00/0000-0000000-0"),
+    (re.compile(r"\b\d{15}\b"), "000000000000000"),
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "email@exemplo.com"),
+]
+
+def anonimizar_pagina_portal(html_text: str) -> str:
+    """
+    Tira da página capturada o que identifica o processo e as pessoas: ViewState, PROA, CNPJ/CPF, e-mails e o
+    texto de toda célula rotulada que não seja a Situação. Tags e atributos ficam como estão (é o layout que importa).
+    """
+    def celula(m):
+        if RE_SITUACAO_LABEL.search(html.unescape(re.sub(r"<[^>]+>", "", m.group(2)))): return m.group(0)
+        return m.group(1) + re.sub(r">[^<]+<", ">***<", f">{m.group(3)}<")[1:-1] + m.group(4)
+    html_text = _RE_CELULA_ROTULADA.sub(celula, html_text)
+    for regex, troca in _RE_ANONIMIZAR:
+        html_text = regex.sub(troca, html_text)
+    return html_text
+
+def capturar_pagina_portal(numero_proa: str, nome: str = None, pasta: str = None) -> str:
+    """Baixa a página do portal para um PROA (só dígitos), anonimiza e grava em `pasta`. Devolve o caminho."""
+    pasta = pasta or _pasta_capturas()
+    resposta = _get_proa_session().get(PROA_CONSULTA_URL, params={"numeroProcesso": numero_proa},
+                                       timeout=PROA_HTTP_TIMEOUT)
+    resposta.raise_for_status()
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{nome or 'captura'}_{datetime.date.today():%Y%m%d}.html")
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(anonimizar_pagina_portal(resposta.text))
+    return caminho
+
+def check_status_parsers(fixtures=STATUS_HTML_FIXTURES, pasta_capturas=None, exigir_iguais=True):
+    """
+    Confere se o caminho rápido dá o mesmo resultado do BeautifulSoup em cada página de referência: as sintéticas
+    e as capturadas do portal (nestas o BeautifulSoup também tem que achar a Situação, senão o layout mudou).
+    Com `exigir_iguais`, qualquer divergência levanta AssertionError.
+    """
+    paginas = [(nome, "sintética", page) for nome, page in fixtures.items()]
+    pasta_capturas = pasta_capturas or _pasta_capturas()
+    capturas = sorted(f for f in os.listdir(pasta_capturas) if f.endswith(".html")) if os.path.isdir(pasta_capturas) else []
+    for f in capturas:
+        with open(os.path.join(pasta_capturas, f), encoding="utf-8") as arq:
+            paginas.append((f, "capturada", arq.read()))
+    if not capturas:
+        print(f"⚠️ Nenhuma página real do portal em {pasta_capturas}: rode capturar_pagina_portal('<PROA>') uma vez.")
+    linhas = []
+    for nome, origem, page in paginas:
+        rapido = _parse_situacao_fast(page)
+        completo = _parse_situacao_soup(page)
+        ok = rapido is None or rapido == completo
+        if origem == "capturada": ok = ok and not completo.startswith("ERRO")
+        linhas.append({"fixture": nome, "origem": origem, "rapido": "(fallback)" if rapido is None else rapido,
+                       "bs4": completo, "ok": ok})
+    conferencia = pd.DataFrame(linhas)
+    if exigir_iguais and not conferencia["ok"].all():
+        divergentes = conferencia.loc[~conferencia["ok"], ["fixture", "rapido", "bs4"]].to_dict("records")
+        raise AssertionError(f"Leitura do status divergiu do BeautifulSoup: {divergentes}")
+    return conferencia
+
+def _timeit(fn, arg, repeat):
+    amostras = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        amostras.append(time.perf_counter() - t0)
+    return amostras
+
+def benchmark_status_parser(page=None, repeat=200):
+    """Tempo de leitura do status por página: caminho rápido x BeautifulSoup (mediana e p95, em ms)."""
+    page = page or STATUS_HTML_FIXTURES["ativo"]
+    linhas = []
+    for nome, fn in (("rapido", _parse_situacao_fast), ("bs4", _parse_situacao_soup)):
+        amostras = sorted(_timeit(fn, page, repeat))
+        linhas.append({"parser": nome, "mediana_ms": statistics.median(amostras) * 1000,
+                       "p95_ms": amostras[int(0.95 * (len(amostras) - 1))] * 1000, "tamanho_kb": len(page) / 1024})
+    df = pd.DataFrame(linhas).set_index("parser")
+    df.loc["rapido", "ganho"] = df.loc["bs4", "mediana_ms"] / df.loc["rapido", "mediana_ms"]
+    return df
+
+# ----------------------------
+# B. Corpus sintético de PDFs (mesmo seed -> mesmos arquivos, para comparar commits)
+# ----------------------------
+_EMPRESAS = ["CONSTRUTORA EXEMPLO", "OBRAS SUL", "ENGENHARIA GAÚCHA", "REFORMAS PAMPA", "EDIFICAÇÕES GUAÍBA",
+             "J.S. SERVIÇOS", "PREDIAL SERRA", "MANUTENÇÃO LITORAL"]
+_SUFIXOS = ["LTDA", "EIRELI", "S.A", "EPP"]
+_PENALIDADES = {
+    "multa": "aplicar multa de {p}% ({pe} por cento) sobre o valor do contrato",
+    "multa_cfil": ("aplicar multa de {p}% ({pe} por cento) sobre o valor do contrato, e impedimento no CFIL/RS, "
+                   "suspendendo o direito de licitar ou contratar com a Administração pelo prazo de {m} ({me}) meses"),
+    "advertencia": "aplicar a penalidade de advertência à contratada",
+    "nao_aplicacao": "pela não aplicação de penalidade, arquivando-se o feito",
+}
+_EXTENSO = {1: "um", 2: "dois", 3: "três", 4: "quatro", 5: "cinco", 6: "seis", 8: "oito", 10: "dez"}
+
+def _textbox(page, texto, fontsize=9):
+    """Escreve o texto na área útil da página, diminuindo a fonte se não couber."""
+    while page.insert_textbox(fitz.Rect(50, 50, 550, 700), texto, fontsize=fontsize) < 0 and fontsize > 4:
+        fontsize -= 1
+
+def _rodape(page, texto):
+    # Abaixo de 85% da altura: é onde _footer_date_from_page procura a data
+    page.insert_text((50, page.rect.height * 0.92), texto, fontsize=8)
+
+def _data(rng, ano):
+    return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{ano}"
+
+def _contraexemplo_regioes(pasta):
+    """
+    PDF em que o primeiro achado nas PDF_PAGINAS_INICIO primeiras páginas NÃO é a resposta do documento inteiro:
+    "contra empresa XYZ" (M2) e contrato genérico na capa, e a frase de intenção (M1) com a empresa certa, o CNPJ e
+    o contrato emergencial na página 5. Um modo "lazy" que aceite o achado do início diverge do "full" em empresa,
+    CNPJ e contrato. O PROA mais antigo da página 4 fica fora de PDF_PAGINAS_PROA_MAE: os dois modos dão o da capa.
+    """
+    proa, mae_recente, mae_antigo = "23/1900-0000111-1", "22/1900-0000333-3", "19/1900-0000222-2"
+    textos = [
+        f"TERMO DE ABERTURA\nProcesso {proa}\nReferente ao processo {mae_recente}\nNotificação contra empresa XYZ, "
+        "referente ao CONTRATO DE PRESTAÇÃO DE SERVIÇOS Nº 12/2023\n",
+        f"Andamento 1 do processo {proa}.", f"Andamento 2 do processo {proa}.",
+        f"Apensado o processo {mae_antigo}.",
+        "Considerando a intenção de instaurar procedimento notificatório contra a empresa ACME CONSTRUCOES LTDA, "
+        "inscrita no CNPJ sob o nº 11.222.333/0001-44, sediada em Porto Alegre.\n"
+        "TERMO DE CONTRATO EMERGENCIAL DE OBRAS E SERVIÇOS DE ENGENHARIA Nº 7/2022\n",
+        f"EXPEDIENTE Nº {proa}\nEm análise aos autos e considerando as razões fáticas e contratuais, decido "
+        "aplicar a penalidade de advertência à contratada.\n",
+        "Encaminhamento final ao setor responsável.",
+    ]
+    doc = fitz.open()
+    for i, texto in enumerate(textos):
+        pg = doc.new_page()
+        _textbox(pg, texto)
+        _rodape(pg, "Porto Alegre, 10/03/2024" if i == 5 else "Assinado 15/04/2024" if i == len(textos) - 1
+                else f"Página {i + 1} de {len(textos)}")
+    nome = re.sub(r"\D", "", proa) + ".pdf"
+    doc.save(os.path.join(pasta, nome))
+    doc.close()
+    return {"arquivo": nome, "proa": proa, "paginas": len(textos), "tipo": "advertencia",
+            "data_expediente": "10/03/2024", "ultima_atualizacao": "15/04/2024"}
+
+def gerar_corpus_sintetico(pasta, n_docs=20, paginas=(6, 40), seed=42, contraexemplos=False):
+    """
+    Gera `n_docs` PDFs de expediente no formato dos processos (TERMO DE ABERTURA, páginas de andamento,
+    EXPEDIENTE com a penalidade e data no rodapé, última página com data). `paginas` é um número fixo
+    ou um intervalo (mín, máx). Com `contraexemplos`, acrescenta os PDFs de _contraexemplo_regioes (os do seed
+    não mudam). Devolve a lista de dicionários com o que foi escrito em cada arquivo.
+    """
+    rng = random.Random(seed)
+    os.makedirs(pasta, exist_ok=True)
+    gerados = []
+    for i in range(n_docs):
+        ano = rng.choice([22, 23, 24, 25])
+        proa = f"{ano}/1900-{rng.randint(1, 9_999_999):07d}-{rng.randint(0, 9)}"
+        mae = f"{ano - 1}/1900-{rng.randint(1, 9_999_999):07d}-{rng.randint(0, 9)}"
+        empresa = f"{rng.choice(_EMPRESAS)} {rng.choice(_SUFIXOS)}"
+        cnpj = "".join(str(rng.randint(0, 9)) for _ in range(14))
+        cnpj_fmt = f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+        contrato = f"{rng.randint(1, 999)}/20{ano - 1}"
+        n_pag = paginas if isinstance(paginas, int) else rng.randint(*paginas)
+        n_pag = max(3, n_pag)
+        tipo = rng.choice(list(_PENALIDADES))
+        p, m = rng.choice([2, 5, 10]), rng.choice([1, 2, 3, 6, 8])
+        data_exp, data_ult = _data(rng, 2000 + ano), _data(rng, 2000 + ano + 1)
+
+        doc = fitz.open()
+        capa = doc.new_page()
+        clausula = (f"TERMO DE CONTRATO EMERGENCIAL DE OBRAS E SERVIÇOS DE ENGENHARIA Nº {contrato}" if rng.random() < 0.5
+                    else f"CONTRATO DE PRESTAÇÃO DE SERVIÇOS Nº {contrato}")
+        _textbox(capa, f"TERMO DE ABERTURA\nProcesso {proa}\nReferente ao processo {mae}\n"
+                       f"Considerando a intenção de instaurar procedimento notificatório contra a empresa {empresa}, "
+                       f"inscrita no CNPJ sob o nº {cnpj_fmt}, sediada em Porto Alegre.\n{clausula}\n")
+        _rodape(capa, f"Documento assinado em {_data(rng, 2000 + ano)}")
+
+        pagina_exp = rng.randint(1, n_pag - 2)
+        for j in range(1, n_pag - 1):
+            pg = doc.new_page()
+            if j == pagina_exp:
+                decisao = _PENALIDADES[tipo].format(p=p, pe=_EXTENSO.get(p, str(p)), m=m, me=_EXTENSO.get(m, str(m)))
+                _textbox(pg, f"EXPEDIENTE Nº {proa}\nEm análise aos autos e considerando as razões fáticas e "
+                             f"contratuais, decido {decisao}.\n")
+                _rodape(pg, f"Porto Alegre, {data_exp}")
+            else:
+                _textbox(pg, f"Andamento {j} do processo {proa}. " + "Texto de preenchimento do processo. " * 30, fontsize=8)
+                _rodape(pg, f"Página {j + 1} de {n_pag}")
+        fim = doc.new_page()
+        _textbox(fim, "Encaminhamento final ao setor responsável.")
+        _rodape(fim, f"Assinado {data_ult}")
+
+        nome = re.sub(r"\D", "", proa) + ".pdf"
+        doc.save(os.path.join(pasta, nome))
+        doc.close()
+        gerados.append({"arquivo": nome, "proa": proa, "paginas": n_pag, "tipo": tipo, "data_expediente": data_exp,
+                        "ultima_atualizacao": data_ult})
+    if contraexemplos:
+        gerados.append(_contraexemplo_regioes(pasta))
+    return gerados
+
+# ----------------------------
+# C. Tempo por extrator
+# ----------------------------
+def _percentil(amostras, q):
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, int(round(q * (len(ordenadas) - 1))))] if ordenadas else float("nan")
+
+def _cronometrar(tempos, etapa, fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    tempos.setdefault(etapa, []).append(time.perf_counter() - t0)
+    return out
+
+def _tempos_documento(pdf_path, tempos):
+    """Percorre a extração na mesma ordem de extract_fields_from_pdf, cronometrando cada etapa."""
+    doc = _cronometrar(tempos, "abrir_pdf", PdfSession, pdf_path)
+    with doc:
+        regioes = DocumentRegions(doc)
+        _cronometrar(tempos, "texto_pdf", regioes.engine, CAMPO_REGIAO["proa_notificatorio"])
+        proa = _cronometrar(tempos, "proa_notificatorio", regioes.extrair, "proa_notificatorio", get_proa_notificatorio)
+        _cronometrar(tempos, "numero_contrato", regioes.extrair, "numero_contrato", get_numero_contrato)
+        _cronometrar(tempos, "nome_empresa", regioes.extrair, "nome_empresa", get_nome_empresa)
+        _cronometrar(tempos, "cnpj_empresa", regioes.extrair, "cnpj_empresa", get_cnpj_empresa)
+        _cronometrar(tempos, "proa_mae", regioes.extrair, "proa_mae", get_proa_mae, proa)
+        exp_text, _ = _cronometrar(tempos, "expediente_pagina_rodape", get_expediente_text_and_date, doc, proa)
+        _cronometrar(tempos, "tipo_penalidade", get_tipo_penalidade, exp_text)
+        _cronometrar(tempos, "percentual_multa", get_percentual_multa, exp_text)
+        _cronometrar(tempos, "impedimentos", get_impedimentos, exp_text)
+        _cronometrar(tempos, "penalidade_meses", get_penalidade_meses, exp_text)
+        _cronometrar(tempos, "ultima_atualizacao_processo", get_ultima_atualizacao_processo, doc)
+    _cronometrar(tempos, "extract_fields_from_pdf", extract_fields_from_pdf, pdf_path, None, False)
+
+def benchmark_extractors(pasta, repeticoes=3):
+    """Latência por extrator (p50/p90/p99 em ms) e documentos por segundo de extract_fields_from_pdf."""
+    arquivos = sorted(f for f in os.listdir(pasta) if f.lower().endswith(".pdf"))
+    tempos = {}
+    for _ in range(repeticoes):
+        for f in arquivos:
+            _tempos_documento(os.path.join(pasta, f), tempos)
+    linhas = []
+    for etapa, amostras in tempos.items():
+        linhas.append({"etapa": etapa, "n": len(amostras), "p50_ms": _percentil(amostras, 0.5) * 1000,
+                       "p90_ms": _percentil(amostras, 0.9) * 1000, "p99_ms": _percentil(amostras, 0.99) * 1000,
+                       "total_s": sum(tempos[etapa])})
+    df = pd.DataFrame(linhas).set_index("etapa")
+    docs_s = len(tempos["extract_fields_from_pdf"]) / df.loc["extract_fields_from_pdf", "total_s"]
+    return df, docs_s
+
+def benchmark_page_modes(pasta, modos=("full", "lazy"), repeticoes=2, exigir_iguais=True):
+    """
+    Compara os modos de leitura de páginas (PDF_TEXT_MODE) documento a documento: latência, pico de memória
+    Python (tracemalloc: cobre os textos decodificados, não os buffers internos do PyMuPDF), páginas decodificadas
+    e se os campos batem com o primeiro modo. Devolve (resumo por modo, detalhe por documento).
+    Com `exigir_iguais`, um campo diferente entre os modos levanta AssertionError (com o campo e os valores), assim
+    como um "lazy" que não decodifique menos páginas que o "full" num corpus com PDFs maiores que o início.
+    """
+    arquivos = sorted(f for f in os.listdir(pasta) if f.lower().endswith(".pdf"))
+    linhas = []
+    for f in arquivos:
+        caminho = os.path.join(pasta, f)
+        referencia = None
+        for modo in modos:
+            tempos = []
+            for _ in range(repeticoes):
+                with PdfSession(caminho) as doc:
+                    tracemalloc.start()
+                    t0 = time.perf_counter()
+                    campos = extract_fields_from_pdf(caminho, doc, False, None, modo)
+                    tempos.append(time.perf_counter() - t0)
+                    pico = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    paginas_lidas, paginas = len(doc._text), doc.page_count
+            campos.pop("ultima_analise_feita", None)
+            referencia = referencia or campos
+            diferentes = {c: (referencia.get(c), v) for c, v in campos.items() if referencia.get(c) != v}
+            linhas.append({"arquivo": f, "modo": modo, "paginas": paginas, "paginas_decodificadas": paginas_lidas,
+                           "ms": min(tempos) * 1000, "pico_kb": pico / 1024, "igual": not diferentes,
+                           "diferencas": diferentes})
+    detalhe = pd.DataFrame(linhas)
+    if exigir_iguais and not detalhe["igual"].all():
+        divergentes = detalhe.loc[~detalhe["igual"], ["arquivo", "modo", "diferencas"]].to_dict("records")
+        raise AssertionError(f"Modos de página com campos diferentes: {divergentes}")
+    lidas = detalhe.groupby("modo")["paginas_decodificadas"].sum()
+    if (exigir_iguais and {"full", "lazy"} <= set(modos) and (detalhe["paginas"] > PDF_PAGINAS_INICIO).any()
+            and lidas["lazy"] >= lidas["full"]):
+        raise AssertionError(f"Modo lazy não economizou páginas: {lidas['lazy']} decodificadas vs {lidas['full']} no full")
+    resumo = detalhe.groupby("modo").agg(docs=("arquivo", "count"), paginas=("paginas", "sum"),
+                                         paginas_decodificadas=("paginas_decodificadas", "sum"),
+                                         p50_ms=("ms", "median"), total_ms=("ms", "sum"),
+                                         pico_kb_p50=("pico_kb", "median"), pico_kb_max=("pico_kb", "max"),
+                                         divergentes=("igual", lambda x: int((~x).sum())))
+    return resumo.reindex(list(modos)), detalhe
+
+# ----------------------------
+# D. Execução ponta a ponta com Sheets, Drive e portal falsos (sem rede)
+# ----------------------------
+class FakeWorksheet:
+    """Aba em memória com o que o pipeline usa (leitura do gspread_dataframe, batch_update, clear/resize)."""
+    def __init__(self, title="TABELA"):
+        self.title, self.grid, self.spreadsheet = title, [], None
+        self.chamadas = {}
+
+    def _conta(self, nome):
+        self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+
+    @property
+    def row_count(self): return len(self.grid)
+    @property
+    def col_count(self): return max((len(r) for r in self.grid), default=0)
+
+    def _set(self, r, c, v):
+        while len(self.grid) < r: self.grid.append([""] * self.col_count)
+        row = self.grid[r - 1]
+        while len(row) < c: row.append("")
+        row[c - 1] = v
+
+    def row_values(self, i):
+        self._conta("row_values")
+        return list(self.grid[i - 1]) if i <= len(self.grid) else []
+    def add_rows(self, n):
+        self._conta("add_rows")
+        self.grid += [[""] * self.col_count for _ in range(n)]
+    def batch_update(self, updates, value_input_option=None):
+        self._conta("batch_update")
+        for u in updates:
+            r0, c0 = gspread.utils.a1_to_rowcol(u["range"].split(":")[0])
+            for i, vals in enumerate(u["values"]):
+                for j, v in enumerate(vals): self._set(r0 + i, c0 + j, v)
+    def update_cells(self, cells, value_input_option=None):
+        self._conta("update_cells")
+        for c in cells: self._set(c.row, c.col, c.value)
+    def update(self, values):
+        self._conta("update")
+        self.grid = [list(v) for v in values]
+    def clear(self):
+        self._conta("clear")
+        self.grid = [[""] * self.col_count for _ in self.grid]
+    def resize(self, rows=None, cols=None):
+        self._conta("resize")
+        if rows is not None: self.grid = self.grid[:rows] + [[""] * self.col_count for _ in range(rows - len(self.grid))]
+        if cols is not None: self.grid = [(r + [""] * cols)[:cols] for r in self.grid]
+
+def _como_sheets_devolve(v, datas_serial):
+    """
+    Valor digitado (USER_ENTERED, planilha em pt-BR) como o Sheets devolve lido com FORMULA: fórmula como texto,
+    número sem formatação, percentual como fração e data como número de série (ou o texto, com FORMATTED_STRING).
+    """
+    if not isinstance(v, str) or not v.strip() or v.startswith("="): return v
+    t = v.strip()
+    if re.fullmatch(r"\d{2}/\d{2}/\d{4}", t) and _parse_br_date(t):
+        return (_parse_br_date(t) - SHEET_DIA_ZERO).days if datas_serial else t
+    numero = _br_number(t[:-1] if t.endswith("%") else t)
+    if numero is None: return v
+    if t.endswith("%"): return numero / 100
+    return int(numero) if numero.is_integer() else numero
+
+class FakeSpreadsheet:
+    """values_get devolve a aba como o Sheets (ver _como_sheets_devolve); datas_como_serial imita o padrão da API."""
+    def __init__(self):
+        self.abas, self.leituras = {}, 0
+        self.datas_como_serial = False
+    def worksheet(self, nome):
+        if nome not in self.abas: raise gspread.exceptions.WorksheetNotFound(nome)
+        return self.abas[nome]
+    def add_worksheet(self, title, rows=1, cols=1):
+        ws = FakeWorksheet(title)
+        ws.spreadsheet = self
+        self.abas[title] = ws
+        return ws
+    def values_get(self, rng, params=None):
+        self.leituras += 1
+        ws = self.abas[rng.strip("'")]
+        serial = self.datas_como_serial or (params or {}).get("dateTimeRenderOption") != "FORMATTED_STRING"
+        grid = [[_como_sheets_devolve(v, serial) for v in r] for r in ws.grid]
+        while grid and not any(v != "" for v in grid[-1]): grid.pop()
+        return {"values": grid}
+
+class FakeGspreadClient:
+    def __init__(self):
+        self.planilha = FakeSpreadsheet()
+    def open(self, nome):
+        return self.planilha
+
+def check_write_sheet_diff():
+    """
+    Escrita por diferença contra a aba falsa, com as datas lidas como texto e como número de série: linhas novas
+    no fim, nada reescrito quando nada mudou (datas, percentuais e valores relidos do Sheets), só a célula alterada
+    quando uma muda e a linha que saiu do resultado limpa no lugar. Qualquer desvio levanta AssertionError.
+    """
+    def linha(proa, **campos):
+        base = {c: "" for c in COLUMNS}
+        base.update({"numero_contrato": "12/2023", "nome_empresa": "CONSTRUTORA EXEMPLO LTDA", "proa_notificatorio": proa,
+                     "status_processo": "Ativo", "valor_contrato_consolidado": "R$ 1.234,50", "tipo_penalidade": "multa",
+                     "percentual_multa": "5%", "impedimentos": "X", "penalidade_meses": "6", "data_penalizacao": "10/03/2024",
+                     "ultima_analise_feita": "01/06/2024", "ultima_atualizacao_processo": "15/04/2024"})
+        base.update(campos)
+        return base
+
+    resultados = []
+    for serial in (False, True):
+        gc_fake = FakeGspreadClient()
+        gc_fake.planilha.datas_como_serial = serial
+        ws = gc_fake.planilha.add_worksheet(GSHEET_WORKSHEET_NAME)
+        ws.update([COLUMNS])
+        passos = []
+
+        def escreve(df_new, esperado):
+            snapshot = read_worksheet(ws, COLUMNS)
+            resumo = write_sheet_diff(ws, snapshot, df_new)
+            obtido = {k: resumo[k] for k in esperado}
+            passos.append({"datas_serial": serial, **{k: v for k, v in resumo.items() if k != "linhas"}})
+            if obtido != esperado:
+                raise AssertionError(f"write_sheet_diff (datas_serial={serial}): esperado {esperado}, veio {obtido}")
+            return resumo
+
+        df = pd.DataFrame([linha("24/1900-0001234-5"), linha("23/1900-0007777-2"), linha("25/1900-0005555-5")])
+        escreve(df, {"linhas_novas": 3, "linhas_limpas": 0, "linhas": [2, 3, 4]})
+        escreve(df, {"celulas": 0, "intervalos": 0})
+        # Uma linha muda de status, a do meio sai do resultado e entra um processo novo
+        df = pd.DataFrame([linha("24/1900-0001234-5", status_processo="Arquivado"), linha("25/1900-0005555-5"),
+                           linha("22/1900-0003333-3", data_penalizacao="01/02/2024")])
+        limpas = sum(1 for v in linha("23/1900-0007777-2").values() if v)
+        escreve(df, {"celulas": 1 + limpas + len(COLUMNS), "linhas_novas": 1, "linhas_limpas": 1, "linhas": [2, 4, 5]})
+        if any(ws.grid[2]) or ws.grid[1][COLUMNS.index("status_processo")] != "Arquivado" or \
+           ws.grid[4][COLUMNS.index("proa_notificatorio")] != "22/1900-0003333-3":
+            raise AssertionError(f"write_sheet_diff (datas_serial={serial}): aba final errada: {ws.grid}")
+        resultados += passos
+    return pd.DataFrame(resultados)
+
+class _FakeRequest:
+    def __init__(self, resposta, erro=None): self.resposta, self.erro = resposta, erro
+    def execute(self):
+        if self.erro: raise self.erro
+        return self.resposta
+
+class FakeDriveService:
+    """
+    drive.files().list(...) paginado sobre arquivos em memória (começa com os PDFs de uma pasta local).
+    Aplica as cláusulas de `q` que o DriveIndex usa (pasta, modifiedTime >, mimeType, trashed) e recusa as outras.
+    adicionar/alterar mudam os arquivos (renomear, lixeira, mover de pasta); falhar(pagina, vezes) faz a página dar erro.
+    """
+    MODIFICADO = "2024-01-01T00:00:00.000Z"
+    _CLAUSULAS = [
+        (re.compile(r"'([^']+)' in parents"), lambda f, v: v in f["parents"]),
+        (re.compile(r"modifiedTime > '([^']+)'"), lambda f, v: f["modifiedTime"][:19] > v[:19]),
+        (re.compile(r"mimeType\s*=\s*'([^']+)'"), lambda f, v: f["mimeType"] == v),
+        (re.compile(r"trashed\s*=\s*(true|false)"), lambda f, v: f["trashed"] == (v == "true")),
+    ]
+
+    def __init__(self, pasta=None, page_size=100, pasta_id=None):
+        self.page_size, self.pasta_id = page_size, pasta_id or FOLDER_ID_DRIVE
+        self.arquivos, self.consultas, self._falhas = {}, [], {}
+        for nome in sorted(f for f in os.listdir(pasta) if f.lower().endswith(".pdf")) if pasta else []:
+            self.adicionar(nome)
+
+    def adicionar(self, nome, modificado=MODIFICADO, mime="application/pdf") -> str:
+        id_ = f"id-{nome}"
+        self.arquivos[id_] = {"id": id_, "name": nome, "mimeType": mime, "trashed": False, "parents": [self.pasta_id],
+                              "webViewLink": f"https://drive.google.com/file/d/{id_}/view", "modifiedTime": modificado}
+        return id_
+
+    def alterar(self, id_, modificado=None, **campos):
+        """Muda name/trashed/parents...; sem `modificado` o modifiedTime fica como estava."""
+        self.arquivos[id_].update(campos)
+        if modificado: self.arquivos[id_]["modifiedTime"] = modificado
+
+    def falhar(self, pagina=0, vezes=1):
+        self._falhas[pagina] = vezes
+
+    def _atende(self, f, q):
+        for clausula in (q.split(" and ") if q else []):
+            for regex, teste in self._CLAUSULAS:
+                m = regex.fullmatch(clausula.strip())
+                if m: break
+            else:
+                raise ValueError(f"Cláusula que o Drive falso não entende: {clausula!r}")
+            if not teste(f, m.group(1)): return False
+        return True
+
+    def files(self):
+        return self
+
+    def list(self, q=None, fields=None, pageSize=None, pageToken=None):
+        self.consultas.append(q)
+        inicio = int(pageToken or 0)
+        pagina = inicio // self.page_size
+        if self._falhas.get(pagina):
+            self._falhas[pagina] -= 1
+            return _FakeRequest(None, IOError(f"falha simulada na página {pagina}"))
+        arquivos = sorted((f for f in self.arquivos.values() if self._atende(f, q)), key=lambda f: (f["modifiedTime"], f["id"]))
+        resposta = {"files": [dict(f) for f in arquivos[inicio:inicio + self.page_size]]}
+        if inicio + self.page_size < len(arquivos): resposta["nextPageToken"] = str(inicio + self.page_size)
+        return _FakeRequest(resposta)
+
+class _TempoSemEspera:
+    """`time` sem as esperas entre tentativas (o resto é o módulo de verdade)."""
+    def __init__(self, modulo): self._modulo = modulo
+    def __getattr__(self, nome): return getattr(self._modulo, nome)
+    @staticmethod
+    def sleep(segundos): pass
+
+def check_drive_index():
+    """
+    Sincronizações do DriveIndex contra o Drive falso, conferindo o mapa final e a marca d'água de cada caminho:
+    lista completa, incremental (filtro por modifiedTime e janela de sobreposição), renomear, lixeira, mover de pasta,
+    página que falha e volta, incremental que falha (relista tudo) e lista completa que falha (fica o índice salvo).
+    Qualquer desvio levanta AssertionError.
+    """
+    pasta_id = "pasta-teste"
+    drive = FakeDriveService(page_size=2, pasta_id=pasta_id)
+    caminho = os.path.join(tempfile.mkdtemp(prefix="proa_drive_"), "drive_index.sqlite")
+    g = globals()
+    tempo_original = g["time"]
+    g["time"] = _TempoSemEspera(tempo_original)
+    passos = []
+    try:
+        indice = DriveIndex(caminho)
+
+        def sincroniza(passo, esperado, marca, consulta, **kw):
+            antes = len(drive.consultas)
+            mapa = {nome: meta["modifiedTime"][11:19] for nome, meta in indice.sync(drive, pasta_id, **kw).items()}
+            feitas = drive.consultas[antes:]
+            tipo = "completa" if feitas and "trashed=false" in feitas[-1] else "incremental"
+            passos.append({"passo": passo, "consultas": len(feitas), "ultima": tipo, "arquivos": len(mapa),
+                           "marca": indice._get_estado("ultima_modificacao")})
+            erros = []
+            if mapa != esperado: erros.append(f"mapa {mapa} != {esperado}")
+            if marca is not None and indice._get_estado("ultima_modificacao") != marca:
+                erros.append(f"marca {indice._get_estado('ultima_modificacao')} != {marca}")
+            if tipo != consulta: erros.append(f"consulta {tipo} != {consulta}")
+            if erros: raise AssertionError(f"DriveIndex ({passo}): {'; '.join(erros)}")
+            return feitas
+
+        t = lambda hms: f"2024-05-01T{hms}.000Z"
+        for nome, hms in (("a.pdf", "10:00:00"), ("b.pdf", "10:01:00"), ("c.pdf", "10:02:00")):
+            drive.adicionar(nome, t(hms))
+        drive.adicionar("nota.txt", t("10:02:30"), mime="text/plain")
+        sincroniza("lista completa", {"a.pdf": "10:00:00", "b.pdf": "10:01:00", "c.pdf": "10:02:00"}, t("10:02:00"), "completa")
+
+        # A incremental não filtra tipo: a marca anda até o .txt, que não entra no mapa
+        feitas = sincroniza("incremental sem mudança", {"a.pdf": "10:00:00", "b.pdf": "10:01:00", "c.pdf": "10:02:00"},
+                            t("10:02:30"), "incremental")
+        desde = (datetime.datetime(2024, 5, 1, 10, 2) - datetime.timedelta(seconds=DRIVE_SYNC_SOBREPOSICAO_SEG))
+        if f"modifiedTime > '{desde:%Y-%m-%dT%H:%M:%S}'" not in feitas[0]:
+            raise AssertionError(f"DriveIndex: consulta incremental sem a janela de sobreposição: {feitas[0]}")
+
+        # Chega atrasado com modifiedTime dentro da janela: a incremental pega; fora dela, só relistando
+        drive.adicionar("d.pdf", t("10:01:45"))
+        sincroniza("dentro da sobreposição", {"a.pdf": "10:00:00", "b.pdf": "10:01:00", "c.pdf": "10:02:00", "d.pdf": "10:01:45"},
+                   t("10:02:30"), "incremental")
+        drive.adicionar("e.pdf", t("09:00:00"))
+        sincroniza("fora da sobreposição (faltando na pasta local)",
+                   {"a.pdf": "10:00:00", "b.pdf": "10:01:00", "c.pdf": "10:02:00", "d.pdf": "10:01:45", "e.pdf": "09:00:00"},
+                   t("10:02:00"), "completa", expected_names=["a.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf"])
+
+        drive.alterar("id-b.pdf", t("10:03:00"), name="b_v2.pdf")
+        drive.alterar("id-c.pdf", t("10:04:00"), trashed=True)
+        sincroniza("renomear e lixeira", {"a.pdf": "10:00:00", "b_v2.pdf": "10:03:00", "d.pdf": "10:01:45", "e.pdf": "09:00:00"},
+                   t("10:04:00"), "incremental")
+
+        # Mover de pasta não muda o modifiedTime nem aparece na consulta da pasta: quem denuncia é a pasta local
+        drive.alterar("id-a.pdf", parents=["outra-pasta"])
+        locais = ["b_v2.pdf", "d.pdf", "e.pdf"]
+        sincroniza("mover de pasta", {"b_v2.pdf": "10:03:00", "d.pdf": "10:01:45", "e.pdf": "09:00:00"},
+                   t("10:03:00"), "completa", expected_names=locais)
+
+        for nome, hms in (("f.pdf", "10:05:00"), ("g.pdf", "10:06:00"), ("h.pdf", "10:07:00")):
+            drive.adicionar(nome, t(hms))
+        locais += ["f.pdf", "g.pdf", "h.pdf"]
+        drive.falhar(pagina=1, vezes=DRIVE_PAGE_RETRIES - 1)
+        esperado = {"b_v2.pdf": "10:03:00", "d.pdf": "10:01:45", "e.pdf": "09:00:00",
+                    "f.pdf": "10:05:00", "g.pdf": "10:06:00", "h.pdf": "10:07:00"}
+        falhas_antes = METRICS.contadores.get("drive.falhas_pagina", 0)
+        sincroniza("página falha e volta", esperado, t("10:07:00"), "incremental", expected_names=locais)
+        if METRICS.contadores.get("drive.falhas_pagina", 0) - falhas_antes != DRIVE_PAGE_RETRIES - 1:
+            raise AssertionError("DriveIndex: a página que falhou não foi tentada de novo")
+
+        drive.adicionar("i.pdf", t("10:08:00"))
+        locais.append("i.pdf")
+        drive.falhar(pagina=0, vezes=DRIVE_PAGE_RETRIES)
+        sincroniza("incremental falha, relista", {**esperado, "i.pdf": "10:08:00"}, t("10:08:00"), "completa",
+                   expected_names=locais)
+
+        drive.adicionar("j.pdf", t("10:09:00"))
+        drive.falhar(pagina=0, vezes=DRIVE_PAGE_RETRIES)
+        sincroniza("lista completa falha, fica o índice salvo", {**esperado, "i.pdf": "10:08:00"}, t("10:08:00"),
+                   "completa", force_full=True)
+        indice.close()
+    finally:
+        g["time"] = tempo_original
+        shutil.rmtree(os.path.dirname(caminho), ignore_errors=True)
+    return pd.DataFrame(passos)
+
+def check_drive_links():
+    """
+    apply_drive_links com nomes de arquivo de cada tipo: PROA inteiro no nome, nome só com a cauda do PROA (sem o
+    ano) e o mesmo número de outro ano, que não pode virar link. Qualquer desvio levanta AssertionError.
+    """
+    casos = [
+        ("nome com o PROA inteiro", "23/1900-0001234-5", {"23190000012345.pdf": "LINK23"}, "LINK23"),
+        ("nome sem o ano", "23/1900-0001234-5", {"1900-0001234-5.pdf": "LINK_CAUDA"}, "LINK_CAUDA"),
+        ("só o PROA de outro ano", "23/1900-0001234-5", {"24/1900-0001234-5.pdf": "LINK24"}, None),
+        ("PROA de outro ano ao lado do certo", "23/1900-0001234-5",
+         {"24/1900-0001234-5.pdf": "LINK24", "23-1900-0001234-5.pdf": "LINK23"}, "LINK23"),
+    ]
+    linhas = []
+    for caso, proa, arquivos, esperado in casos:
+        df = pd.DataFrame([{"proa_notificatorio": proa, "nome_empresa": "CONSTRUTORA EXEMPLO LTDA"}])
+        saida, sem_link = apply_drive_links(df, arquivos, return_unmatched=True)
+        celulas = (saida.at[0, "proa_notificatorio"], saida.at[0, "nome_empresa"])
+        if esperado is None:
+            ok = celulas == (proa, "CONSTRUTORA EXEMPLO LTDA") and sem_link == [0]
+        else:
+            ok = all(c.startswith(f'=HYPERLINK("{esperado}"; ') for c in celulas) and sem_link == []
+        if not ok:
+            raise AssertionError(f"Links do Drive ({caso}): esperado {esperado!r}, veio {celulas} (sem link: {sem_link})")
+        linhas.append({"caso": caso, "proa": proa, "arquivos": ", ".join(arquivos), "link": esperado or "", "ok": ok})
+    return pd.DataFrame(linhas)
+
+class FakePortalSession:
+    """Sessão HTTP falsa do portal PROA: devolve as páginas de referência, com latência opcional."""
+    class _Resposta:
+        def __init__(self, texto): self.status_code, self.text, self.headers = 200, texto, {}
+        def raise_for_status(self): pass
+
+    def __init__(self, latencia=0.0):
+        self.latencia, self.chamadas = latencia, 0
+        self._paginas = [STATUS_HTML_FIXTURES[k] for k in ("ativo", "arquivado", "entidades", "valor_com_span")]
+    def get(self, url, params=None, timeout=None):
+        self.chamadas += 1
+        if self.latencia: time.sleep(self.latencia)
+        return self._Resposta(self._paginas[int(params["numeroProcesso"]) % len(self._paginas)])
+
+@contextmanager
+def _fakes_instalados(pasta_cache, pasta_pdf, latencia_portal=0.0):
+    """Troca, só durante o bloco, Drive, portal e caminhos dos caches locais por versões locais e descartáveis."""
+    g = globals()
+    trocas = {
+        "drive": FakeDriveService(pasta_pdf),
+        "_PROA_SESSION": FakePortalSession(latencia_portal),
+        "STATUS_CACHE_PATH": os.path.join(pasta_cache, "status_cache.sqlite"),
+        "EXTRACTION_CACHE_PATH": os.path.join(pasta_cache, "extraction_cache.sqlite"),
+        "MANIFEST_PATH": os.path.join(pasta_cache, "manifest.sqlite"),
+        "CHECKPOINT_PATH": os.path.join(pasta_cache, "checkpoint.sqlite"),
+        "DRIVE_INDEX_PATH": os.path.join(pasta_cache, "drive_index.sqlite"),
+        "LOCAL_TABLE_PATH": os.path.join(pasta_cache, "tabela_local.sqlite"),
+        "EVENT_LOG_PATH": os.path.join(pasta_cache, "eventos.sqlite"),
+        "PDF_PREFETCH_DIR": os.path.join(pasta_cache, "pdfs_locais"),
+        "RUN_REPORT_PATH": os.path.join(pasta_cache, "run_report.json"),
+        "RUN_METRICS_PROM_PATH": os.path.join(pasta_cache, "proa_pipeline.prom"),
+        "PORTFOLIO_SUMMARY_PATH": os.path.join(pasta_cache, "resumo_carteira.json"),
+    }
+    # O limite de req/s protege o portal de verdade; aqui ele só esconderia o custo do pipeline
+    fetch_original = g["fetch_status_batch"]
+    trocas["fetch_status_batch"] = lambda numeros, **kw: fetch_original(numeros, **{"rate": 1e9, **kw})
+    antes = {k: g.get(k) for k in trocas}
+    g.update(trocas)
+    try:
+        yield trocas
+    finally:
+        g.update(antes)
+
+def benchmark_end_to_end(pasta_pdf, latencia_portal=0.0, workers=1, batch_size=SHEET_FLUSH_BATCH):
+    """
+    Roda process_all_pdfs duas vezes sobre a pasta, com fakes locais e caches novos:
+    'fria' (tudo extraído e consultado) e 'quente' (segunda passada, o manifesto pula tudo).
+    `leituras_aba` conta leituras da aba inteira; na 'quente' o estado vem da tabela local (`ms_estado`).
+    """
+    n_docs = len([f for f in os.listdir(pasta_pdf) if f.lower().endswith(".pdf")])
+    gc_fake = FakeGspreadClient()
+    gc_fake.planilha.add_worksheet(GSHEET_WORKSHEET_NAME).update([COLUMNS])
+    pasta_cache = tempfile.mkdtemp(prefix="proa_bench_")
+    linhas = []
+    try:
+        with _fakes_instalados(pasta_cache, pasta_pdf, latencia_portal) as fakes:
+            for rodada in ("fria", "quente"):
+                consultas_antes, leituras_antes = fakes["_PROA_SESSION"].chamadas, gc_fake.planilha.leituras
+                t0 = time.perf_counter()
+                process_all_pdfs(gc_fake, pdf_dir=pasta_pdf, workers=workers, batch_size=batch_size)
+                dt = time.perf_counter() - t0
+                linhas.append({"rodada": rodada, "docs": n_docs, "segundos": dt, "docs_por_s": n_docs / dt,
+                               "consultas_portal": fakes["_PROA_SESSION"].chamadas - consultas_antes,
+                               "leituras_aba": gc_fake.planilha.leituras - leituras_antes,
+                               "ms_estado": METRICS.summary()["tempos"]["etapa.leitura_planilha"]["total_s"] * 1000,
+                               "linhas_planilha": sum(1 for r in gc_fake.planilha.abas[GSHEET_WORKSHEET_NAME].grid[1:] if any(r))})
+    finally:
+        shutil.rmtree(pasta_cache, ignore_errors=True)
+    return pd.DataFrame(linhas).set_index("rodada")
+
+# ----------------------------
+# E. Regex com texto adversário (OCR ruidoso) e fuzz dos extratores
+# ----------------------------
+class _PaginaUnica:
+    """Documento de uma página só com o texto dado, para rodar _find_expediente_page_index sem PDF."""
+    page_count = 1
+    def __init__(self, texto): self.texto = _norm_text(texto)
+    def page_text_norm(self, i): return self.texto
+
+_PROA_FUZZ = "24/1900-0001234-5"
+EXTRATORES_TEXTO = {
+    "proa_notificatorio": get_proa_notificatorio,
+    "numero_contrato": get_numero_contrato,
+    "nome_empresa": get_nome_empresa,
+    "cnpj_empresa": get_cnpj_empresa,
+    "proa_mae": lambda t: get_proa_mae(t, _PROA_FUZZ),
+    "expediente": lambda t: _find_expediente_page_index(_PaginaUnica(t), _PROA_FUZZ),
+    "tipo_penalidade": get_tipo_penalidade,
+    "percentual_multa": get_percentual_multa,
+    "impedimentos": get_impedimentos,
+    "penalidade_meses": get_penalidade_meses,
+}
+
+def _ruido_ocr(n, seed=0):
+    rng = random.Random(seed)
+    return "".join(rng.choice("aeiosrnmtcEXPDNº°o.-/()%,;: \n0123456789") for _ in range(n))
+
+# Cada gerador devolve ~n caracteres mirando um retrocesso conhecido (prefixo que casa e fim que nunca chega)
+TEXTOS_ADVERSARIOS = {
+    "expediente_repetido": lambda n: "EXPEDIENTE " * (n // 11),
+    "empresa_sem_fim": lambda n: "contra a empresa " + "OBRAS SUL " * (n // 10),
+    "contra_empresa_repetido": lambda n: "contra empresa " * (n // 15),
+    "parenteses_abertos": lambda n: "por (seis " * (n // 10),
+    "prazo_parenteses": lambda n: "prazo de (doze " * (n // 15),
+    "percentual_aberto": lambda n: "multa de 5% (cinco " * (n // 19),
+    "cnpj_quebras": lambda n: "CNPJ: 12" + " \n" * (n // 2) + "x",
+    "cnpj_sob_o_n": lambda n: "sob o nº 12.345" + "\n" * n + "x",
+    "cfil_quebras": lambda n: "CFIL/RS, suspendendo o direito de licitar ou contratar com a Administração" + " \n" * (n // 2) + "x",
+    "contrato_sem_numero": lambda n: "CONTRATO Nº " * (n // 12),
+    "ruido_ocr": lambda n: _ruido_ocr(n),
+}
+
+def _tempo_limitado(fn, texto, limite_s):
+    """(segundos, estourou?): roda fn(texto) com o mesmo orçamento de tempo da extração de PDFs."""
+    t0 = time.perf_counter()
+    try:
+        with _orcamento_tempo(limite_s):
+            fn(texto)
+    except ExtractionTimeout:
+        return time.perf_counter() - t0, True
+    # Um `except:` genérico dentro do extrator pode engolir a interrupção: o relógio decide
+    segundos = time.perf_counter() - t0
+    return segundos, segundos >= limite_s
+
+def benchmark_regex_adversarial(tamanhos=(20_000, 200_000), limite_s=2.0, extratores=None, textos=None):
+    """
+    Tempo de cada extrator em cada texto adversário, em dois (ou mais) tamanhos. `crescimento` = tempo no maior
+    / tempo no menor: linear fica perto da razão dos tamanhos (10x no padrão), quadrático perto do quadrado.
+    `suspeito` marca crescimento acima de 3x a razão dos tamanhos ou chamada que estourou `limite_s`.
+    """
+    extratores = extratores or EXTRATORES_TEXTO
+    textos = textos or TEXTOS_ADVERSARIOS
+    linhas = []
+    for nome_texto, gerar in textos.items():
+        amostras = {n: gerar(n) for n in tamanhos}
+        for nome_fn, fn in extratores.items():
+            linha = {"extrator": nome_fn, "texto": nome_texto, "estourou": False}
+            for n, texto in amostras.items():
+                segundos, estourou = _tempo_limitado(fn, texto, limite_s)
+                linha[f"ms_{n}"] = segundos * 1000
+                linha["estourou"] |= estourou
+            linhas.append(linha)
+    df = pd.DataFrame(linhas)
+    menor, maior = f"ms_{min(tamanhos)}", f"ms_{max(tamanhos)}"
+    df["crescimento"] = df[maior] / df[menor].clip(lower=0.01)
+    razao = max(tamanhos) / min(tamanhos)
+    # Abaixo de 5 ms no maior tamanho o crescimento é só ruído de medição
+    df["suspeito"] = df["estourou"] | ((df["crescimento"] > 3 * razao) & (df[maior] > 5))
+    return df.sort_values(["suspeito", maior], ascending=False).reset_index(drop=True)
+
+_FRAGMENTOS_FUZZ = [
+    "contra a empresa ", "contra empresa, ", "CONSTRUTORA EXEMPLO LTDA", " inscrita no CNPJ sob o nº ", "12.345.678/0001-90",
+    "12 345 678 0001 90", "CNPJ: ", "sob o n ", "sediada em ", ", ", "; ", "\n", "\n\n\n", "  ", "J.S. ", "Empresa: OBRAS SUL EIRELI\n",
+    "Tipo: X - CTO ", "pelo prazo de ", "por ", "(", ")", "seis", "06", " meses", " mes", "multa de 5% (cinco por cento)",
+    "CFIL/RS, suspendendo o direito de licitar ou contratar com a Administração, ", "prazo de (doze) mes", "advertência",
+    "TERMO DE ABERTURA ", "intenção de instaurar procedimento notificatório contra a empresa ", "EXPEDIENTE ", "Nº ",
+    _PROA_FUZZ, "92.941.681/0001-00", "TERMO DE CONTRATO EMERGENCIAL DE OBRAS E SERVIÇOS DE ENGENHARIA Nº 12/2023",
+]
+
+def fuzz_extractors(n_casos=2000, seed=0, limite_s=0.5, max_fragmentos=400):
+    """
+    Alimenta cada extrator com textos aleatórios (fragmentos reais + ruído, seed fixo). Devolve um DataFrame
+    só com os problemas: exceção, retorno que não é texto/número ou chamada acima de `limite_s`. Vazio = ok.
+    """
+    rng = random.Random(seed)
+    problemas = []
+    for caso in range(n_casos):
+        partes = [rng.choice(_FRAGMENTOS_FUZZ) if rng.random() < 0.8 else
+                  "".join(rng.choice("aeEoXN()%,;:./-\n 0123456789") for _ in range(rng.randint(1, 40)))
+                  for _ in range(rng.randint(1, max_fragmentos))]
+        texto = "".join(partes)
+        for nome_fn, fn in EXTRATORES_TEXTO.items():
+            t0, problema = time.perf_counter(), ""
+            try:
+                with _orcamento_tempo(limite_s):
+                    valor = fn(texto)
+                if not isinstance(valor, (str, int)): problema = f"retorno {type(valor).__name__}"
+            except ExtractionTimeout:
+                problema = f"passou de {limite_s:g}s"
+            except Exception as e:
+                problema = f"{type(e).__name__}: {e}"
+            if not problema and time.perf_counter() - t0 > limite_s: problema = f"passou de {limite_s:g}s"
+            if problema: problemas.append({"caso": caso, "extrator": nome_fn, "problema": problema})
+    return pd.DataFrame(problemas, columns=["caso", "extrator", "problema"])
+
+# ----------------------------
+# F. Suíte completa + comparação entre commits
+# ----------------------------
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)) if "__file__" in globals() else None,
+                              timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+def run_benchmark_suite(n_docs=20, paginas=(6, 40), seed=42, repeticoes=3, latencia_portal=0.0, saida=None):
+    """
+    Gera o corpus (seed fixo), mede extratores e a execução ponta a ponta e devolve um dicionário de resultados.
+    Com `saida`, grava o JSON (um arquivo por commit facilita comparar com compare_benchmarks).
+    """
+    pasta_pdf = tempfile.mkdtemp(prefix="proa_corpus_")
+    try:
+        check_status_parsers()
+        check_write_sheet_diff()
+        check_drive_index()
+        check_drive_links()
+        corpus = gerar_corpus_sintetico(pasta_pdf, n_docs=n_docs, paginas=paginas, seed=seed)
+        extratores, docs_s = benchmark_extractors(pasta_pdf, repeticoes=repeticoes)
+        modos, _ = benchmark_page_modes(pasta_pdf, repeticoes=repeticoes)
+        e2e = benchmark_end_to_end(pasta_pdf, latencia_portal=latencia_portal)
+    finally:
+        shutil.rmtree(pasta_pdf, ignore_errors=True)
+
+    resultado = {
+        "meta": {"commit": _git_commit(), "quando": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "pymupdf": fitz.VersionBind, "n_docs": n_docs,
+                 "paginas": paginas if isinstance(paginas, int) else list(paginas), "seed": seed, "repeticoes": repeticoes, "latencia_portal": latencia_portal,
+                 "paginas_total": sum(d["paginas"] for d in corpus)},
+        "extracao_docs_por_s": docs_s,
+        "extratores": extratores.round(4).to_dict(orient="index"),
+        "modos_pagina": modos.round(4).to_dict(orient="index"),
+        "ponta_a_ponta": e2e.round(4).to_dict(orient="index"),
+    }
+    if saida:
+        os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+        with open(saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    return resultado
+
+def compare_benchmarks(base, novo, coluna="p50_ms"):
+    """Compara dois resultados (dict ou caminho do JSON): razão novo/base por extrator (< 1 = ficou mais rápido)."""
+    def _carrega(r):
+        if isinstance(r, str):
+            with open(r, encoding="utf-8") as f: return json.load(f)
+        return r
+    base, novo = _carrega(base), _carrega(novo)
+    if (base["meta"]["seed"], base["meta"]["n_docs"], base["meta"]["paginas"]) != \
+       (novo["meta"]["seed"], novo["meta"]["n_docs"], novo["meta"]["paginas"]):
+        print("⚠️ Corpus diferente (seed/n_docs/paginas): a comparação não é direta.")
+    a = pd.DataFrame(base["extratores"]).T[coluna]
+    b = pd.DataFrame(novo["extratores"]).T[coluna]
+    df = pd.DataFrame({f"base ({base['meta']['commit']})": a, f"novo ({novo['meta']['commit']})": b})
+    df["razao"] = b / a
+    return df
+
+if __name__ == "__main__":
+    display(Markdown("### 🧪 Leitura do status: caminho rápido x BeautifulSoup"))
+    display(check_status_parsers())
+    display(Markdown("### ✏️ Escrita por diferença na aba falsa"))
+    display(check_write_sheet_diff())
+    display(Markdown("### 🗂️ Índice do Drive: incremental, sobreposição, renomear/lixeira/mover e falhas"))
+    display(check_drive_index())
+    display(Markdown("### 🔗 Links do Drive: PROA inteiro, cauda sem o ano e PROA de outro ano"))
+    display(check_drive_links())
+    display(benchmark_status_parser().round(3))
+
+    display(Markdown("### 📄 Extração e execução ponta a ponta (corpus sintético)"))
+    resultado = run_benchmark_suite(n_docs=20, paginas=(6, 40), seed=42)
+    display(Markdown(f"**Commit:** `{resultado['meta']['commit']}` · **docs/s (extração):** {resultado['extracao_docs_por_s']:.1f}"))
+    display(pd.DataFrame(resultado["extratores"]).T)
+    display(pd.DataFrame(resultado["ponta_a_ponta"]).T)
+
+    display(Markdown("### 🧨 Regex com texto adversário e fuzz dos extratores"))
+    adversario = benchmark_regex_adversarial()
+    display(adversario.head(15).round(2))
+    if adversario["suspeito"].any():
+        display(Markdown("## ❌ Algum extrator cresce mais que linear (ou estourou o tempo) em texto adversário"))
+    problemas_fuzz = fuzz_extractors()
+    display(Markdown("✅ **Fuzz:** nenhum problema." if problemas_fuzz.empty else f"## ❌ Fuzz: {len(problemas_fuzz)} problemas"))
+    if not problemas_fuzz.empty: display(problemas_fuzz.head(20))
+
+    display(Markdown("### 📚 PDFs grandes: leitura sob demanda (lazy) x texto completo (full)"))
+    pasta_grandes = tempfile.mkdtemp(prefix="proa_grandes_")
+    try:
+        gerar_corpus_sintetico(pasta_grandes, n_docs=5, paginas=(200, 400), seed=7, contraexemplos=True)
+        resumo_modos, _ = benchmark_page_modes(pasta_grandes)
+        display(resumo_modos.round(1))
+    finally:
+        shutil.rmtree(pasta_grandes, ignore_errors=True)
@@ -2,6 +2,7 @@
 # 🚀 EXECUÇÃO E DASHBOARD DE MONITORAMENTO
 # ==============================================================================
 from IPython.display import display, Markdown, HTML
+import numpy as np
 import pandas as pd
 
 # Função para estilizar status com cores
@@ -18,11 +19,89 @@ def style_status(val):
         return 'background-color: #fff3cd; color: #856404;' # Amarelo (Alerta)
     return ''
 
+class TabelaPaginada:
+    """
+    Tabela detalhada por páginas. Ordena e indexa por classe de status uma vez só; cada página filtra por índice
+    e estiliza apenas as linhas visíveis, então o custo de mostrar não cresce com a carteira.
+    """
+    def __init__(self, df, colunas, por_pagina=50):
+        self.df = (df.reindex(columns=colunas).fillna("")
+                   .sort_values(by=["status_processo", "proa_notificatorio"]).reset_index(drop=True))
+        self.por_pagina = por_pagina
+        classe = status_class(self.df["status_processo"])
+        self.indices = dict(classe.groupby(classe).indices)
+        self._texto = None    # busca por PROA/empresa: montado na primeira busca
+        self._filtros = {}    # (classe, busca) -> posições (trocar de página não refiltra)
+
+    def filtrar(self, classe=None, busca=""):
+        chave = (classe, busca.strip().lower())
+        if chave not in self._filtros:
+            idx = self.indices.get(classe, np.array([], dtype=int)) if classe else np.arange(len(self.df))
+            if chave[1]:
+                if self._texto is None:
+                    self._texto = (self.df["proa_notificatorio"].astype(str) + " " + self.df["nome_empresa"].astype(str)).str.lower()
+                idx = idx[self._texto.iloc[idx].str.contains(chave[1], regex=False).to_numpy()]
+            self._filtros[chave] = idx
+        return self._filtros[chave]
+
+    def pagina(self, n=1, classe=None, busca=""):
+        """(linhas da página, página efetiva, total de páginas, total de linhas no filtro)."""
+        idx = self.filtrar(classe, busca)
+        paginas = max(1, -(-len(idx) // self.por_pagina))
+        n = min(max(1, n), paginas)
+        return self.df.iloc[idx[(n - 1) * self.por_pagina:n * self.por_pagina]], n, paginas, len(idx)
+
+    def render(self, n=1, classe=None, busca=""):
+        fatia, n, paginas, total = self.pagina(n, classe, busca)
+        display(Markdown(f"Página **{n}/{paginas}** · {total} processos"))
+        display(fatia.style
+            .map(style_status, subset=['status_processo'])
+            .set_properties(**{'text-align': 'left'})
+            .set_table_styles([{'selector': 'th', 'props': [('text-align', 'left'), ('background-color', '#f1f1f1')]}]))
+
+    def mostrar(self):
+        """Filtros e paginação com ipywidgets (Colab/Jupyter); sem ele, mostra a 1ª página e como pedir as outras."""
+        try:
+            import ipywidgets as widgets
+        except ImportError:
+            self.render(1)
+            display(Markdown("Outras páginas/filtros: `tabela_detalhe.render(2, classe='erro', busca='construtora')`"))
+            return
+        classe = widgets.Dropdown(options=[("Todos", None)] + [(c, c) for c in STATUS_CLASSES], description="Status")
+        busca = widgets.Text(description="Busca", placeholder="PROA ou empresa")
+        pagina = widgets.BoundedIntText(value=1, min=1, max=10**6, description="Página")
+        saida = widgets.Output()
+
+        def atualizar(_=None):
+            with saida:
+                saida.clear_output(wait=True)
+                self.render(pagina.value, classe.value, busca.value)
+
+        def filtro_mudou(_):
+            if pagina.value != 1: pagina.value = 1   # dispara atualizar
+            else: atualizar()
+
+        classe.observe(filtro_mudou, names="value")
+        busca.observe(filtro_mudou, names="value")
+        pagina.observe(atualizar, names="value")
+        display(widgets.HBox([classe, busca, pagina]), saida)
+        atualizar()
+
 try:
+    # 0. Autentica (uma vez por sessão; gc/drive ficam nos globais do main)
+    if gc is None:
+        gc, drive = connect_google()
+
     # 1. Executa o Pipeline
     display(Markdown("### ⚙️ Iniciando Processamento..."))
     # force_update=True lê tudo / False lê só novos e atualizados
-    df_resultado = process_all_pdfs(gc, force_update=False)
+    # force_refresh_status=True ignora o cache de status e consulta tudo no portal (dentro do orçamento)
+    # status_budget=N limita as consultas ao portal nesta execução (None = sem limite); o resto fica na fila
+    # refresh_extraction_cache=True reextrai os PDFs mesmo com o conteúdo igual ao do cache
+    # full_drive_sync=True relista a pasta inteira do Drive em vez de buscar só o que mudou
+    # batch_size=N grava na planilha a cada N PDFs; resume=False ignora o checkpoint de uma execução interrompida
+    # sync_from_sheet=True relê a aba inteira (ex: depois de editar a planilha à mão) em vez de usar a tabela local
+    df_resultado = process_all_pdfs(gc, force_update=False, force_refresh_status=False, refresh_extraction_cache=False)
 
     # ----------------------------
     # DASHBOARD
@@ -30,13 +109,16 @@ try:
     display(Markdown("---"))
     display(Markdown("# 📊 Painel de Controle: Processo Notificatório"))
 
-    if df_resultado.empty:
+    # Agregados gravados pelo pipeline (PORTFOLIO_SUMMARY_PATH): o painel não varre a tabela inteira
+    resumo = load_portfolio_summary() or summarize_portfolio(df_resultado)
+
+    if resumo["total"] == 0:
         display(Markdown("### ⚠️ Nenhum dado foi processado ou a planilha está vazia."))
     else:
         # A. KPIs (Indicadores Principais)
-        total_docs = len(df_resultado)
-        total_ativos = df_resultado['status_processo'].astype(str).str.contains('Ativo', case=False).sum()
-        total_erros = df_resultado['status_processo'].astype(str).str.contains('ERRO', case=False).sum()
+        total_docs = resumo["total"]
+        total_ativos = resumo["por_status"]["ativo"]
+        total_erros = resumo["por_status"]["erro"]
 
         kpi_html = f"""
         <div style="display: flex; gap: 20px; margin-bottom: 20px;">
@@ -56,7 +138,48 @@ try:
         """
         display(HTML(kpi_html))
 
-        # B. Tabela Detalhada (Estilizada)
+        # A2. Desempenho da execução (METRICS, gravado também em RUN_REPORT_PATH / RUN_METRICS_PROM_PATH)
+        perf = METRICS.summary()
+        cont, tempos = perf["contadores"], perf["tempos"]
+        t_total = tempos.get("etapa.total", {}).get("total_s", perf["duracao_s"])
+        extraidos = cont.get("arquivos.extraidos", 0)
+        pulados = sum(cont.get(f"arquivos.{k}", 0) for k in ("manifesto", "pulados_rodape", "pulados_cache_rodape", "retomados", "pulados_quarentena", "duplicados"))
+        quarentena = cont.get("arquivos.quarentena", 0) + cont.get("arquivos.pulados_quarentena", 0)
+        consultas_status = cont.get("status.consultas", 0) + cont.get("status.cache_hits", 0)
+        hit_status = 100 * cont.get("status.cache_hits", 0) / consultas_status if consultas_status else 0
+        http_p95 = tempos.get("http.portal", {}).get("p95_ms", 0)
+
+        cards = [
+            (f"{t_total:.1f}s", "Duração total"),
+            (f"{extraidos}", f"PDFs extraídos ({extraidos / t_total if t_total else 0:.1f}/s)"),
+            (f"{pulados}", "PDFs pulados"),
+            (f"{cont.get('arquivos.falhas', 0)}", f"Falhas de leitura ({quarentena} em quarentena)"),
+            (f"{hit_status:.0f}%", f"Status vindos do cache ({cont.get('status.fila_restante', 0)} vencidos na fila)"),
+            (f"{http_p95:.0f} ms", f"Portal p95 ({cont.get('http.falhas', 0)} falhas)"),
+        ]
+        perf_html = '<div style="display: flex; gap: 12px; margin-bottom: 20px;">' + "".join(f"""
+            <div style="background-color: #eef4fb; padding: 10px; border-radius: 10px; border: 1px solid #cfe0f3; flex: 1; text-align: center;">
+                <h3 style="margin:0; color: #1f4e79;">{valor}</h3>
+                <p style="margin:0; color: #555; font-size: 12px;">{rotulo}</p>
+            </div>""" for valor, rotulo in cards) + "</div>"
+        display(Markdown("### ⚡ Desempenho da Execução"))
+        display(HTML(perf_html))
+
+        etapas = pd.DataFrame({k.split(".", 1)[1]: v for k, v in tempos.items() if k.startswith("etapa.") and k != "etapa.total"}).T
+        if not etapas.empty:
+            etapas = etapas.sort_values("total_s", ascending=False)[["total_s", "n"]]
+            display(etapas.style.bar(subset=["total_s"], color="#9ec5e8").format({"total_s": "{:.2f}s", "n": "{:.0f}"}))
+        if perf["registros"].get("quarentena"):
+            display(Markdown(f"**🚧 Em quarentena nesta execução** (acima de {PDF_TEMPO_MAX_SEG:g}s por PDF):"))
+            display(pd.DataFrame(perf["registros"]["quarentena"]))
+        if perf["registros"].get("duplicados"):
+            display(Markdown("**🗂️ Processos com mais de um PDF** (só a versão mais nova foi lida):"))
+            display(pd.DataFrame(perf["registros"]["duplicados"]).assign(ignorados=lambda d: d["ignorados"].str.join(", ")))
+        extratores = pd.DataFrame({k.split(".", 1)[1]: v for k, v in tempos.items() if k.startswith("extrator.")}).T
+        if not extratores.empty:
+            display(extratores.sort_values("p95_ms", ascending=False)[["n", "p50_ms", "p95_ms", "max_ms"]].round(2))
+
+        # B. Tabela Detalhada (paginada: só a página visível é estilizada)
         display(Markdown("### 📋 Status Detalhado por Processo"))
 
         cols_status = [
@@ -64,43 +187,37 @@ try:
             "ultima_atualizacao_processo", "tipo_penalidade",
             "percentual_multa", "penalidade_meses", "divida_ativa"
         ]
+        tabela_detalhe = TabelaPaginada(df_resultado, cols_status)
+        tabela_detalhe.mostrar()
 
-        # Garante colunas
-        for c in cols_status:
-            if c not in df_resultado.columns: df_resultado[c] = ""
-
-        df_view = (df_resultado[cols_status].copy()
-                   .sort_values(by=["status_processo", "proa_notificatorio"], na_position="last")
-                   .reset_index(drop=True))
-
-        # Aplica estilo (cores condicionais)
-        styled_table = (df_view.style
-            .map(style_status, subset=['status_processo'])
-            .set_properties(**{'text-align': 'left'})
-            .set_table_styles([{'selector': 'th', 'props': [('text-align', 'left'), ('background-color', '#f1f1f1')]}])
-        )
-        display(styled_table)
-
-        # C. Distribuição e Alertas
+        # C. Distribuição e Alertas (tudo vem do resumo: tamanho fixo, não depende da carteira)
         display(Markdown("### 📈 Distribuição & Alertas"))
 
-        # Cria dataframe de contagem
-        contagem = df_resultado["status_processo"].fillna("Sem Status").replace("", "Sem Status").value_counts().to_frame("Qtd")
-
-        # Barra de dados simples dentro da tabela
+        # Status mais comuns (até 20), com barra de dados dentro da tabela
+        contagem = pd.Series(resumo["status_detalhado"], dtype=int).to_frame("Qtd")
         display(contagem.style.bar(subset=['Qtd'], color='#5fba7d'))
+        distribuicoes = {
+            "Tipo de penalidade": resumo["por_tipo_penalidade"],
+            "Última atualização do processo": resumo["por_idade"],
+            "Erros de status": resumo["erros"]["status"],
+            "Campos extraídos com erro": resumo["erros"]["extracao"],
+        }
+        display(HTML('<div style="display: flex; gap: 24px; align-items: flex-start;">' + "".join(
+            f"<div><b>{titulo}</b>{pd.Series(valores, dtype=int).to_frame('Qtd').to_html()}</div>"
+            for titulo, valores in distribuicoes.items() if valores) + "</div>"))
 
-        # D. Alerta de Vazios
-        sem_status = df_resultado[df_resultado["status_processo"].fillna("") == ""]
-        if not sem_status.empty:
-            display(Markdown(f"### ⚠️ ATENÇÃO: {len(sem_status)} Processos sem retorno de status"))
+        # D. Alerta de Vazios (só os primeiros; o resto pelo filtro "sem status" da tabela)
+        n_sem_status = resumo["por_status"]["sem status"]
+        if n_sem_status:
+            display(Markdown(f"### ⚠️ ATENÇÃO: {n_sem_status} Processos sem retorno de status"))
+            sem_status, *_ = tabela_detalhe.pagina(1, classe="sem status")
             display(sem_status[["proa_notificatorio", "nome_empresa"]].style.hide(axis="index"))
         else:
             display(Markdown("✅ **Sucesso:** Todos os processos possuem status definido."))
 
 except NameError:
     display(Markdown("## ❌ ERRO CRÍTICO: Variável `gc` não encontrada"))
-    display(Markdown("Por favor, rode a célula de **Autenticação** no topo do notebook."))
+    display(Markdown("Por favor, rode a célula principal (**main.py**) antes desta."))
 except Exception as e:
     display(Markdown(f"## ❌ Ocorreu um erro inesperado"))
     print(e)
\ No newline at end of file
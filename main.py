@@ -1,33 +1,97 @@
 # ======================INICIO=DO=STATUS===========================================
-# 1. Instala as bibliotecas necessárias
-!pip install requests beautifulsoup4 --quiet
-!pip install gspread gspread-dataframe google-auth --quiet
-!pip install pymupdf --quiet
+# Instalação (uma vez): pip install -r requirements.txt
+#   No Colab, numa célula antes desta: !pip install gspread gspread-dataframe google-auth google-api-python-client pymupdf --quiet
+# Uso:
+#   - Colab/Jupyter: rode esta célula e depois a do executable.py (a autenticação acontece lá, via connect_google()).
+#   - Servidor/cron: python main.py --credentials conta_servico.json --pdf-dir /dados/PDF --cache-dir /dados/.proa_cache
+#   - Como módulo:   import main; main.connect_google(creds); main.process_all_pdfs(main.gc, ...)
+from __future__ import annotations
+
+import time
+_T_IMPORT_INICIO = time.perf_counter()
 
-import requests
-from bs4 import BeautifulSoup
 import re
 import os
+import sys
 import datetime
-import pandas as pd
-import fitz  # pymupdf
-import tiktoken
-import time
-import gspread
-from gspread_dataframe import get_as_dataframe, set_with_dataframe
-from google.colab import auth
-from google.auth import default
-from googleapiclient.discovery import build
+import unicodedata
+import importlib
+from functools import cached_property
+from contextlib import contextmanager, nullcontext
+import hashlib
+import sqlite3
+import multiprocessing
+import threading
+import itertools
+import json
+import html
+import random
+import signal
+import mmap
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class _LazyModule:
+    """Importa o módulo só no primeiro acesso a um atributo: a partida (CLI/cron) não paga pandas, PyMuPDF, Google..."""
+    def __init__(self, nome: str):
+        self._nome = nome
+        self._modulo = None
+
+    def __getattr__(self, attr):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nome)
+        return getattr(self._modulo, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._nome!r} ({'carregado' if self._modulo is not None else 'não carregado'})>"
+
+# Dependências pesadas (ou usadas só em alguns caminhos): carregadas no primeiro uso
+requests = _LazyModule("requests")
+bs4 = _LazyModule("bs4")
+pd = _LazyModule("pandas")
+fitz = _LazyModule("fitz")  # pymupdf
+gspread = _LazyModule("gspread")
+gspread_dataframe = _LazyModule("gspread_dataframe")
 
 # ==============================================================================
-# 1. AUTENTICAÇÃO E CONFIGURAÇÃO DA API
+# 1. AUTENTICAÇÃO E CONFIGURAÇÃO DA API (clientes injetados; nada acontece no import)
 # ==============================================================================
-print("🔐 Autenticando usuário...")
-auth.authenticate_user()
-creds, _ = default()
-gc = gspread.authorize(creds)
-drive = build('drive', 'v3', credentials=creds)
-print("✅ Autenticação concluída!")
+GOOGLE_SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+gc = None       # cliente gspread
+drive = None    # serviço Drive v3
+
+def connect_google(creds=None, credentials_file: str = None, gspread_client=None, drive_service=None):
+    """
+    Prepara os clientes globais `gc` (gspread) e `drive` (Drive v3) e devolve (gc, drive).
+    Clientes já prontos podem ser injetados direto. Sem credenciais: arquivo de conta de serviço
+    (credentials_file), senão login do Colab quando disponível, senão Application Default Credentials.
+    """
+    global gc, drive
+    if gspread_client is None or drive_service is None:
+        if creds is None:
+            print("🔐 Autenticando usuário...")
+            if credentials_file:
+                from google.oauth2 import service_account
+                creds = service_account.Credentials.from_service_account_file(credentials_file, scopes=GOOGLE_SCOPES)
+            else:
+                try:
+                    from google.colab import auth
+                    auth.authenticate_user()
+                except ImportError:
+                    pass  # fora do Colab: usa GOOGLE_APPLICATION_CREDENTIALS / gcloud
+                from google.auth import default
+                creds, _ = default(scopes=GOOGLE_SCOPES)
+        if gspread_client is None:
+            gspread_client = gspread.authorize(creds)
+        if drive_service is None:
+            from googleapiclient.discovery import build
+            drive_service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+        print("✅ Autenticação concluída!")
+    gc, drive = gspread_client, drive_service
+    return gc, drive
 
 # ==========================
 # CONFIGURAÇÃO DE PASTAS E PLANILHAS
@@ -40,6 +104,141 @@ GSHEET_WORKSHEET_NAME = "TABELA"
 # ID DA PASTA DO DRIVE (Aquele que funcionou para você)
 FOLDER_ID_DRIVE = "1hl0liZWvMfr1GLzm9_PO9om_7fErJa_5"
 
+# ======= PARALELISMO ========
+# Nº de processos para extrair PDFs em paralelo (1 = sequencial, como antes)
+PDF_WORKERS = 1
+
+# ======= LEITURA DAS PÁGINAS DO PDF ========
+# "lazy": cada campo lê só as páginas da sua região (início / página do expediente / última página) e amplia
+# para o documento inteiro quando o achado ali pode não ser o mesmo do texto completo; "full": decodifica todas
+# as páginas antes de buscar
+PDF_TEXT_MODE = "lazy"
+# Páginas da região "inicio" (capa e TERMO DE ABERTURA: PROA notificatório e contrato emergencial)
+PDF_PAGINAS_INICIO = 3
+# PROA mãe: o mais antigo citado nestas primeiras páginas (em qualquer modo); o documento inteiro só se não houver
+# nenhum ali. Os andamentos do meio de um consolidado citam outros processos que não são o de origem
+PDF_PAGINAS_PROA_MAE = 3
+# Orçamento de tempo por PDF: a extração que passar disso é interrompida e o arquivo vai para a quarentena
+# (não é relido nas próximas execuções até mudar de tamanho/data, ou com force_update=True). 0 = sem limite
+PDF_TEMPO_MAX_SEG = 60
+
+# ======= CÓPIA LOCAL DOS PDFs (LEITURA ANTECIPADA) ========
+# A pasta de PDFs é a montagem do Drive (lenta, um arquivo por vez). Os PDFs que vão ser lidos são copiados em
+# segundo plano para o disco local, uma janela à frente da extração, e abertos de lá via mmap.
+# Fica no disco local da máquina (não no Drive); cópia válida = mesmo tamanho e mtime do original
+PDF_PREFETCH = True
+PDF_PREFETCH_DIR = os.path.join(tempfile.gettempdir(), "proa_pdf_cache")
+PDF_PREFETCH_MAX_MB = 2048     # teto em disco; acima dele saem as cópias usadas há mais tempo (LRU)
+PDF_PREFETCH_WORKERS = 4       # cópias simultâneas a partir da montagem
+
+# ======= CONSULTA AO PORTAL PROA ========
+PROA_CONSULTA_URL = "https://secweb.procergs.com.br/pra-aj4/public/proa_retorno_consulta_publica.xhtml"
+# Limite de requisições por segundo no secweb.procergs.com.br (compartilhado entre as threads)
+PROA_REQUESTS_PER_SECOND = 1.0
+# Nº de consultas simultâneas (a taxa continua limitada pelo valor acima)
+PROA_STATUS_WORKERS = 4
+# Timeout (conexão, leitura) em segundos e novas tentativas por consulta (com espera exponencial + jitter)
+PROA_HTTP_TIMEOUT = (5, 10)
+PROA_HTTP_RETRIES = 2
+PROA_BACKOFF_BASE = 0.5
+PROA_BACKOFF_MAX = 8.0
+# Disjuntor: após N consultas seguidas que falharam (já esgotadas as novas tentativas de cada uma) para de
+# consultar e marca o resto como adiado; tenta de novo após a pausa
+PROA_CIRCUIT_FALHAS = 5
+PROA_CIRCUIT_PAUSA_SEG = 120
+# Orçamento de consultas ao portal por execução (None = sem limite). O que não couber fica para a próxima:
+# a fila é ordenada por urgência (status_priority) e quem espera há mais tempo sobe nela
+STATUS_REFRESH_BUDGET = 200
+# Pesos da fila: "ERRO"/vazio volta logo, em andamento é a base, finais (arquivado/encerrado) quase nunca
+STATUS_PESO_ERRO = 4.0
+STATUS_PESO_FINAL = 0.1
+# Processos com movimentação recente mudam mais: até 2x de prioridade, metade disso a cada N dias
+STATUS_RECENCIA_DIAS = 30
+
+# ======= ESCRITA NA PLANILHA ========
+# "diff": manda só as células alteradas e as linhas novas num único batch_update
+# "full": limpa a aba e reescreve tudo (comportamento antigo)
+SHEET_WRITE_MODE = "diff"
+# A cada N PDFs lidos o lote é gravado na planilha (e vira checkpoint); uma queda perde no máximo um lote
+SHEET_FLUSH_BATCH = 50
+
+# ======= TABELA LOCAL (fonte da verdade; a planilha é só o destino) ========
+# "local": o estado sai da tabela local, sem ler a aba. A aba inteira só é lida na primeira vez, depois de uma
+#          gravação interrompida ou a cada SHEET_RESYNC_HORAS (para absorver edições feitas à mão na planilha)
+# "sheet": lê a aba inteira em toda execução (comportamento antigo); a tabela local continua sendo atualizada
+SHEET_READ_MODE = "local"
+SHEET_RESYNC_HORAS = 24
+
+# ======= CACHE LOCAL (persistente entre execuções) ========
+# Fica ao lado da pasta de PDFs, no Drive, para sobreviver ao reinício do Colab
+CACHE_DIR = os.path.join(os.path.dirname(PDF_DIR), ".proa_cache")
+STATUS_CACHE_PATH = os.path.join(CACHE_DIR, "status_cache.sqlite")
+
+# Validade (em segundos) do status guardado no cache, por tipo de status
+STATUS_FINAIS = ("arquivado", "encerrado")     # mesmos termos tratados como finais no dashboard
+STATUS_TTL_FINAL = 30 * 24 * 3600               # quase nunca muda
+STATUS_TTL_PADRAO = 12 * 3600                   # processos em andamento
+STATUS_TTL_ERRO = 0                             # "ERRO: ..." nunca é reaproveitado
+
+# Cache de extração: resultados dos get_* por conteúdo do PDF (impressão digital) + versão do extrator
+EXTRACTION_CACHE_PATH = os.path.join(CACHE_DIR, "extraction_cache.sqlite")
+# Manifesto de decisão de pulo: tamanho/mtime/modifiedTime do Drive + data do rodapé da última leitura
+MANIFEST_PATH = os.path.join(CACHE_DIR, "manifest.sqlite")
+
+# Checkpoint da execução: arquivos já gravados na planilha (permite retomar depois de uma queda do Colab)
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "checkpoint.sqlite")
+
+# Relatório de desempenho da última execução (JSON) e métricas no formato textfile do Prometheus
+RUN_REPORT_PATH = os.path.join(CACHE_DIR, "run_report.json")
+RUN_METRICS_PROM_PATH = os.path.join(CACHE_DIR, "proa_pipeline.prom")
+# Resumo agregado da carteira (contagens por status, penalidade, erro e idade) que o painel lê no lugar da tabela
+PORTFOLIO_SUMMARY_PATH = os.path.join(CACHE_DIR, "resumo_carteira.json")
+
+# Índice local da pasta do Drive (nome -> link), atualizado só com o que mudou desde a última execução
+DRIVE_INDEX_PATH = os.path.join(CACHE_DIR, "drive_index.sqlite")
+DRIVE_FULL_RESYNC_HORAS = 24          # de tempos em tempos relista tudo (pega exclusões e renomeações perdidas)
+DRIVE_SYNC_SOBREPOSICAO_SEG = 60      # reconsulta um pouco antes da última modificação vista (relógio do Drive)
+DRIVE_PAGE_RETRIES = 3                # tentativas por página antes de desistir da sincronização
+
+# Cópia local tipada da aba (PROA só dígitos, datas em ISO), com a linha da planilha de cada registro
+LOCAL_TABLE_PATH = os.path.join(CACHE_DIR, "tabela_local.sqlite")
+
+# Log de eventos (só acrescenta): mudanças de status e penalidade por PROA, para quem consome só as diferenças
+EVENT_LOG_PATH = os.path.join(CACHE_DIR, "eventos.sqlite")
+CAMPOS_EVENTOS = ("status_processo", "tipo_penalidade", "percentual_multa", "penalidade_meses")
+
+def configure(cache_dir: str = None, pdf_dir: str = None, sheet_name: str = None, worksheet: str = None,
+              folder_id: str = None, prefetch_dir: str = None):
+    """
+    Ajusta a configuração fora do Colab (ex.: no servidor): pasta de cache (e todos os arquivos dentro dela),
+    pasta de PDFs, planilha, aba, pasta do Drive e pasta local das cópias dos PDFs. Só muda o que for informado.
+    """
+    global CACHE_DIR, STATUS_CACHE_PATH, EXTRACTION_CACHE_PATH, MANIFEST_PATH, CHECKPOINT_PATH
+    global RUN_REPORT_PATH, RUN_METRICS_PROM_PATH, DRIVE_INDEX_PATH, LOCAL_TABLE_PATH, PORTFOLIO_SUMMARY_PATH
+    global EVENT_LOG_PATH
+    global PDF_DIR, GSHEET_NAME, GSHEET_WORKSHEET_NAME, FOLDER_ID_DRIVE, PDF_PREFETCH_DIR
+    if pdf_dir: PDF_DIR = pdf_dir
+    if prefetch_dir: PDF_PREFETCH_DIR = prefetch_dir
+    if sheet_name: GSHEET_NAME = sheet_name
+    if worksheet: GSHEET_WORKSHEET_NAME = worksheet
+    if folder_id: FOLDER_ID_DRIVE = folder_id
+    if cache_dir:
+        CACHE_DIR = cache_dir
+        STATUS_CACHE_PATH = os.path.join(CACHE_DIR, "status_cache.sqlite")
+        EXTRACTION_CACHE_PATH = os.path.join(CACHE_DIR, "extraction_cache.sqlite")
+        MANIFEST_PATH = os.path.join(CACHE_DIR, "manifest.sqlite")
+        CHECKPOINT_PATH = os.path.join(CACHE_DIR, "checkpoint.sqlite")
+        RUN_REPORT_PATH = os.path.join(CACHE_DIR, "run_report.json")
+        RUN_METRICS_PROM_PATH = os.path.join(CACHE_DIR, "proa_pipeline.prom")
+        PORTFOLIO_SUMMARY_PATH = os.path.join(CACHE_DIR, "resumo_carteira.json")
+        DRIVE_INDEX_PATH = os.path.join(CACHE_DIR, "drive_index.sqlite")
+        LOCAL_TABLE_PATH = os.path.join(CACHE_DIR, "tabela_local.sqlite")
+        EVENT_LOG_PATH = os.path.join(CACHE_DIR, "eventos.sqlite")
+
+# Suba este número quando mudar algo que o hash do código não enxerga (o hash já cobre regex, constantes globais e
+# as funções listadas em _field_dependencies). Função nova no caminho da extração: declare-a lá ou suba a versão.
+EXTRACTOR_VERSION = 3   # 3: CNPJ da frase de intenção primeiro; PROA mãe nas primeiras páginas (PDF_PAGINAS_PROA_MAE)
+
 # ======= MENSAGENS DE ERROS ========
 ERR_MSG_EXPEIDENTE = "Sem Penalidade"
 ERR_MSG_TIPO_PENALIDADE  = ""
@@ -47,6 +246,9 @@ ERR_MSG_PERCENTUAL_MULTA  = ""
 ERR_MSG_IMPEDIMENTOS = ""
 ERR_MSG_PENALIDADE_MESES = ""
 ERR_MSG_DATA_PENALIZACAO = ""
+# Começa com "ERRO" de propósito: não entra no cache de status e aparece como erro no painel
+ERR_MSG_STATUS_ADIADO = "ERRO: Consulta adiada (portal indisponível)"
+ERR_MSG_STATUS_ORCAMENTO = "ERRO: Consulta adiada (limite de consultas da execução)"
 ERR_MSG_STATUS = "ERRO: IMPOSSIVEL DE DEFINIR UM STATUS"
 
 # ====== NOME DAS COLUNAS PADRÃO ======
@@ -58,23 +260,319 @@ COLUMNS = [
     "ultima_atualizacao_processo"
 ]
 
+# ==========================
+# PADRÕES REGEX (COMPILADOS UMA ÚNICA VEZ, NO IMPORT)
+# ==========================
+RE_ESPACOS_HORIZONTAIS = re.compile(r"[ \t]+")
+RE_ESPACOS = re.compile(r"\s+")
+RE_NAO_DIGITO = re.compile(r"\D")
+RE_DATA_BR = re.compile(r"(\d{2}/\d{2}/\d{4})")
+RE_PROA = re.compile(r"\b(\d{2}\/\d{4}-\d{7}-\d)\b")
+RE_PROA_SEPARADORES = re.compile(r"[/-]")
+# PROA no nome do arquivo (sem "/", que não pode aparecer em nome): 14 dígitos com ou sem separadores
+RE_PROA_NOME_ARQUIVO = re.compile(r"(?<!\d)(\d{2})[ ._-]?(\d{4})[ ._-]?(\d{7})[ ._-]?(\d)(?!\d)")
+# Sufixos/prefixos de cópia ("nome (1).pdf", "Cópia de nome.pdf") que não fazem parte da identificação
+RE_COPIA_NOME_ARQUIVO = re.compile(r"\s*\(\d+\)$|^(?:c[óo]pia de|copy of)\s+", re.IGNORECASE)
+RE_SITUACAO_LABEL = re.compile(r"Situação:")
+
+# Status no HTML do portal (caminho rápido, sem montar a árvore do BeautifulSoup)
+RE_HTML_LABEL = re.compile(r"<label\b[^>]*>(.*?)</label\s*>", re.IGNORECASE | re.DOTALL)
+RE_HTML_TAG = re.compile(r"<[^>]*>")
+RE_HTML_FIM_TD = re.compile(r"</td\s*>", re.IGNORECASE)
+RE_HTML_TD_SEGUINTE = re.compile(r"\s*<td\b[^>]*>(.*?)</td\s*>", re.IGNORECASE | re.DOTALL)
+RE_HTML_TAG_NOME = re.compile(r"<\s*(/?)\s*([a-zA-Z][a-zA-Z0-9]*)[^>]*?(/?)>")
+HTML_TAGS_VAZIAS = frozenset({"br", "img", "input", "hr", "meta", "link", "wbr", "col", "area", "source"})
+RE_HTML_ESTRUTURA = re.compile(r"<\s*/?\s*(?:td|th|tr|table|script|style)\b|<!--|<!\[CDATA\[", re.IGNORECASE)
+
+# Nome da empresa
+RE_DATA_POR_EXTENSO = re.compile(r"\d{1,2}\s+de\s+[a-zç]+\s+de\s+\d{4}")
+RE_SUFIXO_EMPRESARIAL = re.compile(r"^(.*?\s(?:LTDA|EIRELI|S\.?A|S\/A|EPP|ME|MEI|S\.S))(?=[\s.,;]|$)", re.IGNORECASE)
+# M1 e M2: Padrões de texto jurídico (Intenção/Contra): o nome vai do fim do prefixo até a primeira keyword forte
+# (não trava em pontos de abreviação como J.S.). Prefixo e fim são buscas separadas: ver _nome_apos_prefixo
+RE_NOME_EMPRESA_JURIDICO = [
+    re.compile(r"intenç(?:ão|ao)\s+de\s+instaurar\s+procedimento\s+notificat(?:ório|orio)\s+contra\s+(?:a\s+)?empresa\s+", re.IGNORECASE),
+    re.compile(r"contra\s+(?:a\s+)?empresa\s*(?:[,;]\s*)?", re.IGNORECASE),
+]
+RE_NOME_EMPRESA_FIM = re.compile(r"[,;]|inscrita|CNPJ|sediada", re.IGNORECASE)
+# Nome sem keyword de fim nesta distância é descartado (_clean_company_name já recusa mais de 85 caracteres)
+NOME_EMPRESA_JANELA = 2000
+RE_EMPRESA_CABECALHO = re.compile(r"Empresa\s*:\s*(.+?)(?=\n|Local:|CNPJ|Endereço:|$)", re.IGNORECASE)
+RE_TIPO_CTO = re.compile(r"Tipo\s*:\s*(.+?)\s*-\s*CTO", re.IGNORECASE)
+
+# CNPJ
+CNPJ_SEDUC = "92941681000100"
+# Separadores como "\s*(?:[.-/]\s*)?" e não "\s*[.-/]?\s*": aceitam o mesmo texto, mas dois \s* seguidos
+# dividem uma sequência de espaços/quebras de N jeitos e o retrocesso vira O(N²) quando não há CNPJ ali
+CNPJ_FLEX = r"(\d{2})\s*(?:[\.\-\/]\s*)?(\d{3})\s*(?:[\.\-\/]\s*)?(\d{3})\s*(?:[\.\-\/]\s*)?(\d{4})\s*(?:[\.\-\/]\s*)?(\d{2})"
+# Os prefixos não terminam em \s*: quem os usa já põe \s* antes do CNPJ_FLEX
+CNPJ_PREFIXOS = [r"inscrita\s+no\s+minist[ée]rio\s+da\s+fazenda", r"inscri[çc][ãa]o\s+n[ºo]?\s+cnpj", r"cnpj(?:\s*[:\-])?", r"sob\s+o\s+n[ºo]?"]
+RE_TERMO_ABERTURA = re.compile(r"TERMO\s+DE\s+ABERTURA", re.IGNORECASE)
+RE_EMPRESA_ANCORA = re.compile(r"empresa\s+", re.IGNORECASE)
+# Tudo o que vem depois do nome da empresa no padrão ancorado ("empresa <NOME>, inscrita ... CNPJ")
+RE_CNPJ_APOS_NOME = re.compile(rf"\s*(?:[,;]\s*)?(?:{'|'.join(CNPJ_PREFIXOS)})\s*{CNPJ_FLEX}", re.IGNORECASE | re.DOTALL)
+# Distância máxima entre o fim do nome da frase de intenção (M1) e o CNPJ dessa mesma frase
+CNPJ_JANELA_INTENCAO = 300
+RE_CNPJ_PREFIXADO = [re.compile(rf"{prefixo}\s*{CNPJ_FLEX}", re.IGNORECASE | re.DOTALL) for prefixo in CNPJ_PREFIXOS]
+
+# Contrato
+RE_CONTRATO_EMERGENCIAL = re.compile(r"TERMO\s+DE\s+CONTRATO\s+EMERGENCIAL\s+DE\s+OBRAS\s+E\s+SERVI[ÇC]OS\s+DE\s+ENGENHARIA\s*N[º°]?\s*([0-9]{1,4}/[0-9]{4})", re.IGNORECASE)
+RE_CONTRATO_GENERICO = re.compile(r"CONTRATO[^\n]{0,120}?N[º°]?\s*([0-9]{1,4}/[0-9]{4})", re.IGNORECASE)
+
+# Expediente
+RE_EXPEDIENTE = re.compile(r"EXPEDIENTE", re.IGNORECASE)
+RE_FRASE_EXPEDIENTE = re.compile(r"Em\s+an[áa]lise\s+aos\s+autos\s+e\s+considerando\s+as\s+raz[õo]es\s+f[áa]ticas\s+e\s+contratuais", re.IGNORECASE | re.DOTALL)
+RE_MULTA = re.compile(r"\bMULTA\b", re.IGNORECASE)
+RE_ADVERTENCIA = re.compile(r"advert(ê|e)ncia", re.IGNORECASE)
+RE_NAO_APLICACAO = re.compile(r"n[aã]o\s+aplica(ç|c)[aã]o\s+de\s+penalidade", re.IGNORECASE)
+RE_PERCENTUAL_NUM = re.compile(r"(?:aplicando\s+)?multa\s+(?:de\s+)?(\d{1,2})\s*%", re.IGNORECASE)
+RE_PERCENTUAL_EXTENSO = re.compile(r"%\s*\(\s*([^)]{1,60}?)\s+por\s+cento\s*\)", re.IGNORECASE)
+RE_CFIL = re.compile(r"CFIL\/RS", re.IGNORECASE)
+# Trechos entre parênteses limitados a 60 caracteres: sem ")" por perto, "[^)]+" ia até o fim do texto
+# (e voltava caractere a caractere) para cada "por (" da página. get_penalidade_meses junta os espaços antes,
+# então os \s* vizinhos não têm sequências longas para dividir
+# 1. Padrão Principal (Complexo: contexto de suspensão + parênteses)
+RE_MESES_PRINCIPAL = re.compile(r"(?:CFIL/RS\s*,\s*suspendendo\s+o\s+direito\s+de\s+licitar\s+ou\s+contratar\s+com\s+a\s+Administração\s*(?:,|pelo)?\s*)?(?:prazo\s+de|por)\s*(\d{1,2})?\s*\(\s*([^)]{1,60})\s*\)?\s*meses?", re.IGNORECASE | re.DOTALL)
+RE_MESES_NUMERO = re.compile(r"prazo\s+de\s+\(?(\d{1,2})\)?\s+mes", re.IGNORECASE | re.DOTALL)
+RE_MESES_PARENTESES = re.compile(r"prazo\s+de\s+\(([^)]{1,60})\)\s+mes", re.IGNORECASE | re.DOTALL)
+RE_MESES_EXTENSO = re.compile(r"prazo\s+de\s+([a-zçãõéê]+)\s+mes", re.IGNORECASE | re.DOTALL)
+
+# ==========================
+# SESSÃO DE DOCUMENTO PDF (ABRE UMA ÚNICA VEZ)
+# ==========================
+class PdfSession:
+    """
+    Abre o PDF uma única vez e guarda, sob demanda, o texto e os blocos de cada página.
+    Todos os extratores leem daqui em vez de chamar fitz.open de novo (o Drive FUSE é lento).
+    """
+    def __init__(self, pdf_path: str, leitura: str = None):
+        # `leitura`: cópia local do mesmo arquivo (PdfPrefetcher), aberta da memória via mmap
+        self.pdf_path = pdf_path
+        self._mmap = self._buffer = None
+        if leitura:
+            with open(leitura, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buffer = memoryview(self._mmap)
+            self._doc = fitz.open(stream=self._buffer, filetype="pdf")
+        else:
+            self._doc = fitz.open(pdf_path)
+        self.page_count = len(self._doc)
+        self._text = {}
+        self._text_norm = {}
+        self._blocks = {}
+        self._height = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        if self._mmap is not None:
+            self._buffer.release()
+            self._mmap.close()
+            self._mmap = self._buffer = None
+
+    def _index(self, i: int) -> int:
+        # Aceita índice negativo (ex: -1 = última página), igual ao fitz
+        if i < 0: i += self.page_count
+        if not 0 <= i < self.page_count: raise IndexError(f"Página fora do intervalo: {i}")
+        return i
+
+    def page_text(self, i: int) -> str:
+        i = self._index(i)
+        if i not in self._text:
+            self._text[i] = self._doc[i].get_text("text")
+            METRICS.inc("pdf.paginas_decodificadas")
+        return self._text[i]
+
+    def page_text_norm(self, i: int) -> str:
+        i = self._index(i)
+        if i not in self._text_norm:
+            self._text_norm[i] = _norm_text(self.page_text(i))
+        return self._text_norm[i]
+
+    def page_blocks(self, i: int) -> list:
+        i = self._index(i)
+        if i not in self._blocks:
+            page = self._doc[i]
+            self._blocks[i] = page.get_text("blocks")
+            self._height[i] = page.rect.height
+        return self._blocks[i]
+
+    def page_height(self, i: int) -> float:
+        i = self._index(i)
+        if i not in self._height:
+            self._height[i] = self._doc[i].rect.height
+        return self._height[i]
+
+    def full_text(self) -> str:
+        return "\n".join(self.page_text(i) for i in range(self.page_count))
+
+# ==========================
+# CÓPIA LOCAL DOS PDFs (LEITURA ANTECIPADA)
+# ==========================
+class PdfPrefetcher:
+    """
+    Copia da montagem do Drive para o disco local, em segundo plano e com até `workers` cópias simultâneas,
+    os PDFs que vão ser lidos em seguida. A cópia recebe o mtime do original e só vale enquanto tamanho e mtime
+    baterem. Acima de `max_bytes` saem as cópias usadas há mais tempo (LRU, que sobrevive entre execuções pelo
+    atime), nunca uma agendada que ainda não foi lida e liberada (o teto pode estourar em no máximo uma janela).
+    Use a partir do processo principal: o pool de extração só recebe o caminho da cópia pronta, e qualquer fork
+    acontece dentro de pausado() (sem threads de cópia rodando).
+    """
+    def __init__(self, pasta: str = None, max_bytes: int = None, workers: int = PDF_PREFETCH_WORKERS):
+        self.pasta = pasta or PDF_PREFETCH_DIR
+        os.makedirs(self.pasta, exist_ok=True)
+        self.max_bytes = PDF_PREFETCH_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        self.adiante = 4 * max(1, workers)   # arquivos agendados à frente no planejamento
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="pdf_prefetch")
+        self._futuros = {}   # original -> cópia agendada e ainda não liberada (Future com o caminho local ou None)
+        copias = []
+        for nome in os.listdir(self.pasta):
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                if nome.endswith(".part"):
+                    os.remove(caminho)   # cópia interrompida numa execução anterior
+                else:
+                    st = os.stat(caminho)
+                    copias.append((st.st_atime_ns, caminho, st.st_size))
+            except OSError:
+                pass
+        self._lru = OrderedDict((caminho, tamanho) for _, caminho, tamanho in sorted(copias))
+        self._bytes = sum(self._lru.values())
+
+    def _local(self, origem: str) -> str:
+        return os.path.join(self.pasta, hashlib.sha1(os.path.abspath(origem).encode()).hexdigest() + ".pdf")
+
+    @staticmethod
+    def _valida(local: str, st) -> bool:
+        try:
+            copia = os.stat(local)
+        except OSError:
+            return False
+        return copia.st_size == st.st_size and copia.st_mtime_ns == st.st_mtime_ns
+
+    def _usar(self, local: str, tamanho: int):
+        """Cópia recém-usada: vai para o fim da LRU (e o atime guarda isso para a próxima execução)."""
+        try:
+            os.utime(local, ns=(time.time_ns(), os.stat(local).st_mtime_ns))
+        except OSError:
+            pass
+        with self._lock:
+            self._bytes += tamanho - self._lru.pop(local, 0)
+            self._lru[local] = tamanho
+            self._evict()
+
+    def _evict(self):
+        """Com o lock: apaga as cópias menos usadas até caber no teto (poupa as agendadas e ainda não liberadas)."""
+        if self._bytes <= self.max_bytes: return
+        protegidas = {self._local(origem) for origem in self._futuros}
+        for local in list(self._lru):
+            if self._bytes <= self.max_bytes: break
+            if local in protegidas: continue
+            try:
+                os.remove(local)
+            except OSError:
+                pass
+            self._bytes -= self._lru.pop(local)
+            METRICS.inc("pdf.copia_local.descartadas")
+
+    def _copiar(self, origem: str, st):
+        """Thread de cópia: devolve o caminho local pronto ou None (grande demais, arquivo mudou, disco cheio...)."""
+        local = self._local(origem)
+        if self._valida(local, st):
+            METRICS.inc("pdf.copia_local.reaproveitadas")
+            self._usar(local, st.st_size)
+            return local
+        if st.st_size > self.max_bytes: return None
+        parcial = f"{local}.{threading.get_ident()}.part"
+        t0 = time.perf_counter()
+        try:
+            shutil.copyfile(origem, parcial)
+            os.utime(parcial, ns=(time.time_ns(), st.st_mtime_ns))
+            if not self._valida(parcial, st) or not self._valida(origem, st):
+                raise OSError("o arquivo mudou durante a cópia")
+            os.replace(parcial, local)
+        except Exception:
+            try:
+                os.remove(parcial)
+            except OSError:
+                pass
+            METRICS.inc("pdf.copia_local.falhas")
+            return None
+        METRICS.observe("pdf.copia_local", time.perf_counter() - t0)
+        METRICS.inc("pdf.copia_local.bytes", st.st_size)
+        self._usar(local, st.st_size)
+        return local
+
+    def prefetch(self, arquivos):
+        """Agenda a cópia de [(caminho original, os.stat do original)] que ainda não estão agendadas."""
+        with self._lock:
+            for origem, st in arquivos:
+                if origem not in self._futuros:
+                    self._futuros[origem] = self._pool.submit(self._copiar, origem, st)
+
+    def acquire(self, origem: str, st):
+        """
+        Caminho da cópia local de `origem` (fica no disco até release()) ou None se não há cópia (nunca agendada,
+        falhou, grande demais): aí a leitura vai direto na montagem. Cópia ainda em andamento é esperada, porque é
+        a mesma leitura remota que a extração faria.
+        """
+        with self._lock:
+            futuro = self._futuros.get(origem)
+        if futuro is None:
+            METRICS.inc("pdf.copia_local.faltas")
+            return None
+        if not futuro.done():
+            with METRICS.timer("pdf.copia_local.espera"):
+                futuro.result()
+        local = futuro.result()
+        if local is None or not self._valida(local, st):
+            METRICS.inc("pdf.copia_local.faltas")
+            return None
+        METRICS.inc("pdf.copia_local.acertos")
+        self._usar(local, st.st_size)
+        return local
+
+    def release(self, origem: str):
+        """Fim da leitura: o agendamento é esquecido e a cópia volta a poder sair do disco."""
+        with self._lock:
+            self._futuros.pop(origem, None)
+            self._evict()
+
+    @contextmanager
+    def pausado(self):
+        """Sem nenhuma thread de cópia enquanto dura (para criar processos com fork): as agendadas terminam antes."""
+        self._pool.shutdown(wait=True)
+        try:
+            yield
+        finally:
+            self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="pdf_prefetch")
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
 # ==========================
 # FUNÇÕES AUXILIARES DE TEXTO E REGEX
 # ==========================
-def extract_pdf_text(pdf_path: str) -> str:
-    """Extrai TODO o texto do PDF página a página."""
+def extract_pdf_text(doc: PdfSession, paginas: int = None) -> str:
+    """Extrai o texto do PDF página a página: todo, ou só as `paginas` primeiras."""
     try:
-        doc = fitz.open(pdf_path)
-        pages_text = [page.get_text("text") for page in doc]
-        doc.close()
-        return "\n".join(pages_text)
+        if paginas is None or paginas >= doc.page_count: return doc.full_text()
+        return "\n".join(doc.page_text(i) for i in range(paginas))
     except Exception:
         return ""
 
 def _norm_text(s: str) -> str:
     s = (s.replace("\xa0", " ").replace("\u2009", " ").replace("\u200a", " ")
            .replace("\u200b", "").replace("–", "-").replace("—", "-").replace("-", "-"))
-    s = re.sub(r"[ \t]+", " ", s)
+    s = RE_ESPACOS_HORIZONTAIS.sub(" ", s)
     return s
 
 def _extract_clean_proa(cell_value):
@@ -92,7 +590,7 @@ def _extract_clean_proa(cell_value):
             val = parts[-2]
 
     # Retorna apenas números
-    return re.sub(r"\D", "", val)
+    return RE_NAO_DIGITO.sub("", val)
 
 def _parse_br_date(date_str: str):
     """Converte string 'dd/mm/aaaa' para objeto date. Retorna None se falhar."""
@@ -107,17 +605,17 @@ def _parse_br_date(date_str: str):
 
 def _clean_company_name(s: str) -> str:
     if not s: return ""
-    s = re.sub(r"\s+", " ", s).strip()
+    s = RE_ESPACOS.sub(" ", s).strip()
 
     # Validação imediata: Remove datas e lixo comum de OCR/Cabeçalhos
     s_upper = s.upper()
     blacklist = ["MINISTÉRIO", "PREFEITURA", "SECRETARIA", "ESTADO", "GOVERNO", "PROCESSO", "DATA DE", "COORDENADORIA", "TRIBUNAL", "INSCRITA"]
-    if len(s) < 3 or len(s) > 85 or any(b in s_upper for b in blacklist) or re.search(r"\d{1,2}\s+de\s+[a-zç]+\s+de\s+\d{4}", s_upper):
+    if len(s) < 3 or len(s) > 85 or any(b in s_upper for b in blacklist) or RE_DATA_POR_EXTENSO.search(s_upper):
         return ""
 
     # Corte inteligente: Prioriza sufixos empresariais
     # Ex: "Empresa LTDA. A seguir..." -> "EMPRESA LTDA"
-    m_suffix = re.search(r"^(.*?\s(?:LTDA|EIRELI|S\.?A|S\/A|EPP|ME|MEI|S\.S))(?=[\s.,;]|$)", s, re.IGNORECASE)
+    m_suffix = RE_SUFIXO_EMPRESARIAL.search(s)
     if m_suffix: return m_suffix.group(1).upper()
 
     # Fallback: Corte por ponto final de frase (evita pegar texto explicativo)
@@ -132,168 +630,794 @@ def _clean_company_name(s: str) -> str:
 def _flex_regex_escape(s: str) -> str:
     return r"\s+".join(re.escape(part) for part in s.split())
 
-def _slice_after_heading(text: str, heading: str, window: int = 1200) -> str:
-    heading_regex = _flex_regex_escape(heading)
-    m = re.search(heading_regex, text, flags=re.IGNORECASE)
+def _slice_after_heading(text: str, heading, window: int = 1200) -> str:
+    # heading pode ser texto ou um padrão já compilado (ex: RE_TERMO_ABERTURA)
+    heading_regex = heading if isinstance(heading, re.Pattern) else re.compile(_flex_regex_escape(heading), re.IGNORECASE)
+    m = heading_regex.search(text)
     if not m: return ""
     start = m.end()
     return text[start:start+window]
 
+# ==========================
+# ARMAZENAMENTO LOCAL (SQLITE)
+# ==========================
+class _SqliteStore:
+    """Base dos caches/manifestos locais: cria a pasta, abre a conexão e aplica o SCHEMA da subclasse."""
+    SCHEMA = ""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def commit(self):
+        if self._conn is not None: self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+# ==========================
+# MÉTRICAS DA EXECUÇÃO
+# ==========================
+class RunMetrics:
+    """
+    Contadores e cronômetros de uma execução (seguro para threads). Nomes com ponto agrupam por área:
+    etapa.*, extrator.*, arquivos.*, status.*, http.*, drive.*, planilha.*, eventos.*
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.inicio = time.time()
+            self.contadores = {}
+            self.tempos = {}
+            self.registros = {}
+
+    def inc(self, nome: str, n: int = 1):
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + n
+
+    def observe(self, nome: str, segundos: float):
+        with self._lock:
+            self.tempos.setdefault(nome, []).append(segundos)
+
+    def record(self, nome: str, item):
+        """Guarda um item para o relatório (ex: arquivos em quarentena), em lista por nome."""
+        with self._lock:
+            self.registros.setdefault(nome, []).append(item)
+
+    @contextmanager
+    def timer(self, nome: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(nome, time.perf_counter() - t0)
+
+    def raw(self) -> dict:
+        with self._lock:
+            return {"contadores": dict(self.contadores), "tempos": {k: list(v) for k, v in self.tempos.items()},
+                    "registros": {k: list(v) for k, v in self.registros.items()}}
+
+    def merge(self, raw: dict):
+        """Soma o que um processo filho mediu (ver _run_extraction)."""
+        with self._lock:
+            for k, v in raw.get("contadores", {}).items(): self.contadores[k] = self.contadores.get(k, 0) + v
+            for k, v in raw.get("tempos", {}).items(): self.tempos.setdefault(k, []).extend(v)
+            for k, v in raw.get("registros", {}).items(): self.registros.setdefault(k, []).extend(v)
+
+    @staticmethod
+    def _percentil(ordenadas, q):
+        return ordenadas[min(len(ordenadas) - 1, int(round(q * (len(ordenadas) - 1))))]
+
+    def summary(self) -> dict:
+        raw = self.raw()
+        tempos = {}
+        for nome, amostras in sorted(raw["tempos"].items()):
+            ordenadas = sorted(amostras)
+            tempos[nome] = {"n": len(ordenadas), "total_s": round(sum(ordenadas), 4),
+                            "p50_ms": round(self._percentil(ordenadas, 0.5) * 1000, 3),
+                            "p95_ms": round(self._percentil(ordenadas, 0.95) * 1000, 3),
+                            "max_ms": round(ordenadas[-1] * 1000, 3)}
+        return {"inicio": datetime.datetime.fromtimestamp(self.inicio).isoformat(timespec="seconds"),
+                "duracao_s": round(time.time() - self.inicio, 3),
+                "contadores": dict(sorted(raw["contadores"].items())), "tempos": tempos,
+                "registros": raw["registros"]}
+
+    def to_prometheus(self, prefixo: str = "proa_pipeline") -> str:
+        """Formato textfile do node_exporter: contadores como counter, cronômetros como summary."""
+        resumo = self.summary()
+        nome_ok = lambda n: re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefixo}_{n}")
+        linhas = [f"# TYPE {prefixo}_last_run_timestamp_seconds gauge",
+                  f"{prefixo}_last_run_timestamp_seconds {self.inicio:.0f}",
+                  f"# TYPE {prefixo}_last_run_duration_seconds gauge",
+                  f"{prefixo}_last_run_duration_seconds {resumo['duracao_s']}"]
+        for nome, valor in resumo["contadores"].items():
+            linhas += [f"# TYPE {nome_ok(nome)}_total counter", f"{nome_ok(nome)}_total {valor}"]
+        for nome, t in resumo["tempos"].items():
+            base = nome_ok(nome) + "_seconds"
+            linhas += [f"# TYPE {base} summary",
+                       f'{base}{{quantile="0.5"}} {t["p50_ms"] / 1000}',
+                       f'{base}{{quantile="0.95"}} {t["p95_ms"] / 1000}',
+                       f"{base}_sum {t['total_s']}", f"{base}_count {t['n']}"]
+        return "\n".join(linhas) + "\n"
+
+    def write(self, json_path: str = None, prom_path: str = None) -> dict:
+        """Grava o relatório JSON e o textfile do Prometheus (escrita atômica: o coletor nunca lê arquivo pela metade)."""
+        resumo = self.summary()
+        for path, conteudo in ((json_path or RUN_REPORT_PATH, json.dumps(resumo, ensure_ascii=False, indent=2)),
+                               (prom_path or RUN_METRICS_PROM_PATH, self.to_prometheus())):
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with open(path + ".tmp", "w", encoding="utf-8") as f: f.write(conteudo)
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"⚠️ Não foi possível gravar {path}: {e}")
+        return resumo
+
+# Métricas da execução atual (process_all_pdfs zera no início e grava o relatório no fim)
+METRICS = RunMetrics()
+
+def _medir(nome: str, fn, *args):
+    """Chama fn(*args) cronometrando em METRICS com o nome dado."""
+    with METRICS.timer(nome):
+        return fn(*args)
+
 # ==========================
 # FUNÇÕES DE EXTRAÇÃO ESPECÍFICAS
 # ==========================
-def get_situacao_processo_web(processo_id: str) -> str:
-    base_url = "https://secweb.procergs.com.br/pra-aj4/public/proa_retorno_consulta_publica.xhtml"
+class CircuitBreaker:
+    """
+    Disjuntor simples (seguro para threads): abre depois de `limite` consultas seguidas com falha e fica aberto por `pausa`
+    segundos. Passada a pausa, deixa uma consulta de teste passar; sucesso fecha, falha reabre.
+    """
+    def __init__(self, limite: int = PROA_CIRCUIT_FALHAS, pausa: float = PROA_CIRCUIT_PAUSA_SEG):
+        self.limite = limite
+        self.pausa = pausa
+        self.falhas = 0
+        self._aberto_em = None
+        self._lock = threading.Lock()
+
+    @property
+    def aberto(self) -> bool:
+        return self._aberto_em is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._aberto_em is None: return True
+            if time.monotonic() - self._aberto_em >= self.pausa:
+                self._aberto_em = time.monotonic()  # meia-abertura: só esta consulta passa até a próxima pausa
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.falhas = 0
+            self._aberto_em = None
+
+    def record_failure(self):
+        with self._lock:
+            self.falhas += 1
+            if self.falhas >= self.limite and self._aberto_em is None:
+                print(f"⛔ Portal PROA falhou em {self.falhas} consultas seguidas. Consultas suspensas por {self.pausa:g}s.")
+                self._aberto_em = time.monotonic()
+            elif self._aberto_em is not None:
+                self._aberto_em = time.monotonic()
+
+_PROA_SESSION = None
+_PROA_SESSION_LOCK = threading.Lock()
+
+def _get_proa_session() -> requests.Session:
+    """Sessão HTTP compartilhada (keep-alive): reaproveita a conexão TCP+TLS entre as consultas e as threads."""
+    global _PROA_SESSION
+    with _PROA_SESSION_LOCK:
+        if _PROA_SESSION is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, PROA_STATUS_WORKERS))
+            session.mount("https://", adapter)
+            session.headers.update({'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'})
+            _PROA_SESSION = session
+        return _PROA_SESSION
+
+def _backoff_seconds(tentativa: int, retry_after: str = None) -> float:
+    """Espera exponencial com jitter total; respeita Retry-After (em segundos) se o portal mandar."""
+    if retry_after and str(retry_after).isdigit():
+        return min(float(retry_after), PROA_BACKOFF_MAX)
+    return random.uniform(0, min(PROA_BACKOFF_MAX, PROA_BACKOFF_BASE * (2 ** tentativa)))
+
+def get_situacao_processo_web(processo_id: str, session=None, breaker: CircuitBreaker = None, limiter=None) -> str:
     params = {"numeroProcesso": processo_id}
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-    situacao_padrao = "ERRO: Não encontrado"
+    session = session or _get_proa_session()
+
+    # Tenta de novo só o que é transitório (rede, timeout, 429, 5xx); o disjuntor corta tudo se o portal cair
+    response = None
+    for tentativa in range(PROA_HTTP_RETRIES + 1):
+        if breaker is not None and not breaker.allow(): return ERR_MSG_STATUS_ADIADO
+        if limiter is not None: limiter.acquire()
+        if tentativa: METRICS.inc("http.retentativas")
+        try:
+            with METRICS.timer("http.portal"):
+                response = session.get(PROA_CONSULTA_URL, params=params, timeout=PROA_HTTP_TIMEOUT)
+            if response.status_code != 429 and response.status_code < 500: break
+            retry_after = response.headers.get("Retry-After")
+        except requests.RequestException:
+            response, retry_after = None, None
+        METRICS.inc("http.falhas")
+        if tentativa < PROA_HTTP_RETRIES: time.sleep(_backoff_seconds(tentativa, retry_after))
+    else:
+        # Uma falha por consulta no disjuntor, não uma por tentativa
+        if breaker is not None: breaker.record_failure()
+        return "ERRO: Falha na conexão/HTTP"
+    if breaker is not None: breaker.record_success()
+
     try:
-        response = requests.get(base_url, params=params, headers=headers, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        situacao_label_tag = soup.find('label', string=re.compile(r"Situação:"))
-        if situacao_label_tag:
-            try:
-                parent_td = situacao_label_tag.find_parent('td')
-                value_td = parent_td.find_next_sibling('td')
-                val = value_td.get_text(strip=True)
-                return val if val else situacao_padrao
-            except: return "ERRO: Falha no parse do HTML"
-        else: return situacao_padrao
+        html_text = response.text
     except: return "ERRO: Falha na conexão/HTTP"
+    val = _medir("status.parse_rapido", _parse_situacao_fast, html_text)
+    if val is not None: return val
+    METRICS.inc("status.parse_bs4")
+    return _medir("status.parse_bs4", _parse_situacao_soup, html_text)
 
-def get_numero_contrato(text: str) -> str:
-    padrao1 = r"TERMO\s+DE\s+CONTRATO\s+EMERGENCIAL\s+DE\s+OBRAS\s+E\s+SERVI[ÇC]OS\s+DE\s+ENGENHARIA\s*N[º°]?\s*([0-9]{1,4}/[0-9]{4})"
-    m = re.search(padrao1, text, flags=re.IGNORECASE)
-    if m: return m.group(1).strip()
-    padrao2 = r"CONTRATO[^\n]{0,120}?N[º°]?\s*([0-9]{1,4}/[0-9]{4})"
-    m2 = re.search(padrao2, text, flags=re.IGNORECASE)
-    if m2: return m2.group(1).strip()
-    return ""
+def _parse_situacao_soup(html_text: str) -> str:
+    """Leitura completa com BeautifulSoup: acha o label 'Situação:' e pega o texto do <td> vizinho."""
+    situacao_padrao = "ERRO: Não encontrado"
+    try:
+        soup = bs4.BeautifulSoup(html_text, 'html.parser')
+    except: return "ERRO: Falha no parse do HTML"
+    situacao_label_tag = soup.find('label', string=RE_SITUACAO_LABEL)
+    if situacao_label_tag:
+        try:
+            parent_td = situacao_label_tag.find_parent('td')
+            value_td = parent_td.find_next_sibling('td')
+            val = value_td.get_text(strip=True)
+            return val if val else situacao_padrao
+        except: return "ERRO: Falha no parse do HTML"
+    else: return situacao_padrao
+
+def _html_tags_balanced(fragment: str) -> bool:
+    """True se toda tag fechada no trecho foi aberta nele (uma tag solta faria o parser reorganizar a árvore)."""
+    abertas = []
+    for fecha, nome, auto in RE_HTML_TAG_NOME.findall(fragment):
+        nome = nome.lower()
+        if nome in HTML_TAGS_VAZIAS or auto: continue
+        if not fecha: abertas.append(nome)
+        elif not abertas or abertas.pop() != nome: return False
+    return not abertas
+
+def _parse_situacao_fast(html_text: str):
+    """
+    Caminho rápido para o layout conhecido do portal: <td><label>Situação:</label></td><td>VALOR</td>.
+    Varre só até o primeiro label 'Situação:' e o <td> seguinte. Devolve None sempre que o trecho fugir
+    desse formato (tags aninhadas no label, tabela dentro do valor, comentários...), e aí vale o BeautifulSoup.
+    """
+    for m in RE_HTML_LABEL.finditer(html_text):
+        conteudo = m.group(1)
+        if not RE_SITUACAO_LABEL.search(html.unescape(RE_HTML_TAG.sub("", conteudo))): continue
+        if "<" in conteudo: return None
+
+        # Fecha o <td> do label (sem abrir/fechar outra célula no caminho) e lê o <td> vizinho
+        fim_td = RE_HTML_FIM_TD.search(html_text, m.end())
+        if not fim_td or RE_HTML_ESTRUTURA.search(html_text, m.end(), fim_td.start()): return None
+        if not _html_tags_balanced(html_text[m.end():fim_td.start()]): return None
+        valor = RE_HTML_TD_SEGUINTE.match(html_text, fim_td.end())
+        if not valor or RE_HTML_ESTRUTURA.search(valor.group(1)) or not _html_tags_balanced(valor.group(1)): return None
+
+        # Mesmo resultado de get_text(strip=True): cada trecho de texto sem espaços nas pontas, tudo colado
+        val = "".join(html.unescape(t).strip() for t in RE_HTML_TAG.split(valor.group(1)))
+        return val if val else "ERRO: Não encontrado"
+    return None
+
+class TokenBucket:
+    """Limitador de taxa (token bucket) seguro para várias threads."""
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def _status_ttl(status: str) -> int:
+    """Validade no cache conforme o status: finais duram muito, erros não duram nada."""
+    val = str(status).strip().lower()
+    if not val or val.startswith("erro"): return STATUS_TTL_ERRO
+    if any(f in val for f in STATUS_FINAIS): return STATUS_TTL_FINAL
+    return STATUS_TTL_PADRAO
+
+class StatusCache(_SqliteStore):
+    """
+    Cache em SQLite dos status do portal, chaveado pelo PROA só com dígitos.
+    A validade é calculada na leitura (_status_ttl), então mudar os TTLs vale para o que já está gravado.
+    `tentativas` guarda a hora da última consulta de cada número, inclusive as que deram erro (idade na fila).
+    Use apenas a partir da thread principal.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS status (numero TEXT PRIMARY KEY, status TEXT NOT NULL, consultado_em REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS tentativas (numero TEXT PRIMARY KEY, tentado_em REAL NOT NULL);
+    """
 
-def get_nome_empresa(text: str) -> str:
-    texto_normalizado = _norm_text(text)
-
-    # M1 e M2: Padrões de texto jurídico (Intenção/Contra)
-    # Regex ajustado para não travar em pontos de abreviação (J.S.), parando em keywords fortes
-    patterns = [
-        r"intenç(?:ão|ao)\s+de\s+instaurar\s+procedimento\s+notificat(?:ório|orio)\s+contra\s+(?:a\s+)?empresa\s+(.+?)(?=[,;]|inscrita|CNPJ|sediada|$)",
-        r"contra\s+(?:a\s+)?empresa\s*[,;]?\s*(.+?)(?=[,;]|inscrita|CNPJ|sediada|$)"
-    ]
-    for pat in patterns:
-        m = re.search(pat, texto_normalizado, flags=re.IGNORECASE | re.DOTALL)
-        if m:
-            clean = _clean_company_name(m.group(1))
+    def __init__(self, path: str = STATUS_CACHE_PATH):
+        super().__init__(path)
+
+    def _select_in(self, sql: str, numeros):
+        """Executa `sql` (com `{}` no lugar da lista do IN) em blocos de 500 números."""
+        numeros = list(numeros)
+        for i in range(0, len(numeros), 500):
+            lote = numeros[i:i+500]
+            yield from self._conn.execute(sql.format(",".join("?" * len(lote))), lote)
+
+    def get_many(self, numeros) -> dict:
+        """Devolve {numero: status} apenas dos que ainda estão dentro da validade."""
+        agora = time.time()
+        return {numero: status for numero, status, consultado_em in
+                self._select_in("SELECT numero, status, consultado_em FROM status WHERE numero IN ({})", numeros)
+                if agora - consultado_em < _status_ttl(status)}
+
+    def last_known(self, numeros) -> dict:
+        """
+        {numero: (último status bom ou "", horas desde a última consulta)}, vencidos inclusive.
+        Números nunca consultados ficam de fora.
+        """
+        vistos = {numero: (status, consultado_em) for numero, status, consultado_em in
+                  self._select_in("SELECT numero, status, consultado_em FROM status WHERE numero IN ({})", numeros)}
+        for numero, tentado_em in self._select_in("SELECT numero, tentado_em FROM tentativas WHERE numero IN ({})", numeros):
+            status, quando = vistos.get(numero, ("", 0.0))
+            vistos[numero] = (status, max(quando, tentado_em))
+        agora = time.time()
+        return {n: (status, (agora - quando) / 3600) for n, (status, quando) in vistos.items()}
+
+    def put_many(self, status_map: dict):
+        """Grava os status novos. Erros nunca entram no cache, mas contam como tentativa (menos os adiados)."""
+        agora = time.time()
+        rows = [(n, st, agora) for n, st in status_map.items() if n and _status_ttl(st) > 0]
+        self._conn.executemany("INSERT OR REPLACE INTO status (numero, status, consultado_em) VALUES (?, ?, ?)", rows)
+        tentativas = [(n, agora) for n, st in status_map.items()
+                      if n and st not in (ERR_MSG_STATUS_ADIADO, ERR_MSG_STATUS_ORCAMENTO)]
+        self._conn.executemany("INSERT OR REPLACE INTO tentativas (numero, tentado_em) VALUES (?, ?)", tentativas)
+        self._conn.commit()
+
+    def invalidate(self, numeros=None):
+        """Apaga os números informados (ou tudo, se None) para forçar nova consulta."""
+        if numeros is None:
+            self._conn.execute("DELETE FROM status")
+            self._conn.execute("DELETE FROM tentativas")
+        else:
+            self._conn.executemany("DELETE FROM status WHERE numero = ?", [(n,) for n in numeros])
+            self._conn.executemany("DELETE FROM tentativas WHERE numero = ?", [(n,) for n in numeros])
+        self._conn.commit()
+
+def fetch_status_batch(numeros, rate: float = PROA_REQUESTS_PER_SECOND, workers: int = PROA_STATUS_WORKERS,
+                       cache: StatusCache = None, force_refresh: bool = False, breaker: CircuitBreaker = None) -> dict:
+    """
+    Consulta o status de vários PROAs em paralelo, respeitando `rate` req/s no portal.
+    Recebe números (com ou sem máscara) e devolve {numero_so_digitos: status}.
+    Com `cache`, reaproveita status ainda válidos (exceto se force_refresh=True) e grava os novos.
+    `breaker` pode ser compartilhado entre chamadas (lotes) para não insistir num portal fora do ar.
+    """
+    todos = sorted({re.sub(r"\D", "", str(n)) for n in numeros} - {""})
+    if not todos: return {}
+
+    em_cache = cache.get_many(todos) if cache is not None and not force_refresh else {}
+    pendentes = [n for n in todos if n not in em_cache]
+    METRICS.inc("status.cache_hits", len(em_cache))
+    METRICS.inc("status.consultas", len(pendentes))
+    if em_cache:
+        print(f"💾 Status em cache: {len(em_cache)} | a consultar: {len(pendentes)}")
+    if not pendentes: return em_cache
+
+    limiter = TokenBucket(rate)
+    breaker = breaker or CircuitBreaker()
+    session = _get_proa_session()
+    def consultar(num):
+        try: return get_situacao_processo_web(num, session=session, breaker=breaker, limiter=limiter) or ""
+        except Exception: return "ERRO: Falha na conexão/HTTP"
+
+    print(f"🔎 Consultando status de {len(pendentes)} PROAs ({workers} threads, {rate:g} req/s)...")
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        status = dict(zip(pendentes, pool.map(consultar, pendentes)))
+    n_erros = sum(1 for v in status.values() if v.upper().startswith("ERRO"))
+    n_adiados = sum(1 for v in status.values() if v == ERR_MSG_STATUS_ADIADO)
+    METRICS.inc("status.erros", n_erros - n_adiados)
+    METRICS.inc("status.adiados", n_adiados)
+    print(f"→ Status obtidos: {len(status)} ({n_erros} com erro) em {time.perf_counter() - t0:.2f}s")
+    if n_adiados:
+        print(f"⏸️ {n_adiados} consultas adiadas (portal indisponível); serão refeitas na próxima execução.")
+    if cache is not None:
+        cache.put_many(status)
+    return {**em_cache, **status}
+
+def status_priority(horas, status: str, data_atualizacao=None, hoje=None) -> float:
+    """
+    Urgência de reconsultar um processo no portal (maior = antes): horas desde a última consulta × peso do status
+    atual × recência da última atualização do processo. Nunca consultado (horas=None) vem antes de todos.
+    """
+    if horas is None: return float("inf")
+    val = str(status).strip().lower()
+    if not val or val.startswith("erro"): peso = STATUS_PESO_ERRO
+    elif any(f in val for f in STATUS_FINAIS): peso = STATUS_PESO_FINAL
+    else: peso = 1.0
+    recencia = 1.0
+    if data_atualizacao is not None:
+        dias = max(0, ((hoje or datetime.date.today()) - data_atualizacao).days)
+        recencia += STATUS_RECENCIA_DIAS / (STATUS_RECENCIA_DIAS + dias)
+    return horas * peso * recencia
+
+class StatusScheduler:
+    """
+    Decide quais processos consultar no portal numa execução, e em que ordem, dentro de um orçamento de
+    requisições (`orcamento`; None = sem limite) compartilhado entre os lotes, como o disjuntor.
+    - Lotes (for_rows): status válido sai do cache; quem nunca foi consultado vai ao portal na hora (seria o primeiro
+      de qualquer fila); vencidos ficam com o último status conhecido e esperam a fila do fim.
+    - Fim da execução (refresh_stale): os processos da planilha com status vencido são ordenados por status_priority
+      e os primeiros que cabem no que sobrou do orçamento são consultados.
+    O que não coube fica para a próxima execução: a espera só aumenta a prioridade, então a fila anda.
+    """
+    def __init__(self, cache: StatusCache = None, orcamento: int = STATUS_REFRESH_BUDGET, breaker: CircuitBreaker = None,
+                 force_refresh: bool = False):
+        self.cache, self.orcamento, self.force_refresh = cache, orcamento, force_refresh
+        self.breaker = breaker or CircuitBreaker()
+        self.usadas, self.pendentes = 0, 0
+        self.consultados = set()
+
+    def _consultar(self, fila: list) -> tuple:
+        """Consulta os primeiros da fila que cabem no orçamento. Devolve ({numero: status}, resto da fila)."""
+        fila = [n for n in fila if n not in self.consultados]
+        cabem = len(fila) if self.orcamento is None else max(0, min(len(fila), self.orcamento - self.usadas))
+        agora, resto = fila[:cabem], fila[cabem:]
+        self.usadas += len(agora)
+        self.consultados.update(agora)
+        # A decisão de cache já foi tomada aqui: fetch_status_batch só consulta e grava
+        status = fetch_status_batch(agora, cache=self.cache, force_refresh=True, breaker=self.breaker) if agora else {}
+        return status, resto
+
+    def _stale(self, numeros) -> tuple:
+        """(válidos no cache, vencidos, últimos conhecidos dos vencidos)."""
+        validos = self.cache.get_many(numeros) if self.cache is not None and not self.force_refresh else {}
+        vencidos = [n for n in numeros if n not in validos]
+        conhecidos = self.cache.last_known(vencidos) if self.cache is not None else {}
+        return validos, vencidos, conhecidos
+
+    def for_rows(self, numeros) -> dict:
+        """Status das linhas de um lote: {numero_so_digitos: status}."""
+        todos = sorted({RE_NAO_DIGITO.sub("", str(n)) for n in numeros} - {""})
+        if not todos: return {}
+        validos, vencidos, conhecidos = self._stale(todos)
+        METRICS.inc("status.cache_hits", len(validos))
+        if validos or conhecidos:
+            print(f"💾 Status em cache: {len(validos)} | vencidos (fila do fim): {len(conhecidos)} | "
+                  f"nunca consultados: {len(vencidos) - len(conhecidos)}")
+        status, fora = self._consultar([n for n in vencidos if n not in conhecidos])
+        if fora:
+            METRICS.inc("status.adiados_orcamento", len(fora))
+            print(f"⏸️ {len(fora)} consultas passaram do orçamento da execução ({self.orcamento}); ficam para a próxima.")
+        resultado = {**validos, **status}
+        for n in vencidos:
+            if n not in resultado: resultado[n] = conhecidos.get(n, ("",))[0] or ERR_MSG_STATUS_ORCAMENTO
+        return resultado
+
+    def refresh_stale(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fila do fim da execução: reconsulta os status vencidos da planilha, do mais urgente ao menos."""
+        # Sem o cache não há como saber quem está vencido: fica só com o que os lotes consultaram
+        if self.cache is None or df.empty: return df
+        chaves = df["proa_notificatorio"].map(_extract_clean_proa)
+        atuais = dict(zip(chaves, df["status_processo"].map(_cell_str)))
+        datas = dict(zip(chaves, df["ultima_atualizacao_processo"].map(lambda v: _parse_br_date(_cell_str(v)))))
+        _, vencidos, conhecidos = self._stale(sorted(set(chaves) - {""} - self.consultados))
+        hoje = datetime.date.today()
+        fila = sorted(vencidos, reverse=True, key=lambda n: status_priority(
+            conhecidos[n][1] if n in conhecidos else None, atuais.get(n) or conhecidos.get(n, ("",))[0], datas.get(n), hoje))
+        if fila:
+            print(f"🗓️ Fila de status: {len(fila)} vencidos, orçamento restante "
+                  f"{'sem limite' if self.orcamento is None else max(0, self.orcamento - self.usadas)}")
+        status, resto = self._consultar(fila)
+        self.pendentes = len(resto)
+        METRICS.inc("status.fila_restante", len(resto))
+        if resto:
+            print(f"⏭️ {len(resto)} status vencidos ficam para a próxima execução (orçamento de {self.orcamento} consultas).")
+        # Erro ou adiamento não apaga um status bom que já está na planilha
+        novos = {n: st for n, st in status.items()
+                 if not st.upper().startswith("ERRO") or not atuais.get(n) or atuais[n].upper().startswith("ERRO")}
+        if novos:
+            mask = chaves.isin(list(novos))
+            df.loc[mask, "status_processo"] = chaves[mask].map(novos)
+        return df
+
+class ExtractionEngine:
+    """
+    Texto completo de um documento com os intermediários calculados uma única vez (sob demanda):
+    texto normalizado, PROAs encontrados, primeira página, bloco após o TERMO DE ABERTURA e nome da empresa.
+    Os get_* aceitam tanto uma string quanto um ExtractionEngine; extract_fields_from_pdf cria um só por PDF.
+    """
+    def __init__(self, text: str):
+        self.text = text
+
+    @cached_property
+    def text_norm(self) -> str:
+        return _norm_text(self.text)
+
+    @cached_property
+    def proas(self) -> list:
+        return RE_PROA.findall(self.text)
+
+    @cached_property
+    def text_p1(self) -> str:
+        # Separação de página para evitar falsos positivos no restante do doc
+        pages = self.text_norm.split('\x0c')
+        return pages[0] if len(pages) > 1 else self.text_norm[:3000]
+
+    @cached_property
+    def bloco_abertura(self) -> str:
+        return _slice_after_heading(self.text_norm, RE_TERMO_ABERTURA, window=3000)
+
+    def numero_contrato(self) -> str:
+        m = RE_CONTRATO_EMERGENCIAL.search(self.text)
+        if m: return m.group(1).strip()
+        m2 = RE_CONTRATO_GENERICO.search(self.text)
+        if m2: return m2.group(1).strip()
+        return ""
+
+    @cached_property
+    def nome_empresa(self) -> str:
+        # M1 e M2: Padrões de texto jurídico (Intenção/Contra)
+        for prefixo in RE_NOME_EMPRESA_JURIDICO:
+            bruto = _nome_apos_prefixo(self.text_norm, prefixo)
+            if bruto:
+                clean = _clean_company_name(bruto)
+                if clean: return clean
+
+        # M3: Cabeçalho Explícito
+        m3 = RE_EMPRESA_CABECALHO.search(self.text_p1)
+        if m3:
+            clean = _clean_company_name(m3.group(1))
             if clean: return clean
 
-    # Separação de página para evitar falsos positivos no restante do doc
-    pages = texto_normalizado.split('\x0c')
-    text_p1 = pages[0] if len(pages) > 1 else texto_normalizado[:3000]
+        # M4: Padrão Tipo/CTO (Mesma linha)
+        m4 = RE_TIPO_CTO.search(self.text_p1)
+        if m4:
+            clean = _clean_company_name(m4.group(1))
+            if clean: return clean
 
-    # M3: Cabeçalho Explícito
-    m3 = re.search(r"Empresa\s*:\s*(.+?)(?=\n|Local:|CNPJ|Endereço:|$)", text_p1, flags=re.IGNORECASE)
-    if m3:
-        clean = _clean_company_name(m3.group(1))
-        if clean: return clean
-
-    # M4: Padrão Tipo/CTO (Mesma linha)
-    m4 = re.search(r"Tipo\s*:\s*(.+?)\s*-\s*CTO", text_p1, flags=re.IGNORECASE)
-    if m4:
-        clean = _clean_company_name(m4.group(1))
-        if clean: return clean
-
-    return "ERRO AO ENCONTRAR O NOME DA EMPRESA"
-
-def get_cnpj_empresa(text: str) -> str:
-    CNPJ_SEDUC = "92941681000100"
-    texto_normalizado = _norm_text(text)
-    CNPJ_FLEX = r"(\d{2})\s*[\.\-\/]?\s*(\d{3})\s*[\.\-\/]?\s*(\d{3})\s*[\.\-\/]?\s*(\d{4})\s*[\.\-\/]?\s*(\d{2})"
-    PREFIXOS = [r"inscrita\s+no\s+minist[ée]rio\s+da\s+fazenda", r"inscri[çc][ãa]o\s+n[ºo]?\s+cnpj", r"cnpj\s*[:\-]?\s*", r"sob\s+o\s+n[ºo]?\s*"]
-
-    bloco = _slice_after_heading(texto_normalizado, "TERMO DE ABERTURA", window=3000) or texto_normalizado
-    nome = get_nome_empresa(texto_normalizado)
-
-    # 1. Tenta com ancora do nome
-    if nome and "ERRO" not in nome.upper():
-        nome_flex = re.escape(nome.strip()).replace(r"\ ", r"\s+")
-        pattern = re.compile(rf"empresa\s+{nome_flex}\s*[,;]?\s*(?:{'|'.join(PREFIXOS)})\s*{CNPJ_FLEX}", re.IGNORECASE | re.DOTALL)
-        m = pattern.search(bloco)
+        return "ERRO AO ENCONTRAR O NOME DA EMPRESA"
+
+    def cnpj_empresa(self) -> str:
+        texto_normalizado = self.text_norm
+        bloco = self.bloco_abertura or texto_normalizado
+        nome = self.nome_empresa
+
+        # 0. Frase de intenção (M1): o CNPJ que acompanha o nome na mesma frase
+        m = _cnpj_apos_intencao(texto_normalizado)
         if m:
             d = "".join(m.groups())
-            if d != CNPJ_SEDUC: return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+            return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
 
-    # 2. Fallback
-    for prefixo in PREFIXOS:
-        pattern = re.compile(rf"{prefixo}\s*{CNPJ_FLEX}", re.IGNORECASE | re.DOTALL)
-        for tb in [bloco, texto_normalizado]:
-            for m in pattern.finditer(tb):
+        # 1. Tenta com ancora do nome
+        if nome and "ERRO" not in nome.upper():
+            m = _search_cnpj_after_name(bloco, nome)
+            if m:
                 d = "".join(m.groups())
                 if d != CNPJ_SEDUC: return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
-    return "ERRO AO ENCONTRAR O CNPJ"
-
-def get_proa_notificatorio(text: str):
-    ms = re.findall(r"\b(\d{2}\/\d{4}-\d{7}-\d)\b", text)
-    return ms[0] if ms else ""
 
-def get_proa_mae(text: str, proa_atual: str):
-    all_proas = re.findall(r"\b(\d{2}\/\d{4}-\d{7}-\d)\b", text)
-    candidates = [p for p in all_proas if p != proa_atual]
-    if not candidates: return ""
-    # Pega o mais antigo (menor ano)
-    candidates.sort(key=lambda p: int(p.split("/")[0]) if p.split("/")[0].isdigit() else 99)
-    return candidates[0]
+        # 2. Fallback
+        for pattern in RE_CNPJ_PREFIXADO:
+            for tb in [bloco, texto_normalizado]:
+                for m in pattern.finditer(tb):
+                    d = "".join(m.groups())
+                    if d != CNPJ_SEDUC: return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+        return "ERRO AO ENCONTRAR O CNPJ"
+
+    def proa_notificatorio(self) -> str:
+        return self.proas[0] if self.proas else ""
+
+    def proa_mae(self, proa_atual: str) -> str:
+        candidates = [p for p in self.proas if p != proa_atual]
+        if not candidates: return ""
+        # Pega o mais antigo (menor ano)
+        candidates.sort(key=lambda p: int(p.split("/")[0]) if p.split("/")[0].isdigit() else 99)
+        return candidates[0]
+
+def _nome_apos_prefixo(texto: str, prefixo) -> str:
+    """
+    Equivale a prefixo + (.+?)(?=[,;]|inscrita|CNPJ|sediada|$) com DOTALL, mas procura o fim com uma busca
+    literal limitada a NOME_EMPRESA_JANELA caracteres: custo linear, mesmo sem keyword de fim no resto do texto.
+    """
+    m = prefixo.search(texto)
+    if not m or m.end() >= len(texto): return ""
+    inicio = m.end()
+    fim = RE_NOME_EMPRESA_FIM.search(texto, inicio + 1, inicio + NOME_EMPRESA_JANELA + 1)
+    if fim: return texto[inicio:fim.start()]
+    return texto[inicio:] if len(texto) - inicio <= NOME_EMPRESA_JANELA else ""
+
+def _nome_intencao(texto: str):
+    """(nome, posição do fim do nome) da frase de intenção (M1), ou None se ela não tiver nome válido antes do fim."""
+    m = RE_NOME_EMPRESA_JURIDICO[0].search(texto)
+    if not m: return None
+    fim = RE_NOME_EMPRESA_FIM.search(texto, m.end() + 1, m.end() + NOME_EMPRESA_JANELA + 1)
+    if not fim: return None
+    nome = _clean_company_name(texto[m.end():fim.start()])
+    return (nome, fim.start()) if nome else None
+
+def _cnpj_apos_intencao(texto: str):
+    """Primeiro CNPJ (com prefixo, fora o da SEDUC) até CNPJ_JANELA_INTENCAO caracteres depois do nome da M1."""
+    achado = _nome_intencao(texto)
+    if not achado: return None
+    pos = achado[1]
+    for m in RE_CNPJ_APOS_NOME.finditer(texto, pos, pos + CNPJ_JANELA_INTENCAO):
+        if "".join(m.groups()) != CNPJ_SEDUC: return m
+    return None
+
+def _search_cnpj_after_name(bloco: str, nome: str):
+    """
+    Equivale a search(rf"empresa\\s+{nome com \\s+ entre as palavras}{RE_CNPJ_APOS_NOME}"),
+    sem compilar um regex novo para cada nome: compara as palavras do nome literalmente
+    (sem diferenciar maiúsculas) logo após cada "empresa" e só então roda o padrão pré-compilado.
+    """
+    tokens = nome.split()
+    if not tokens: return None
+    for m_emp in RE_EMPRESA_ANCORA.finditer(bloco):
+        pos = m_emp.end()
+        for j, tok in enumerate(tokens):
+            if j:
+                m_ws = RE_ESPACOS.match(bloco, pos)
+                if not m_ws: break
+                pos = m_ws.end()
+            if bloco[pos:pos+len(tok)].lower() != tok.lower(): break
+            pos += len(tok)
+        else:
+            m = RE_CNPJ_APOS_NOME.match(bloco, pos)
+            if m: return m
+    return None
+
+def _engine(text) -> ExtractionEngine:
+    return text if isinstance(text, ExtractionEngine) else ExtractionEngine(text)
+
+# Região que cada campo do motor lê no modo "lazy" (expediente e rodapé já leem página a página no PdfSession)
+# O "inicio" é um prefixo do texto completo: um achado ali só vale se nada mais adiante pode mudá-lo. Contrato só
+# se for o emergencial (padrão de maior prioridade); empresa só pelo M1 com o fim do nome dentro do início; CNPJ
+# só o da mesma frase de intenção (passo 0 de cnpj_empresa). Fora disso, amplia para o documento inteiro
+CAMPO_REGIAO = {"proa_notificatorio": "inicio", "numero_contrato": "inicio", "nome_empresa": "inicio",
+                "cnpj_empresa": "inicio", "proa_mae": "mae"}
+
+def _empresa_definitiva(engine) -> bool:
+    # M1 é o primeiro padrão tentado: o primeiro M1 do início é o do documento, se o nome termina antes do corte
+    return _nome_intencao(engine.text_norm) is not None
+
+def _cnpj_definitivo(engine) -> bool:
+    # Passo 0 de cnpj_empresa: o CNPJ da frase de intenção, inteiro antes do corte
+    m = _cnpj_apos_intencao(engine.text_norm)
+    return m is not None and m.end() < len(engine.text_norm)
+
+CAMPO_DEFINITIVO_INICIO = {
+    "numero_contrato": lambda engine: RE_CONTRATO_EMERGENCIAL.search(engine.text) is not None,
+    "nome_empresa": _empresa_definitiva,
+    "cnpj_empresa": _cnpj_definitivo,
+}
+
+def _campo_vazio(valor) -> bool:
+    return not valor or str(valor).startswith("ERRO")
+
+class DocumentRegions:
+    """
+    Um ExtractionEngine por região do PDF, montado só quando algum campo pede: "inicio" decodifica as
+    PDF_PAGINAS_INICIO primeiras páginas e "documento" todas. No modo "full" (ou em PDF curto) é o mesmo motor.
+    O início é um prefixo do texto completo, então um achado ali só é aceito quando nada mais adiante pode mudá-lo
+    (ver CAMPO_REGIAO e CAMPO_DEFINITIVO_INICIO); senão a busca amplia para o documento inteiro.
+    "mae" (PDF_PAGINAS_PROA_MAE páginas) é a região do PROA mãe nos dois modos: o documento só se ali não houver.
+    """
+    def __init__(self, doc: PdfSession, modo: str = None, paginas_inicio: int = None):
+        self.doc = doc
+        n = PDF_PAGINAS_INICIO if paginas_inicio is None else paginas_inicio
+        lazy = (modo or PDF_TEXT_MODE) == "lazy"
+        self.paginas = {"inicio": min(n, doc.page_count) if lazy else doc.page_count, "documento": doc.page_count,
+                        "mae": min(PDF_PAGINAS_PROA_MAE, doc.page_count)}
+        self._engines = {}
+
+    def engine(self, regiao: str) -> ExtractionEngine:
+        n = self.paginas[regiao]
+        if n not in self._engines:
+            self._engines[n] = ExtractionEngine(_medir("extrator.texto_pdf", extract_pdf_text, self.doc, n))
+        return self._engines[n]
+
+    def extrair(self, campo: str, fn, *args):
+        """Roda o extrator na região do campo; sem achado definitivo (vazio/ERRO ou de menor prioridade), amplia."""
+        regiao = CAMPO_REGIAO.get(campo, "documento")
+        engine = self.engine(regiao)
+        valor = _medir(f"extrator.{campo}", fn, engine, *args)
+        definitivo = CAMPO_DEFINITIVO_INICIO.get(campo)
+        if self.paginas[regiao] < self.paginas["documento"] and (
+                _campo_vazio(valor) or (definitivo is not None and not definitivo(engine))):
+            METRICS.inc("pdf.ampliacoes")
+            valor = _medir(f"extrator.{campo}", fn, self.engine("documento"), *args)
+        return valor
+
+def get_numero_contrato(text) -> str:
+    return _engine(text).numero_contrato()
+
+def get_nome_empresa(text) -> str:
+    return _engine(text).nome_empresa
+
+def get_cnpj_empresa(text) -> str:
+    return _engine(text).cnpj_empresa()
+
+def get_proa_notificatorio(text):
+    return _engine(text).proa_notificatorio()
+
+def get_proa_mae(text, proa_atual: str):
+    return _engine(text).proa_mae(proa_atual)
 
 # --- Funções do Expediente ---
 def _build_proa_regex(proa_notif: str) -> str:
-    parts = re.split(r'[/-]', proa_notif)
+    parts = RE_PROA_SEPARADORES.split(proa_notif)
     if len(parts) != 4: return re.escape(proa_notif)
     a, b, c, d = [p.strip() for p in parts]
     return rf"{a}\s*/\s*{b}\s*-\s*{c.lstrip('0')}\s*-\s*{d}"
 
-def _find_expediente_page_index(pdf_path: str, proa_notif: str) -> int:
+def _find_expediente_page_index(doc: PdfSession, proa_notif: str) -> int:
     try:
-        doc = fitz.open(pdf_path)
+        # Equivale a "EXPEDIENTE.*?N...{proa}" (DOTALL) sem o .*?, que relia o resto da página a cada
+        # "EXPEDIENTE": basta achar o número do PROA depois da primeira ocorrência
         proa_pat = _build_proa_regex(proa_notif)
-        pat_header = re.compile(rf"EXPEDIENTE.*?N[\sº°o\.\-\°]*{proa_pat}", re.IGNORECASE | re.DOTALL)
-        pat_frase = re.compile(r"Em\s+an[áa]lise\s+aos\s+autos\s+e\s+considerando\s+as\s+raz[õo]es\s+f[áa]ticas\s+e\s+contratuais", re.IGNORECASE | re.DOTALL)
-
-        for i, page in enumerate(doc):
-            txt_norm = _norm_text(page.get_text("text"))
-            if pat_header.search(txt_norm): return i
-            if pat_frase.search(txt_norm) and proa_notif in txt_norm: return i
-        doc.close()
+        pat_numero = re.compile(rf"N[\sº°o\.\-\°]*{proa_pat}", re.IGNORECASE)
+
+        for i in range(doc.page_count):
+            txt_norm = doc.page_text_norm(i)
+            m_exp = RE_EXPEDIENTE.search(txt_norm)
+            if m_exp and pat_numero.search(txt_norm, m_exp.end()): return i
+            if RE_FRASE_EXPEDIENTE.search(txt_norm) and proa_notif in txt_norm: return i
     except: pass
     return -1
 
-def _footer_date_from_page(pdf_path: str, page_index: int) -> str:
+def _footer_date_from_page(doc: PdfSession, page_index: int) -> str:
     try:
-        doc = fitz.open(pdf_path)
-        blocks = doc[page_index].get_text("blocks")
-        cutoff = doc[page_index].rect.height * 0.85
+        blocks = doc.page_blocks(page_index)
+        cutoff = doc.page_height(page_index) * 0.85
         cands = []
         for (x0,y0,x1,y1,txt,*_) in blocks:
             if y0 >= cutoff:
-                for m in re.finditer(r"(\d{2}/\d{2}/\d{4})", txt):
+                for m in RE_DATA_BR.finditer(txt):
                     cands.append((x0, y0, m.group(1)))
-        doc.close()
         if not cands: return ""
         cands.sort(key=lambda t: (t[0], -t[1]))
         return cands[0][2]
     except: return ""
 
-def get_expediente_text_and_date(pdf_path: str, proa_notif: str) -> tuple:
-    idx = _find_expediente_page_index(pdf_path, proa_notif)
+def get_expediente_text_and_date(doc: PdfSession, proa_notif: str) -> tuple:
+    idx = _find_expediente_page_index(doc, proa_notif)
     if idx < 0: return "", ""
-    doc = fitz.open(pdf_path)
-    txt = _norm_text(doc[idx].get_text("text"))
-    doc.close()
-    dt = _footer_date_from_page(pdf_path, idx)
+    txt = doc.page_text_norm(idx)
+    dt = _footer_date_from_page(doc, idx)
     return txt, dt
 
 def get_tipo_penalidade(exp_text: str) -> str:
-    if re.search(r"\bMULTA\b", exp_text, re.IGNORECASE): return "multa"
-    if re.search(r"advert(ê|e)ncia", exp_text, re.IGNORECASE): return "advertencia"
-    if re.search(r"n[aã]o\s+aplica(ç|c)[aã]o\s+de\s+penalidade", exp_text, re.IGNORECASE): return "nao aplicacao de penalidade"
+    if RE_MULTA.search(exp_text): return "multa"
+    if RE_ADVERTENCIA.search(exp_text): return "advertencia"
+    if RE_NAO_APLICACAO.search(exp_text): return "nao aplicacao de penalidade"
     return ERR_MSG_TIPO_PENALIDADE
 
 def get_percentual_multa(exp_text: str) -> str:
@@ -304,8 +1428,8 @@ def get_percentual_multa(exp_text: str) -> str:
     }
 
     # Regex específico que funcionou nos testes
-    m_num = re.search(r"(?:aplicando\s+)?multa\s+(?:de\s+)?(\d{1,2})\s*%", exp_text, re.IGNORECASE)
-    m_word = re.search(r"%\s*\(\s*([^)]+?)\s+por\s+cento\s*\)", exp_text, re.IGNORECASE)
+    m_num = RE_PERCENTUAL_NUM.search(exp_text)
+    m_word = RE_PERCENTUAL_EXTENSO.search(exp_text)
 
     if not m_num:
         return ERR_MSG_PERCENTUAL_MULTA
@@ -329,14 +1453,13 @@ def get_percentual_multa(exp_text: str) -> str:
 
 
 def get_impedimentos(exp_text: str) -> str:
-    return "CFIL/RS" if re.search(r"CFIL\/RS", exp_text, re.IGNORECASE) else ""
+    return "CFIL/RS" if RE_CFIL.search(exp_text) else ""
 
 def get_penalidade_meses(exp_text: str) -> str:
     # Helper interno para normalizar texto (mantido da lógica original)
     def normalize_word(w: str) -> str:
         if not w: return ""
         # Remove acentos e deixa minúsculo
-        import unicodedata # Mantendo import aqui caso não tenha no global, ou pode mover pra cima
         return unicodedata.normalize('NFKD', w.lower()).encode('ascii', 'ignore').decode('utf-8').strip()
 
     words = {
@@ -344,9 +1467,12 @@ def get_penalidade_meses(exp_text: str) -> str:
         "quatro": 4, "cinco": 5, "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10
     }
 
+    # Os padrões usam \s em todo lugar: juntar as sequências de espaços/quebras não muda o que casa
+    # e impede o retrocesso quadrático entre \s* vizinhos
+    exp_text = RE_ESPACOS.sub(" ", exp_text)
+
     # 1. Padrão Principal (Complexo: contexto de suspensão + parênteses)
-    pat = r"(?:CFIL/RS\s*,\s*suspendendo\s+o\s+direito\s+de\s+licitar\s+ou\s+contratar\s+com\s+a\s+Administração\s*(?:,|pelo)?\s*)?(?:prazo\s+de|por)\s*(\d{1,2})?\s*\(\s*([^)]+)\s*\)?\s*meses?"
-    m = re.search(pat, exp_text, re.IGNORECASE | re.DOTALL)
+    m = RE_MESES_PRINCIPAL.search(exp_text)
 
     if m:
         num_str = m.group(1)
@@ -359,13 +1485,13 @@ def get_penalidade_meses(exp_text: str) -> str:
                 w = normalize_word(word_str)
                 # Verifica conflito Digito vs Extenso
                 for k, v in words.items():
-                    if re.search(k, w):
+                    if k in w:
                         if num != v: num = v # Prioriza extenso
                         break
         elif word_str:
             w = normalize_word(word_str)
             for k, v in words.items():
-                if re.search(k, w):
+                if k in w:
                     num = v
                     break
             else:
@@ -378,35 +1504,33 @@ def get_penalidade_meses(exp_text: str) -> str:
     # 2. Fallbacks (Lógica sequencial original - não mexi na ordem)
 
     # Fallback 1: "prazo de 12 mes"
-    m1 = re.search(r"prazo\s+de\s+\(?(\d{1,2})\)?\s+mes", exp_text, re.IGNORECASE | re.DOTALL)
+    m1 = RE_MESES_NUMERO.search(exp_text)
     if m1:
         v = int(m1.group(1).lstrip('0') or '0')
         return "1 mês" if v == 1 else f"{v} meses"
 
     # Fallback 2: "prazo de (doze) mes"
-    m2 = re.search(r"prazo\s+de\s+\(([^)]+)\)\s+mes", exp_text, re.IGNORECASE | re.DOTALL)
+    m2 = RE_MESES_PARENTESES.search(exp_text)
     if m2:
         w = normalize_word(m2.group(1))
         for k, v in words.items():
-            if re.search(k, w):
+            if k in w:
                 return "1 mês" if v == 1 else f"{v} meses"
 
     # Fallback 3: "prazo de doze mes" (sem parênteses)
-    m3 = re.search(r"prazo\s+de\s+([a-zçãõéê]+)\s+mes", exp_text, re.IGNORECASE | re.DOTALL)
+    m3 = RE_MESES_EXTENSO.search(exp_text)
     if m3:
         w = normalize_word(m3.group(1))
         for k, v in words.items():
-            if re.fullmatch(k, w):
+            if w == k:
                 return "1 mês" if v == 1 else f"{v} meses"
 
     return ERR_MSG_PENALIDADE_MESES
 
-def get_ultima_atualizacao_processo(pdf_path):
+def get_ultima_atualizacao_processo(doc: PdfSession):
     # Tenta pegar do rodapé da última página
     try:
-        doc = fitz.open(pdf_path)
-        dt = _footer_date_from_page(pdf_path, len(doc)-1)
-        doc.close()
+        dt = _footer_date_from_page(doc, doc.page_count-1)
         if dt: return dt
     except: pass
     return ""
@@ -425,14 +1549,32 @@ def aplicar_regras_status(data: dict) -> dict:
 # ==========================
 # EXTRAÇÃO DE CAMPOS (CORRIGIDA)
 # ==========================
-def extract_fields_from_pdf(pdf_path: str) -> dict:
-    full_text = extract_pdf_text(pdf_path)
-    proa_notif = get_proa_notificatorio(full_text)
-    cnpj_empresa = get_cnpj_empresa(full_text)
+# Campos do expediente são calculados juntos (mesma página + aplicar_regras_status)
+CAMPOS_EXPEDIENTE = ("tipo_penalidade", "percentual_multa", "impedimentos", "penalidade_meses", "data_penalizacao")
+
+def extract_fields_from_pdf(pdf_path: str, doc: PdfSession = None, consultar_status: bool = True, campos=None,
+                            modo_texto: str = None) -> dict:
+    """
+    Extrai os campos do PDF. Com `campos` (ex: só os que ficaram desatualizados no cache de extração),
+    calcula apenas esses (e o que eles exigem) e devolve só as chaves calculadas.
+    `modo_texto` ("lazy"/"full") sobrepõe PDF_TEXT_MODE.
+    """
+    # Reaproveita a sessão já aberta (ex: pela checagem de data); senão abre e fecha aqui
+    if doc is None:
+        with PdfSession(pdf_path) as own_doc:
+            return extract_fields_from_pdf(pdf_path, own_doc, consultar_status, campos, modo_texto)
 
-    # Status Web
+    def quer(*nomes):
+        return campos is None or any(n in campos for n in nomes)
+
+    # Um motor por região do documento (normaliza e acha os PROAs uma vez só por região);
+    # no modo "lazy" só as páginas que os campos pedem são decodificadas
+    regioes = DocumentRegions(doc, modo_texto)
+    proa_notif = regioes.extrair("proa_notificatorio", get_proa_notificatorio)
+
+    # Status Web (o pipeline passa consultar_status=False e consulta tudo em lote depois)
     status_proa = ""
-    if proa_notif:
+    if proa_notif and consultar_status:
         num = re.sub(r"\D", "", proa_notif)
         if num:
             print(f"🔎 Consultando status do PROA {num}...")
@@ -440,156 +1582,905 @@ def extract_fields_from_pdf(pdf_path: str) -> dict:
             status_proa = get_situacao_processo_web(num) or ""
             print(f"→ Status: {status_proa}")
 
+    data = {}
+    if quer("numero_contrato"): data["numero_contrato"] = regioes.extrair("numero_contrato", get_numero_contrato)
+    if quer("nome_empresa"): data["nome_empresa"] = regioes.extrair("nome_empresa", get_nome_empresa)
+    if quer("cnpj_empresa"): data["cnpj_empresa"] = regioes.extrair("cnpj_empresa", get_cnpj_empresa)
+    if quer("proa_notificatorio"): data["proa_notificatorio"] = proa_notif
+    if quer("proa_mae"): data["proa_mae"] = regioes.extrair("proa_mae", get_proa_mae, proa_notif)
+    if quer("status_processo"): data["status_processo"] = status_proa
+
     # Expediente
-    exp_text, quando_aplicada = ("", "")
-    if proa_notif:
-        exp_text, quando_aplicada = get_expediente_text_and_date(pdf_path, proa_notif)
-
-    if exp_text:
-        tipo = get_tipo_penalidade(exp_text)
-        perc = get_percentual_multa(exp_text)
-        imp = get_impedimentos(exp_text)
-        meses = get_penalidade_meses(exp_text)
-    else:
-        tipo, perc, imp, meses = ERR_MSG_TIPO_PENALIDADE, ERR_MSG_PERCENTUAL_MULTA, ERR_MSG_IMPEDIMENTOS, ERR_MSG_PENALIDADE_MESES
-
-    data = {
-        "numero_contrato": get_numero_contrato(full_text),
-        "nome_empresa": get_nome_empresa(full_text),
-        "cnpj_empresa": cnpj_empresa,
-        "proa_notificatorio": proa_notif,
-        "proa_mae": get_proa_mae(full_text, proa_notif),
-        "status_processo": status_proa,
-        "valor_contrato_consolidado": "",
-        "tipo_penalidade": tipo,
-        "percentual_multa": perc,
-        "valor_multa": "",
-        "impedimentos": imp,
-        "penalidade_meses": meses,
-        "data_penalizacao": quando_aplicada,
-        "ultima_analise_feita": get_data_analise_agora(),
-        "ultima_atualizacao_processo": get_ultima_atualizacao_processo(pdf_path),
-    }
+    if quer(*CAMPOS_EXPEDIENTE):
+        exp_text, quando_aplicada = ("", "")
+        if proa_notif:
+            exp_text, quando_aplicada = _medir("extrator.expediente", get_expediente_text_and_date, doc, proa_notif)
+
+        if exp_text:
+            tipo = _medir("extrator.tipo_penalidade", get_tipo_penalidade, exp_text)
+            perc = _medir("extrator.percentual_multa", get_percentual_multa, exp_text)
+            imp = _medir("extrator.impedimentos", get_impedimentos, exp_text)
+            meses = _medir("extrator.penalidade_meses", get_penalidade_meses, exp_text)
+        else:
+            tipo, perc, imp, meses = ERR_MSG_TIPO_PENALIDADE, ERR_MSG_PERCENTUAL_MULTA, ERR_MSG_IMPEDIMENTOS, ERR_MSG_PENALIDADE_MESES
+
+        data.update({
+            "tipo_penalidade": tipo,
+            "percentual_multa": perc,
+            "impedimentos": imp,
+            "penalidade_meses": meses,
+            "data_penalizacao": quando_aplicada,
+        })
+
+    if quer("ultima_analise_feita"): data["ultima_analise_feita"] = get_data_analise_agora()
+    if quer("ultima_atualizacao_processo"):
+        data["ultima_atualizacao_processo"] = _medir("extrator.ultima_atualizacao_processo", get_ultima_atualizacao_processo, doc)
 
     data = aplicar_regras_status(data)
-    for col in COLUMNS: data.setdefault(col, "")
+    if campos is None:
+        # Ordem das colunas padrão (+ extras como divida_ativa no fim)
+        data = {**{col: data.get(col, "") for col in COLUMNS}, **data}
 
     return data  # <--- O IMPORTANTE QUE ESTAVA FALTANDO
 
+# ==========================
+# CACHE DE EXTRAÇÃO (POR CONTEÚDO DO PDF + VERSÃO DO EXTRATOR)
+# ==========================
+# Campos que vêm só do PDF (status do portal e data da análise não entram no cache)
+CAMPOS_CACHEAVEIS = (
+    "numero_contrato", "nome_empresa", "cnpj_empresa", "proa_notificatorio", "proa_mae",
+    *CAMPOS_EXPEDIENTE, "ultima_atualizacao_processo",
+)
+
+def _field_dependencies() -> dict:
+    """
+    Funções que produzem cada campo. Mudar qualquer uma delas invalida só os campos que dependem dela.
+    Inclui a orquestração (extract_fields_from_pdf e os get_* que escolhem texto e motor de cada campo).
+    """
+    E = ExtractionEngine
+    texto = (extract_fields_from_pdf, PdfSession.page_text, PdfSession.full_text, extract_pdf_text, _engine,
+             E.proas, E.proa_notificatorio, get_proa_notificatorio,
+             DocumentRegions.__init__, DocumentRegions.engine, DocumentRegions.extrair, _campo_vazio)
+    nome = (E.text_norm, E.text_p1, E.nome_empresa, _norm_text, _clean_company_name, _nome_apos_prefixo,
+            _nome_intencao, _empresa_definitiva)
+    expediente = texto + (PdfSession.page_text_norm, _norm_text, _build_proa_regex, _find_expediente_page_index,
+                          get_expediente_text_and_date, aplicar_regras_status)
+    rodape = (extract_fields_from_pdf, PdfSession.page_blocks, PdfSession.page_height, _footer_date_from_page)
+    return {
+        "numero_contrato": texto + (E.numero_contrato, get_numero_contrato),
+        "nome_empresa": texto + nome + (get_nome_empresa,),
+        "cnpj_empresa": texto + nome + (E.bloco_abertura, E.cnpj_empresa, get_cnpj_empresa, _search_cnpj_after_name,
+                                        _slice_after_heading, _cnpj_apos_intencao, _cnpj_definitivo),
+        "proa_notificatorio": texto,
+        "proa_mae": texto + (E.proa_mae, get_proa_mae),
+        "tipo_penalidade": expediente + (get_tipo_penalidade,),
+        "percentual_multa": expediente + (get_tipo_penalidade, get_percentual_multa),
+        "impedimentos": expediente + (get_impedimentos,),
+        "penalidade_meses": expediente + (get_tipo_penalidade, get_penalidade_meses),
+        "data_penalizacao": expediente + rodape,
+        "ultima_atualizacao_processo": rodape + (get_ultima_atualizacao_processo,),
+    }
+
+def _value_fingerprint(v, dentro: bool = False):
+    """Representação estável de constantes globais usadas pelos extratores (regex, textos, números)."""
+    if isinstance(v, re.Pattern): return f"re({v.pattern!r},{v.flags})"
+    if isinstance(v, (str, int, float, bool)): return repr(v)
+    if isinstance(v, (list, tuple)): return "[" + ",".join(_value_fingerprint(x, True) for x in v) + "]"
+    if isinstance(v, dict): return "{" + ",".join(f"{k!r}:{_value_fingerprint(x, True)}" for k, x in sorted(v.items())) + "}"
+    if dentro and isinstance(v, type(_value_fingerprint)):
+        # Função guardada numa constante (ex: lambdas de CAMPO_DEFINITIVO_INICIO): só o próprio bytecode e nomes
+        co = v.__code__
+        return f"fn({co.co_code.hex()},{co.co_names!r},{[c for c in co.co_consts if not hasattr(c, 'co_code')]!r})"
+    return ""  # funções/módulos soltos: dependências são declaradas em _field_dependencies
+
+def _code_fingerprint(fn) -> str:
+    """Hash estável do bytecode de uma função (inclui funções internas, constantes e regex globais que ela usa)."""
+    fn = getattr(fn, "func", fn)  # cached_property -> função
+    h = hashlib.sha1()
+    def feed(co):
+        h.update(co.co_code)
+        h.update(repr(co.co_names).encode())
+        for name in co.co_names:
+            if name in fn.__globals__: h.update(_value_fingerprint(fn.__globals__[name]).encode())
+        for c in co.co_consts:
+            if hasattr(c, "co_code"): feed(c)
+            elif isinstance(c, frozenset): h.update(repr(sorted(map(repr, c))).encode())
+            else: h.update(repr(c).encode())
+    feed(fn.__code__)
+    return h.hexdigest()
+
+def field_versions() -> dict:
+    """Versão de cada campo cacheável: EXTRACTOR_VERSION + hash do código das funções que o produzem."""
+    versions = {}
+    for campo, funcs in _field_dependencies().items():
+        h = hashlib.sha1(str(EXTRACTOR_VERSION).encode())
+        for fn in funcs: h.update(_code_fingerprint(fn).encode())
+        versions[campo] = h.hexdigest()[:16]
+    return versions
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    return h.hexdigest()
+
+class ExtractionCache(_SqliteStore):
+    """
+    Cache em SQLite dos campos extraídos, chaveado pelo SHA-256 do PDF.
+    Impressão digital: se tamanho+mtime do caminho não mudaram, reaproveita o hash guardado;
+    senão relê o arquivo para confirmar (um PDF só "tocado" pelo Drive continua batendo).
+    Use apenas a partir do processo/thread principal.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS arquivos (caminho TEXT PRIMARY KEY, tamanho INTEGER, mtime REAL, sha256 TEXT);
+        CREATE TABLE IF NOT EXISTS campos (sha256 TEXT, campo TEXT, versao TEXT, valor TEXT, PRIMARY KEY (sha256, campo));
+    """
+
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH):
+        super().__init__(path)
+
+    def knows(self, pdf_path: str, st) -> bool:
+        """O hash deste caminho com este tamanho/mtime já está guardado (fingerprint não vai ler o arquivo)."""
+        row = self._conn.execute("SELECT tamanho, mtime FROM arquivos WHERE caminho = ?", (pdf_path,)).fetchone()
+        return bool(row) and row[0] == st.st_size and row[1] == st.st_mtime
+
+    def fingerprint(self, pdf_path: str, prefetcher: PdfPrefetcher = None) -> str:
+        st = os.stat(pdf_path)
+        row = self._conn.execute("SELECT tamanho, mtime, sha256 FROM arquivos WHERE caminho = ?", (pdf_path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            return row[2]
+        # Com a cópia local (leitura antecipada), o hash não relê o arquivo pela montagem
+        local = prefetcher.acquire(pdf_path, st) if prefetcher is not None else None
+        try:
+            sha = _sha256_file(local or pdf_path)
+        finally:
+            if local: prefetcher.release(pdf_path)
+        self._conn.execute("INSERT OR REPLACE INTO arquivos (caminho, tamanho, mtime, sha256) VALUES (?, ?, ?, ?)",
+                           (pdf_path, st.st_size, st.st_mtime, sha))
+        self._conn.commit()
+        return sha
+
+    def get(self, sha: str, versions: dict) -> tuple:
+        """Devolve (campos válidos, conjunto de campos que precisam ser extraídos de novo)."""
+        rows = self._conn.execute("SELECT campo, versao, valor FROM campos WHERE sha256 = ?", (sha,)).fetchall()
+        validos = {campo: valor for campo, versao, valor in rows if versions.get(campo) == versao}
+        return validos, {c for c in versions if c not in validos}
+
+    def put(self, sha: str, values: dict, versions: dict):
+        rows = [(sha, c, versions[c], str(values[c])) for c in versions if c in values]
+        self._conn.executemany("INSERT OR REPLACE INTO campos (sha256, campo, versao, valor) VALUES (?, ?, ?, ?)", rows)
+        self._conn.commit()
+
+# ==========================
+# MANIFESTO DE ARQUIVOS (DECISÃO DE PULO SEM ABRIR O PDF)
+# ==========================
+class SkipManifest(_SqliteStore):
+    """
+    Guarda, por nome de arquivo, tamanho, mtime, modifiedTime do Drive, PROA (só dígitos) e a data do rodapé
+    lida da última vez. Enquanto essa impressão digital não muda, a data do rodapé sai daqui
+    e o PDF nem é aberto (nem relido para hash) só para decidir se deve ser pulado.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS manifesto (
+            nome TEXT PRIMARY KEY, tamanho INTEGER, mtime REAL, drive_modified TEXT,
+            proa TEXT, data_rodape TEXT, registrado_em REAL
+        );
+        CREATE TABLE IF NOT EXISTS quarentena (
+            nome TEXT PRIMARY KEY, tamanho INTEGER, mtime REAL, motivo TEXT, registrado_em REAL
+        );
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        super().__init__(path)
+
+    def lookup(self, nome: str, tamanho: int, mtime: float, drive_modified: str = ""):
+        """Devolve {"proa", "data_rodape"} se o arquivo não mudou desde o registro; senão None."""
+        row = self._conn.execute(
+            "SELECT tamanho, mtime, drive_modified, proa, data_rodape FROM manifesto WHERE nome = ?", (nome,)
+        ).fetchone()
+        if not row or row[0] != tamanho or row[1] != mtime: return None
+        # Se o Drive diz que o arquivo mudou, não confia no stat local (a montagem pode estar desatualizada)
+        if drive_modified and row[2] and drive_modified != row[2]: return None
+        return {"proa": row[3] or "", "data_rodape": row[4] or ""}
+
+    def record(self, nome: str, tamanho: int, mtime: float, drive_modified: str, proa: str, data_rodape: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO manifesto (nome, tamanho, mtime, drive_modified, proa, data_rodape, registrado_em) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (nome, tamanho, mtime, drive_modified or "", proa or "", data_rodape or "", time.time()),
+        )
+
+    # --- Quarentena: PDFs patológicos (ex: estouraram o orçamento de tempo) ficam fora até o arquivo mudar
+    def quarantine(self, nome: str, tamanho: int, mtime: float, motivo: str):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO quarentena (nome, tamanho, mtime, motivo, registrado_em) VALUES (?, ?, ?, ?, ?)",
+            (nome, tamanho, mtime, motivo, time.time()),
+        )
+
+    def quarantine_reason(self, nome: str, tamanho: int, mtime: float) -> str:
+        """Motivo da quarentena se o arquivo ainda é o mesmo que foi isolado; senão ""."""
+        row = self._conn.execute("SELECT tamanho, mtime, motivo FROM quarentena WHERE nome = ?", (nome,)).fetchone()
+        return row[2] if row and row[0] == tamanho and row[1] == mtime else ""
+
+    def quarantined(self) -> list:
+        return [{"arquivo": n, "motivo": m, "desde": datetime.datetime.fromtimestamp(t).isoformat(timespec="seconds")}
+                for n, m, t in self._conn.execute("SELECT nome, motivo, registrado_em FROM quarentena ORDER BY nome")]
+
+    def release(self, nome: str = None):
+        """Tira um arquivo (ou todos, sem `nome`) da quarentena."""
+        if nome is None: self._conn.execute("DELETE FROM quarentena")
+        else: self._conn.execute("DELETE FROM quarentena WHERE nome = ?", (nome,))
+
 # ==========================
 # FUNÇÕES DE PLANILHA E DRIVE (CORRIGIDAS)
 # ==========================
-def load_or_create_gsheet(gc, sheet_name, worksheet_name, columns):
+def open_worksheet(gc, sheet_name, worksheet_name, columns):
+    """Abre a aba sem ler os valores (se não existir, cria só com o cabeçalho). Devolve (ws, criada)."""
     try: sh = gc.open(sheet_name)
     except: raise Exception("Planilha não encontrada.")
-    try: ws = sh.worksheet(worksheet_name)
+    try: return sh.worksheet(worksheet_name), False
     except:
         ws = sh.add_worksheet(title=worksheet_name, rows=1, cols=len(columns))
         ws.update([columns])
-        return pd.DataFrame(columns=columns), ws
-
-    df = get_as_dataframe(ws, dtype=str)
+        return ws, True
+
+# Colunas de data: lidas com FORMULA podem voltar como número de série (dias desde 30/12/1899)
+SHEET_DATE_COLUMNS = ("data_penalizacao", "ultima_analise_feita", "ultima_atualizacao_processo")
+SHEET_DIA_ZERO = datetime.date(1899, 12, 30)
+
+def _sheet_serial_to_br(v: str) -> str:
+    """Número de série de data do Sheets ("45361" ou "45361.5") -> "dd/mm/aaaa"; qualquer outro valor volta igual."""
+    try: dias = float(v)
+    except (TypeError, ValueError): return v
+    if not 0 < dias < 2958466: return v   # fora de 1900..9999
+    return (SHEET_DIA_ZERO + datetime.timedelta(days=int(dias))).strftime("%d/%m/%Y")
+
+def read_worksheet(ws, columns) -> pd.DataFrame:
+    """Lê a aba inteira (índice do DataFrame + 2 = linha da planilha); datas voltam como dd/mm/aaaa."""
+    df = gspread_dataframe.get_as_dataframe(ws, dtype=str)
     for col in columns:
         if col not in df.columns: df[col] = pd.NA
     df = df.fillna("")[columns]
-    return df, ws
+    for col in SHEET_DATE_COLUMNS:
+        if col in columns: df[col] = df[col].map(_sheet_serial_to_br)
+    return df
 
-def upsert_row(df: pd.DataFrame, row: dict) -> pd.DataFrame:
-    key_raw = row.get("proa_notificatorio", "")
-    # A chave de busca é puramente numérica
-    key_clean = re.sub(r"\D", "", str(key_raw))
+def load_or_create_gsheet(gc, sheet_name, worksheet_name, columns):
+    ws, criada = open_worksheet(gc, sheet_name, worksheet_name, columns)
+    if criada: return pd.DataFrame(columns=columns), ws
+    return read_worksheet(ws, columns), ws
 
-    if not key_clean:
-        return df
+def _existing_dates_from_df(df: pd.DataFrame) -> dict:
+    """Mapa {PROA só dígitos: data da última atualização} montado linha a linha (sem a tabela local)."""
+    existing_dates = {}
+    if not df.empty and "proa_notificatorio" in df.columns:
+        for _, row in df.iterrows():
+            # Usa a função nova para ignorar o =HYPERLINK e pegar só o número
+            clean_proa = _extract_clean_proa(row["proa_notificatorio"])
 
-    # Cria uma série temporária só com os números da coluna PROA do DF atual
-    # Isso garante que vamos achar o processo mesmo se ele estiver como Link
-    df_proas_clean = df["proa_notificatorio"].apply(_extract_clean_proa)
+            d_str = str(row.get("ultima_atualizacao_processo", ""))
+            d_obj = _parse_br_date(d_str)
+
+            if clean_proa and d_obj:
+                existing_dates[clean_proa] = d_obj
+    return existing_dates
 
-    if key_clean in df_proas_clean.values:
-        # Pega o índice da primeira ocorrência
-        idx = df_proas_clean[df_proas_clean == key_clean].index[0]
+def upsert_rows(df: pd.DataFrame, rows) -> pd.DataFrame:
+    """
+    Sincroniza várias linhas por PROA de uma vez (mesmo resultado de chamar upsert_row em sequência).
+    A chave é só numérica e a coluna PROA do DF é indexada uma única vez (acha o processo mesmo se estiver como Link).
+    Existentes: atualiza a PRIMEIRA ocorrência com as colunas padrão da última linha recebida.
+    Novas: entram num único concat, na ordem em que apareceram.
+    """
+    keyed = []
+    for row in rows:
+        key_clean = RE_NAO_DIGITO.sub("", str(row.get("proa_notificatorio", "")))
+        if key_clean: keyed.append((key_clean, row))
+    if not keyed:
+        return df
 
-        # Atualiza as colunas (mantendo o link antigo se não quisermos forçar reescrita,
-        # mas aqui vamos sobrescrever os dados novos)
-        for col in COLUMNS:
-            # Só atualiza se o dado novo não for vazio, ou força atualização
-            val = row.get(col, "")
-            df.at[idx, col] = val
-    else:
-        # Se não achou, aí sim cria nova linha
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+    # Índice chave -> rótulo da primeira ocorrência na planilha
+    df_proas_clean = df["proa_notificatorio"].map(_extract_clean_proa)
+    first = df_proas_clean[~df_proas_clean.duplicated()]
+    key_to_idx = dict(zip(first.values, first.index))
+
+    updates = {}   # rótulo -> última linha recebida para aquele processo
+    inserts = {}   # chave -> [primeira linha, última linha]
+    for key_clean, row in keyed:
+        if key_clean in key_to_idx:
+            updates[key_to_idx[key_clean]] = row
+        elif key_clean in inserts:
+            inserts[key_clean][1] = row
+        else:
+            inserts[key_clean] = [row, row]
+
+    if updates:
+        # Sobrescreve os dados com os novos (mantendo o mesmo comportamento do upsert linha a linha)
+        df.loc[list(updates), COLUMNS] = [[row.get(col, "") for col in COLUMNS] for row in updates.values()]
+
+    if inserts:
+        # A primeira linha entra inteira (inclusive colunas extras); repetições só atualizam as colunas padrão
+        novos = [first_row if first_row is last_row else {**first_row, **{col: last_row.get(col, "") for col in COLUMNS}}
+                 for first_row, last_row in inserts.values()]
+        df = pd.concat([df, pd.DataFrame(novos)], ignore_index=True)
 
     return df
 
-def _map_pdf_links_in_folder(drive, folder_id):
-    """Mapeia PDFs com paginação para evitar erro 400."""
-    mapping = {}
-    page_token = None
-    print(f"📂 Mapeando Drive ID: {folder_id}...")
-    while True:
+def upsert_row(df: pd.DataFrame, row: dict) -> pd.DataFrame:
+    return upsert_rows(df, [row])
+
+def _br_number(s: str):
+    """Número digitado no formato brasileiro ("6", "0,5", "R$ 1.234,50") -> float; None se não for número."""
+    s = s.replace("R$", "").replace("\xa0", "").replace(" ", "")
+    if "," in s: s = s.replace(".", "").replace(",", ".")
+    try: return float(s)
+    except ValueError: return None
+
+def _same_cell(novo: str, antigo: str) -> bool:
+    """
+    Compara o valor novo com o lido da planilha. Lido com FORMULA, o que o Sheets entendeu como número volta sem
+    formatação ("5%" -> 0.05, "R$ 1.234,50" -> 1234.5) e data pode voltar como número de série (45361).
+    """
+    if novo == antigo: return True
+    try: lido = float(antigo)
+    except ValueError: return False
+    if novo.endswith("%"):
+        esperado = _br_number(novo[:-1])
+        return esperado is not None and abs(esperado / 100 - lido) < 1e-9
+    data = _parse_br_date(novo)
+    if data is not None: return int(lido) == (data - SHEET_DIA_ZERO).days
+    esperado = _br_number(novo)
+    return esperado is not None and abs(esperado - lido) < 1e-9
+
+def _cell_str(v) -> str:
+    return "" if v is None or (isinstance(v, float) and pd.isna(v)) else str(v)
+
+def write_sheet_diff(ws, df_snapshot: pd.DataFrame, df_new: pd.DataFrame, columns=COLUMNS):
+    """
+    Escreve na aba só o que mudou em relação ao snapshot (o que está na aba agora), num único batch_update.
+    - Linhas do snapshot: índice do DataFrame + 2 = linha da planilha (cabeçalho na linha 1).
+    - Cada linha nova é casada pela chave PROA (só dígitos), na ordem em que aparece; o que sobrar vira linha nova no fim.
+    - Linhas do snapshot que saíram do resultado (ex: sem PROA) são limpas no lugar.
+    Usa apenas ws.row_values, ws.row_count, ws.add_rows e ws.batch_update (fácil de simular com um objeto falso).
+    Retorna um resumo {"celulas", "intervalos", "linhas_novas", "linhas_limpas", "linhas"} ou None se o cabeçalho
+    da aba não bate com `columns` (aí quem chama deve reescrever tudo). "linhas" = linha da planilha onde ficou
+    cada linha de `df_new`, na mesma ordem (base do próximo snapshot).
+    """
+    header = ws.row_values(1)
+    if header[:len(columns)] != list(columns):
+        return None
+
+    # Linhas atuais da planilha agrupadas pela chave (a ordem importa para PROAs repetidos)
+    slots = {}
+    sobras = []
+    ultima_linha = 1
+    for label, vals in zip(df_snapshot.index, df_snapshot[columns].to_numpy("object")):
+        linha = int(label) + 2
+        ultima_linha = max(ultima_linha, linha)
+        key = _extract_clean_proa(vals[columns.index("proa_notificatorio")])
+        vals = [_cell_str(v) for v in vals]
+        if key: slots.setdefault(key, []).append((linha, vals))
+        else: sobras.append((linha, vals))
+
+    updates = []
+    n_celulas = 0
+
+    def add_runs(linha, mudou, valores):
+        # Agrupa colunas alteradas contíguas num único intervalo (ex: C5:E5)
+        nonlocal n_celulas
+        j = 0
+        while j < len(mudou):
+            if not mudou[j]:
+                j += 1
+                continue
+            k = j
+            while k + 1 < len(mudou) and mudou[k + 1]: k += 1
+            updates.append({
+                "range": f"{gspread.utils.rowcol_to_a1(linha, j + 1)}:{gspread.utils.rowcol_to_a1(linha, k + 1)}",
+                "values": [valores[j:k + 1]],
+            })
+            n_celulas += k - j + 1
+            j = k + 1
+
+    novas, linhas = [], []
+    for vals in df_new[columns].to_numpy("object"):
+        vals = [_cell_str(v) for v in vals]
+        key = _extract_clean_proa(vals[columns.index("proa_notificatorio")])
+        if key and slots.get(key):
+            linha, antigos = slots[key].pop(0)
+            add_runs(linha, [not _same_cell(n, a) for n, a in zip(vals, antigos)], vals)
+            linhas.append(linha)
+        else:
+            novas.append(vals)
+            linhas.append(None)
+
+    # O que sobrou do snapshot não está mais no resultado: limpa no lugar (o modo "full" removeria)
+    restantes = sobras + [item for lst in slots.values() for item in lst]
+    for linha, antigos in restantes:
+        add_runs(linha, [a != "" for a in antigos], [""] * len(columns))
+
+    if novas:
+        inicio = ultima_linha + 1
+        fim = inicio + len(novas) - 1
+        if fim > ws.row_count:
+            ws.add_rows(fim - ws.row_count)
+        updates.append({
+            "range": f"{gspread.utils.rowcol_to_a1(inicio, 1)}:{gspread.utils.rowcol_to_a1(fim, len(columns))}",
+            "values": novas,
+        })
+        n_celulas += len(novas) * len(columns)
+
+    if updates:
+        ws.batch_update(updates, value_input_option="USER_ENTERED")
+    # Linhas novas ocupam ultima_linha+1, +2, ... na ordem em que apareceram
+    proxima = iter(range(ultima_linha + 1, ultima_linha + 1 + len(novas)))
+    return {"celulas": n_celulas, "intervalos": len(updates), "linhas_novas": len(novas),
+            "linhas_limpas": sum(1 for _, a in restantes if any(a)),
+            "linhas": [linha if linha is not None else next(proxima) for linha in linhas]}
+
+def _iso_br_date(date_str: str):
+    d = _parse_br_date(date_str)
+    return d.isoformat() if d else None
+
+class LocalTable(_SqliteStore):
+    """
+    Cópia local da aba, uma linha por linha da planilha: a fonte da verdade do pipeline (a planilha é só o destino).
+    As colunas padrão ficam como texto, do jeito que estão na aba (com HYPERLINK). Junto vão a chave PROA só com
+    dígitos e as datas em ISO, calculadas uma vez na gravação. Carregar o estado e o mapa de datas vira uma consulta,
+    sem ler a aba nem desmontar HYPERLINK linha a linha.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS linhas (
+            linha INTEGER PRIMARY KEY, proa TEXT NOT NULL, data_atualizacao_iso TEXT, data_penalizacao_iso TEXT,
+            """ + ", ".join(f"{c} TEXT NOT NULL" for c in COLUMNS) + """
+        );
+        CREATE INDEX IF NOT EXISTS linhas_proa ON linhas (proa);
+        CREATE TABLE IF NOT EXISTS estado (chave TEXT PRIMARY KEY, valor TEXT);
+    """
+    _TIPADAS = 4   # linha, proa, data_atualizacao_iso, data_penalizacao_iso (antes das colunas da planilha)
+
+    def __init__(self, path: str = LOCAL_TABLE_PATH):
+        super().__init__(path)
+        colunas = [r[1] for r in self._conn.execute("PRAGMA table_info(linhas)")][self._TIPADAS:]
+        if colunas != list(COLUMNS):
+            # As colunas padrão mudaram: a cópia antiga não serve mais e a próxima carga relê a aba
+            self._conn.executescript("DROP TABLE linhas; DELETE FROM estado;")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+
+    def _get(self, chave: str):
+        row = self._conn.execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, chave: str, valor: str):
+        self._conn.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)", (chave, valor))
+
+    def is_current(self, destino: str, max_horas: float = SHEET_RESYNC_HORAS) -> bool:
+        """A cópia é desta planilha/aba, a aba foi lida há menos de `max_horas` e nenhuma gravação ficou pela metade."""
+        lida_em = self._get("lida_em")
+        return (self._get("destino") == destino and self._get("gravando") != "1" and lida_em is not None
+                and time.time() - float(lida_em) < max_horas * 3600)
+
+    def load(self) -> pd.DataFrame:
+        """A aba como read_worksheet devolveria: colunas padrão em texto, índice = linha da planilha - 2."""
+        rows = self._conn.execute(f"SELECT linha, {', '.join(COLUMNS)} FROM linhas ORDER BY linha").fetchall()
+        return pd.DataFrame([r[1:] for r in rows], columns=COLUMNS, index=[r[0] - 2 for r in rows], dtype=str)
+
+    def existing_dates(self) -> dict:
+        """{PROA só dígitos: data da última atualização}; com PROA repetido vale a última linha (como na aba)."""
+        return {proa: datetime.date.fromisoformat(d) for proa, d in self._conn.execute(
+            "SELECT proa, data_atualizacao_iso FROM linhas WHERE proa != '' AND data_atualizacao_iso IS NOT NULL ORDER BY linha")}
+
+    def replace(self, df: pd.DataFrame, destino: str = None):
+        """Troca o conteúdo por `df` (índice + 2 = linha da planilha). Com `destino`, registra uma leitura da aba inteira."""
+        i_proa, i_atual, i_penal = (COLUMNS.index(c) for c in
+                                    ("proa_notificatorio", "ultima_atualizacao_processo", "data_penalizacao"))
+        registros = []
+        for label, vals in zip(df.index, df.reindex(columns=COLUMNS).to_numpy("object")):
+            vals = [_cell_str(v) for v in vals]
+            registros.append((int(label) + 2, _extract_clean_proa(vals[i_proa]), _iso_br_date(vals[i_atual]),
+                              _iso_br_date(vals[i_penal]), *vals))
+        self._conn.execute("DELETE FROM linhas")
+        self._conn.executemany(f"INSERT INTO linhas VALUES ({', '.join('?' * (self._TIPADAS + len(COLUMNS)))})",
+                               registros)
+        if destino is not None:
+            self._set("destino", destino)
+            self._set("lida_em", str(time.time()))
+
+    # --- Gravação na aba: se cair entre begin_write e end_write, a cópia não é confiável e a aba é relida
+    def begin_write(self):
+        self._set("gravando", "1")
+        self._conn.commit()
+
+    def end_write(self, df_snapshot: pd.DataFrame):
+        self.replace(df_snapshot)
+        self._set("gravando", "0")
+        self._conn.commit()
+
+def load_sheet_state(gc, tabela: LocalTable = None, read_mode=SHEET_READ_MODE, sync_from_sheet=False):
+    """
+    Estado atual da aba: (df, ws, existing_dates). Com a tabela local em dia, tudo sai dela e a aba só é aberta
+    (sem ler valores). Senão a aba inteira é lida uma vez e a tabela é renovada com ela.
+    sync_from_sheet=True força a leitura da aba (ex: depois de editar a planilha à mão).
+    """
+    destino = f"{GSHEET_NAME}/{GSHEET_WORKSHEET_NAME}"
+    ws, criada = open_worksheet(gc, GSHEET_NAME, GSHEET_WORKSHEET_NAME, COLUMNS)
+    if (tabela is not None and not criada and read_mode == "local" and not sync_from_sheet
+            and tabela.is_current(destino)):
+        df = tabela.load()
+        METRICS.inc("planilha.cargas_locais")
+        print(f"💽 Estado carregado da tabela local ({len(df)} linhas, sem ler a aba)")
+        return df, ws, tabela.existing_dates()
+
+    if criada:
+        df = pd.DataFrame(columns=COLUMNS)
+    else:
+        df = read_worksheet(ws, COLUMNS)
+        METRICS.inc("planilha.leituras_completas")
+    if tabela is not None:
         try:
-            res = drive.files().list(
-                q=f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false",
-                fields="nextPageToken, files(id, name, webViewLink)",
-                pageSize=1000, pageToken=page_token
-            ).execute()
-            for f in res.get("files", []):
-                link = f.get("webViewLink") or f"https://drive.google.com/file/d/{f['id']}/view"
-                mapping[f["name"]] = link
-            page_token = res.get('nextPageToken')
-            if not page_token: break
+            tabela.replace(df, destino)
+            tabela.commit()
+            return df, ws, tabela.existing_dates()
         except Exception as e:
-            print(f"Erro no mapeamento: {e}")
-            break
+            tabela._conn.rollback()
+            print(f"⚠️ Não foi possível atualizar a tabela local ({e}).")
+    return df, ws, _existing_dates_from_df(df)
+
+class DriveIndex(_SqliteStore):
+    """
+    Espelho local dos PDFs de uma pasta do Drive (por id do arquivo), com a marca d'água do último modifiedTime visto.
+    Nas execuções seguintes só pede ao Drive o que foi modificado depois dela; uma página que falha é
+    tentada de novo e, se não vier, nada é gravado (o índice anterior continua valendo).
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS arquivos (
+            id TEXT PRIMARY KEY, nome TEXT, link TEXT, modified_time TEXT
+        );
+        CREATE TABLE IF NOT EXISTS estado (chave TEXT PRIMARY KEY, valor TEXT);
+    """
+    FIELDS = "nextPageToken, files(id, name, mimeType, trashed, parents, webViewLink, modifiedTime)"
+
+    def __init__(self, path: str = DRIVE_INDEX_PATH):
+        super().__init__(path)
+
+    def _get_estado(self, chave: str, default: str = "") -> str:
+        row = self._conn.execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+        return row[0] if row else default
+
+    def _set_estado(self, chave: str, valor: str):
+        self._conn.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)", (chave, str(valor)))
+
+    def mapping(self) -> dict:
+        """{nome: {"link", "modifiedTime"}}; com nomes repetidos vale o arquivo modificado por último."""
+        rows = self._conn.execute("SELECT nome, link, modified_time FROM arquivos ORDER BY modified_time, id")
+        return {nome: {"link": link, "modifiedTime": mt} for nome, link, mt in rows}
+
+    @staticmethod
+    def _list_all(drive, q: str, retries: int = DRIVE_PAGE_RETRIES) -> list:
+        """Lista todas as páginas da consulta. Cada página tem `retries` tentativas; se esgotar, propaga o erro."""
+        files, page_token = [], None
+        while True:
+            for tentativa in range(1, retries + 1):
+                try:
+                    with METRICS.timer("drive.pagina"):
+                        res = drive.files().list(q=q, fields=DriveIndex.FIELDS, pageSize=1000, pageToken=page_token).execute()
+                    break
+                except Exception as e:
+                    METRICS.inc("drive.falhas_pagina")
+                    if tentativa == retries: raise
+                    print(f"⚠️ Falha ao listar página do Drive (tentativa {tentativa}/{retries}): {e}")
+                    time.sleep(min(2 ** tentativa, 10))
+            files.extend(res.get("files", []))
+            page_token = res.get("nextPageToken")
+            if not page_token: return files
+
+    @staticmethod
+    def _is_pdf_in(f: dict, folder_id: str) -> bool:
+        return (f.get("mimeType", "application/pdf") == "application/pdf" and not f.get("trashed")
+                and folder_id in f.get("parents", [folder_id]))
+
+    def _apply(self, files: list, folder_id: str) -> int:
+        """Grava/remove os arquivos recebidos e devolve quantos realmente mudaram no índice."""
+        mudou = 0
+        for f in files:
+            atual = self._conn.execute("SELECT nome, link, modified_time FROM arquivos WHERE id = ?", (f["id"],)).fetchone()
+            if self._is_pdf_in(f, folder_id):
+                novo = (f["name"], f.get("webViewLink") or f"https://drive.google.com/file/d/{f['id']}/view",
+                        f.get("modifiedTime", ""))
+                if atual == novo: continue
+                self._conn.execute("INSERT OR REPLACE INTO arquivos (id, nome, link, modified_time) VALUES (?, ?, ?, ?)",
+                                   (f["id"], *novo))
+            elif atual:  # foi para a lixeira, saiu da pasta ou deixou de ser PDF
+                self._conn.execute("DELETE FROM arquivos WHERE id = ?", (f["id"],))
+            else:
+                continue
+            mudou += 1
+        return mudou
+
+    def _advance_watermark(self, files: list):
+        marca = max([self._get_estado("ultima_modificacao")] + [f.get("modifiedTime", "") for f in files])
+        self._set_estado("ultima_modificacao", marca)
+
+    def sync(self, drive, folder_id: str, force_full: bool = False, expected_names=None) -> dict:
+        """
+        Atualiza o índice (incremental ou completo) e devolve o mapeamento {nome: {"link", "modifiedTime"}}.
+        expected_names: nomes que deveriam estar na pasta (ex.: PDFs vistos na montagem local). Se algum faltar
+        depois da incremental, relista tudo (arquivos enviados com modifiedTime antigo escapam do filtro); se sobrar
+        algum PDF no índice, também (arquivo movido para outra pasta não aparece mais na consulta da pasta).
+        """
+        ultima_full = float(self._get_estado("ultima_sync_completa", "0") or 0)
+        marca = self._get_estado("ultima_modificacao")
+        completo = (force_full or self._get_estado("pasta") != folder_id or not marca
+                    or time.time() - ultima_full > DRIVE_FULL_RESYNC_HORAS * 3600)
+
+        if not completo:
+            desde = datetime.datetime.strptime(marca[:19], "%Y-%m-%dT%H:%M:%S") - datetime.timedelta(seconds=DRIVE_SYNC_SOBREPOSICAO_SEG)
+            q = f"'{folder_id}' in parents and modifiedTime > '{desde.strftime('%Y-%m-%dT%H:%M:%S')}'"
+            try:
+                files = self._list_all(drive, q)
+            except Exception as e:
+                print(f"⚠️ Sincronização incremental falhou ({e}); relistando a pasta inteira.")
+                completo = True
+            else:
+                mudou = self._apply(files, folder_id)
+                METRICS.inc("drive.sync_incremental")
+                METRICS.inc("drive.arquivos_alterados", mudou)
+                self._advance_watermark(files)
+                self._conn.commit()
+                print(f"🔄 Drive: {mudou} arquivos alterados desde a última sincronização.")
+                nomes = set(self.mapping())
+                faltando = set(expected_names or ()) - nomes
+                sobrando = ({n for n in nomes if n.lower().endswith(".pdf")} - set(expected_names)
+                            if expected_names is not None else set())
+                if faltando or sobrando:
+                    print(f"⚠️ Índice do Drive diferente da pasta local ({len(faltando)} PDFs faltando, "
+                          f"{len(sobrando)} sobrando); relistando a pasta inteira.")
+                    completo = True
+
+        if completo:
+            q = f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false"
+            try:
+                files = self._list_all(drive, q)
+            except Exception as e:
+                print(f"❌ Erro no mapeamento do Drive: {e}. Usando o índice salvo da última execução.")
+                self._conn.rollback()
+                return self.mapping()
+            self._conn.execute("DELETE FROM arquivos")
+            self._apply(files, folder_id)
+            METRICS.inc("drive.sync_completa")
+            self._set_estado("ultima_modificacao", "")
+            self._advance_watermark(files)
+            self._set_estado("pasta", folder_id)
+            self._set_estado("ultima_sync_completa", time.time())
+            self._conn.commit()
+        return self.mapping()
+
+def _map_pdf_files_in_folder(drive, folder_id, index_path=DRIVE_INDEX_PATH, force_full=False, expected_names=None):
+    """Mapeia PDFs da pasta pelo índice local sincronizado com o Drive. Retorna {nome: {"link", "modifiedTime"}}."""
+    print(f"📂 Mapeando Drive ID: {folder_id}...")
+    try:
+        index = DriveIndex(index_path)
+    except Exception as e:
+        print(f"⚠️ Índice do Drive indisponível ({e}). Listando a pasta inteira nesta execução.")
+        index = DriveIndex(":memory:")
+    with index:
+        mapping = index.sync(drive, folder_id, force_full=force_full, expected_names=expected_names)
     print(f"✅ Arquivos mapeados: {len(mapping)}")
     return mapping
 
-def apply_drive_links(df, name_to_link):
-    """Aplica Hyperlinks formato PT-BR (;) nas colunas PROA e Nome."""
-    df_out = df.copy()
-    if "proa_notificatorio" not in df_out.columns: return df_out
+def _map_pdf_links_in_folder(drive, folder_id):
+    """Mapeia nome do PDF -> link de visualização no Drive."""
+    return {name: meta["link"] for name, meta in _map_pdf_files_in_folder(drive, folder_id).items()}
 
-    # Prepara mapeamento limpo (apenas numeros)
+# Tamanhos de "cauda" tentados quando o PROA não bate exatamente com os dígitos do nome do arquivo
+LINK_SUFFIX_WIDTHS = (14, 12, 10)
+
+def _build_link_index(name_to_link: dict) -> tuple:
+    """
+    Prepara o mapeamento limpo (apenas números) e, por largura w, os arquivos cujo nome tem exatamente w dígitos:
+    o match parcial compara a cauda do PROA com o nome inteiro (um PROA de outro ano tem os mesmos últimos dígitos).
+    """
     map_clean = {}
     for name, link in name_to_link.items():
-        digits = re.sub(r"\D", "", name)
+        digits = RE_NAO_DIGITO.sub("", name)
         if digits: map_clean[digits] = link
 
-    for i, row in df_out.iterrows():
-        proa = str(row.get("proa_notificatorio", "")).strip()
-        nome = str(row.get("nome_empresa", "")).strip()
+    suffix_index = {w: {} for w in LINK_SUFFIX_WIDTHS}
+    for digits, link in map_clean.items():
+        if len(digits) in suffix_index: suffix_index[len(digits)][digits] = link
+    return map_clean, suffix_index
 
-        # Removemos a limpeza aqui dentro para usar a que fizemos lá fora ou a crua
-        # Mas para garantir o match do link:
-        proa_digits = re.sub(r"\D", "", proa)
+def apply_drive_links(df, name_to_link, return_unmatched=False):
+    """
+    Aplica Hyperlinks formato PT-BR (;) nas colunas PROA e Nome, com operações por coluna (sem iterrows).
+    Com return_unmatched=True devolve também os índices das linhas com PROA que não acharam link único.
+    """
+    df_out = df.copy()
+    if "proa_notificatorio" not in df_out.columns:
+        return (df_out, []) if return_unmatched else df_out
+
+    map_clean, suffix_index = _build_link_index(name_to_link)
+
+    proa = df_out["proa_notificatorio"].astype(str).str.strip()
+    nome = (df_out["nome_empresa"] if "nome_empresa" in df_out.columns else pd.Series("", index=df_out.index)).astype(str).str.strip()
+    proa_digits = proa.str.replace(r"\D", "", regex=True)
+
+    # Tenta achar link: match exato, depois match parcial (cauda do PROA = todos os dígitos do nome do arquivo)
+    link = proa_digits.map(map_clean).astype(object)
+    for w in LINK_SUFFIX_WIDTHS:
+        miss = link.isna() & (proa_digits.str.len() >= w)
+        if miss.any():
+            link[miss] = proa_digits[miss].str[-w:].map(suffix_index[w])
+
+    has_link = link.notna() & (proa_digits != "")
+    safe_proa = proa.str.replace('"', "'", regex=False)
+    safe_nome = nome.str.replace('"', "'", regex=False)
+
+    # Se já for fórmula, não aplica de novo para não quebrar
+    set_proa = has_link & ~safe_proa.str.startswith("=HYPERLINK")
+    set_nome = has_link & ~safe_nome.str.startswith("=HYPERLINK")
+    df_out.loc[set_proa, "proa_notificatorio"] = '=HYPERLINK("' + link[set_proa] + '"; "' + safe_proa[set_proa] + '")'
+    df_out.loc[set_nome, "nome_empresa"] = '=HYPERLINK("' + link[set_nome] + '"; "' + safe_nome[set_nome] + '")'
+
+    if return_unmatched:
+        return df_out, list(df_out.index[(proa_digits != "") & ~has_link])
+    return df_out
 
-        # Tenta achar link
-        link = ""
-        if proa_digits:
-            if proa_digits in map_clean:
-                link = map_clean[proa_digits]
-            else:
-                # Tentativa de match parcial (tail)
-                for w in [14, 12, 10]:
-                    if len(proa_digits) >= w and proa_digits[-w:] in map_clean:
-                         link = map_clean[proa_digits[-w:]] # Lógica simplificada
-                         break
+# ==========================
+# EXTRAÇÃO POR ARQUIVO (SEQUENCIAL OU EM POOL DE PROCESSOS)
+# ==========================
+def _is_up_to_date(data_pdf_str: str, data_planilha) -> bool:
+    """True se conseguiu ler a data do PDF e ela é igual ou menor que a da planilha."""
+    data_pdf_obj = _parse_br_date(data_pdf_str)
+    return bool(data_pdf_obj and data_pdf_obj <= data_planilha)
+
+class ExtractionTimeout(Exception):
+    """A extração de um PDF passou do orçamento de tempo (PDF_TEMPO_MAX_SEG)."""
 
-        if link:
-             safe_proa = proa.replace('"', "'")
-             safe_nome = nome.replace('"', "'")
+@contextmanager
+def _orcamento_tempo(segundos: float):
+    """
+    Levanta ExtractionTimeout dentro do bloco quando ele passa de `segundos`. Usa SIGALRM, que interrompe até
+    um regex em retrocesso (código C do MuPDF só quando volta ao Python) e repete a cada 0,1s caso algum
+    `except:` genérico engula a exceção. Fora da thread principal (ou sem setitimer) não há limite.
+    """
+    armado = bool(segundos) and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if armado:
+        def estourou(signum, frame):
+            raise ExtractionTimeout(f"passou de {segundos:g}s")
+        anterior = signal.signal(signal.SIGALRM, estourou)
+        signal.setitimer(signal.ITIMER_REAL, segundos, 0.1)
+    try:
+        yield
+    finally:
+        while armado:
+            try:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, anterior)
+                armado = False
+            except ExtractionTimeout:
+                pass  # disparou no meio da limpeza: desarma de novo
+
+def _process_one_pdf(pdf_path: str, data_planilha=None, force_update=False, campos=None, leitura=None):
+    """
+    Checa a data do rodapé e extrai UM PDF. Pode rodar dentro de um worker do pool,
+    por isso devolve as mensagens em vez de imprimir e nunca deixa exceção escapar.
+    Com `campos`, extrai só esses (o resto vem do cache de extração); com `leitura`, abre a cópia local.
+    Retorna (row ou None, lista de mensagens, data do rodapé lida ou "", motivo da quarentena ou "").
+    """
+    fname = os.path.basename(pdf_path)
+    logs = []
+    t_pdf = time.perf_counter()
+    try:
+        # Abre o PDF uma única vez: a mesma sessão serve para a checagem de data e para a extração
+        with _orcamento_tempo(PDF_TEMPO_MAX_SEG), PdfSession(pdf_path, leitura) as doc:
+            if not force_update and data_planilha is not None:
+                data_pdf_str = get_ultima_atualizacao_processo(doc)
+                if _is_up_to_date(data_pdf_str, data_planilha):
+                    logs.append(f"⏩ Pulando {fname} (Já atualizado em {data_pdf_str})")
+                    return None, logs, data_pdf_str, ""
+                logs.append(f"🔄 Atualizando {fname} (Nova data encontrada)")
+
+            # --- EXTRAÇÃO ---
+            if campos is None:
+                logs.append(f"   📂 Lendo PDF: {fname}...")
+            else:
+                logs.append(f"   📂 Lendo PDF: {fname} (campos desatualizados no cache: {', '.join(sorted(campos))})...")
+            row = extract_fields_from_pdf(pdf_path, doc, consultar_status=False, campos=campos)
+            if row is None:
+                logs.append("   ⚠️ Falha na extração. Pulando.")
+                return None, logs, "", ""
+            METRICS.observe("arquivo.extracao", time.perf_counter() - t_pdf)
+            logs.append(f"   ⏱️ {fname}: {time.perf_counter() - t_pdf:.2f}s ({doc.page_count} páginas)")
+            return row, logs, row.get("ultima_atualizacao_processo", ""), ""
+    except ExtractionTimeout as e:
+        logs.append(f"   🚧 {fname}: extração {e}. Arquivo em quarentena.")
+        return None, logs, "", f"tempo de extração {e}"
+    except Exception as e:
+        logs.append(f"   ❌ Erro em {fname}: {e}")
+        return None, logs, "", ""
+
+def _process_one_pdf_com_metricas(*args):
+    """Roda no processo filho: mede num RunMetrics próprio e devolve as medições junto para o pai somar."""
+    global METRICS
+    METRICS = RunMetrics()
+    return _process_one_pdf(*args), METRICS.raw()
+
+def _aquecer_worker(_):
+    time.sleep(0.05)
+    return os.getpid()
+
+class ExtractionPool:
+    """
+    Pool de processos da extração, reaproveitado entre as janelas. Todos os workers sobem já na criação, com a
+    cópia local parada: um fork no meio de uma cópia (thread segurando lock de E/S ou de métricas) pode deixar o
+    filho travado para sempre. Se um worker morrer (ex: PDF que derruba o MuPDF) o pool inteiro quebra e é
+    recriado do mesmo jeito. Os workers só recebem caminhos; o PdfPrefetcher fica no processo principal.
+    """
+    def __init__(self, workers: int, prefetcher: PdfPrefetcher = None):
+        self.workers = workers
+        self.prefetcher = prefetcher
+        self._pool = self._novo()
+
+    def _novo(self) -> ProcessPoolExecutor:
+        # 'fork' permite usar funções definidas no próprio notebook/célula dentro dos workers
+        ctx = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with self.prefetcher.pausado() if self.prefetcher is not None else nullcontext():
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            list(pool.map(_aquecer_worker, range(self.workers)))   # uma tarefa curta por worker: sobem todos agora
+        return pool
+
+    def submit(self, *args) -> Future:
+        try:
+            return self._pool.submit(_process_one_pdf_com_metricas, *args)
+        except BrokenProcessPool as e:   # quebrou no meio da janela: o arquivo sai como falho, igual aos pendentes
+            fut = Future()
+            fut.set_exception(e)
+            return fut
 
-             # Se já for fórmula, não aplica de novo para não quebrar
-             if not safe_proa.startswith("=HYPERLINK"):
-                 df_out.at[i, "proa_notificatorio"] = f'=HYPERLINK("{link}"; "{safe_proa}")'
+    def reiniciar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._novo()
 
-             if not safe_nome.startswith("=HYPERLINK"):
-                 df_out.at[i, "nome_empresa"] = f'=HYPERLINK("{link}"; "{safe_nome}")'
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
 
-             # REMOVIDO: df_out.at[i, "link_pdf"] = link
+def _run_extraction(tarefas, force_update=False, pool: ExtractionPool = None, prefetcher: PdfPrefetcher = None):
+    """
+    Executa _process_one_pdf para cada tarefa (dict com pdf_path, data_planilha e campos)
+    e devolve os resultados NA MESMA ORDEM das tarefas. Com `pool` usa os processos dele; se um worker
+    morrer, os arquivos ainda pendentes no pool são marcados como falhos e o pool é recriado.
+    Com `prefetcher`, cada PDF é lido da cópia local (se ela ficou pronta) em vez da montagem.
+    """
+    def leitura(t):
+        return prefetcher.acquire(t["pdf_path"], t["stat"]) if prefetcher is not None else None
 
-    return df_out
+    try:
+        if pool is None or len(tarefas) <= 1:
+            return [_process_one_pdf(t["pdf_path"], t["data_planilha"], force_update, t["campos"], leitura(t))
+                    for t in tarefas]
+
+        print(f"⚙️ Extraindo {len(tarefas)} PDFs com {pool.workers} processos...")
+        resultados, quebrou = [], False
+        # A cópia de cada arquivo é esperada na hora de enviá-lo: os anteriores já estão sendo extraídos
+        futures = [pool.submit(t["pdf_path"], t["data_planilha"], force_update, t["campos"], leitura(t))
+                   for t in tarefas]
+        for t, fut in zip(tarefas, futures):
+            try:
+                resultado, medicoes = fut.result()
+                METRICS.merge(medicoes)
+                resultados.append(resultado)
+            except Exception as e:
+                quebrou = quebrou or isinstance(e, BrokenProcessPool)
+                resultados.append((None, [f"   ❌ Erro no worker ({t['fname']}): {e}"], "", ""))
+        if quebrou:
+            METRICS.inc("extracao.pool_recriado")
+            pool.reiniciar()
+        return resultados
+    finally:
+        if prefetcher is not None:
+            for t in tarefas: prefetcher.release(t["pdf_path"])
 
 # ==========================
 # PIPELINE PRINCIPAL
@@ -597,91 +2488,776 @@ def apply_drive_links(df, name_to_link):
 # ==========================
 # PIPELINE PRINCIPAL (LÓGICA BLINDADA)
 # ==========================
-def process_all_pdfs(gc, pdf_dir=PDF_DIR, force_update=False):
-# 1. Carrega Planilha
-    df, ws = load_or_create_gsheet(gc, GSHEET_NAME, GSHEET_WORKSHEET_NAME, COLUMNS)
+def _proa_from_filename(fname: str) -> str:
+    """
+    PROA (só dígitos) pelo nome do arquivo. Um número no formato do PROA vale sozinho, então "24190000012345 (1).pdf"
+    e "24-1900-0001234-5_vol2.pdf" caem no mesmo processo. Sem ele, todos os dígitos do nome, tirando marcas de cópia.
+    """
+    m = RE_PROA_NOME_ARQUIVO.search(fname)
+    if m: return "".join(m.groups())
+    return RE_NAO_DIGITO.sub("", RE_COPIA_NOME_ARQUIVO.sub("", os.path.splitext(fname)[0]))
 
-    # 2. Mapeia Links do Drive
-    name_to_link = _map_pdf_links_in_folder(drive, FOLDER_ID_DRIVE)
+def _probe_pdf(pdf_path: str, proa=True, rodape=True, leitura: str = None) -> dict:
+    """
+    Sondagem barata: PROA da 1ª página e/ou data do rodapé da última, sem extrair o resto.
+    Devolve {"proa", "data_rodape"} (só o que foi pedido e achado); erro ou tempo estourado = {}.
+    `leitura`: cópia local do PDF (PdfPrefetcher), lida no lugar da montagem.
+    """
+    resultado = {}
+    try:
+        with _orcamento_tempo(PDF_TEMPO_MAX_SEG), PdfSession(pdf_path, leitura) as doc:
+            if proa: resultado["proa"] = RE_NAO_DIGITO.sub("", get_proa_notificatorio(extract_pdf_text(doc, 1)))
+            if rodape: resultado["data_rodape"] = get_ultima_atualizacao_processo(doc)
+    except Exception:
+        return {}
+    finally:
+        METRICS.inc("pdf.sondagens")
+    return {k: v for k, v in resultado.items() if v}
 
-    # 3. Cria Mapa de Datas Existentes (CORRIGIDO PARA LER DENTRO DO HYPERLINK)
-    existing_dates = {}
-    if not df.empty and "proa_notificatorio" in df.columns:
-        for _, row in df.iterrows():
-            # Usa a função nova para ignorar o =HYPERLINK e pegar só o número
-            clean_proa = _extract_clean_proa(row["proa_notificatorio"])
+def _sondar(versoes, prefetcher: PdfPrefetcher = None, **kwargs):
+    """
+    Gerador de (versão, _probe_pdf da versão). Com `prefetcher`, as próximas versões já vêm sendo copiadas para o
+    disco local e a sondagem lê a cópia; liberada, ela fica no disco e serve também para a extração.
+    """
+    for i, v in enumerate(versoes):
+        leitura = None
+        if prefetcher is not None:
+            prefetcher.prefetch([(x["path"], x["stat"]) for x in versoes[i:i + prefetcher.adiante]])
+            leitura = prefetcher.acquire(v["path"], v["stat"])
+        try:
+            yield v, _probe_pdf(v["path"], leitura=leitura, **kwargs)
+        finally:
+            if prefetcher is not None: prefetcher.release(v["path"])
 
-            d_str = str(row.get("ultima_atualizacao_processo", ""))
-            d_obj = _parse_br_date(d_str)
+def _versao_ordem(v: dict) -> tuple:
+    # Mais nova = maior data do rodapé; empate: modifiedTime do Drive, mtime local, tamanho (volumes posteriores crescem)
+    return (_parse_br_date(v["data_rodape"]) or datetime.date.min, v["drive_modified"], v["stat"].st_mtime,
+            v["stat"].st_size, v["fname"])
 
-            if clean_proa and d_obj:
-                existing_dates[clean_proa] = d_obj
+def dedupe_pdf_versions(pdf_names, pdf_dir, drive_files=None, manifest=None, force_update=False,
+                        prefetcher: PdfPrefetcher = None) -> tuple:
+    """
+    Agrupa os PDFs por processo antes da extração e devolve (nomes a processar, grupos com mais de um arquivo).
+    Chave: PROA do nome (_proa_from_filename); sem dígitos no nome, o do manifesto ou o da 1ª página (sondagem,
+    guardada no manifesto). Em cada grupo só a versão mais nova segue (_versao_ordem; a data do rodapé vem do
+    manifesto ou da sondagem da última página). Arquivos em quarentena não concorrem: seriam pulados de qualquer jeito.
+    Com `prefetcher`, as sondagens leem a cópia local em vez da montagem do Drive.
+    """
+    drive_files = drive_files or {}
+    grupos, avulsos, sem_chave = {}, set(), []
+    for fname in pdf_names:
+        pdf_path = os.path.join(pdf_dir, fname)
+        try:
+            st = os.stat(pdf_path)
+        except OSError:
+            avulsos.add(fname)   # o erro aparece no planejamento
+            continue
+        if not force_update and manifest is not None and manifest.quarantine_reason(fname, st.st_size, st.st_mtime):
+            avulsos.add(fname)
+            continue
+        drive_modified = drive_files.get(fname, {}).get("modifiedTime", "")
+        visto = manifest.lookup(fname, st.st_size, st.st_mtime, drive_modified) if manifest is not None else None
+        versao = {"fname": fname, "path": pdf_path, "stat": st, "drive_modified": drive_modified,
+                  "data_rodape": (visto or {}).get("data_rodape", "")}
+        versao["chave"] = _proa_from_filename(fname) or (visto or {}).get("proa", "")
+        if versao["chave"]: grupos.setdefault(versao["chave"], []).append(versao)
+        else: sem_chave.append(versao)
+    for v, sondagem in _sondar(sem_chave, prefetcher, rodape=False):
+        v["chave"] = sondagem.get("proa", "")
+        if v["chave"] and manifest is not None:
+            manifest.record(v["fname"], v["stat"].st_size, v["stat"].st_mtime, v["drive_modified"], v["chave"], "")
+        if v["chave"]: grupos.setdefault(v["chave"], []).append(v)
+        else: avulsos.add(v["fname"])
+
+    # Data do rodapé só falta ser sondada nas versões que concorrem com outra
+    sem_data = [v for versoes in grupos.values() if len(versoes) > 1 for v in versoes if not v["data_rodape"]]
+    for v, sondagem in _sondar(sem_data, prefetcher, proa=False):
+        v["data_rodape"] = sondagem.get("data_rodape", "")
+        if v["data_rodape"] and manifest is not None:
+            manifest.record(v["fname"], v["stat"].st_size, v["stat"].st_mtime, v["drive_modified"], v["chave"],
+                            v["data_rodape"])
+
+    duplicados = []
+    for chave, versoes in grupos.items():
+        if len(versoes) > 1:
+            versoes.sort(key=_versao_ordem, reverse=True)
+            duplicados.append({"proa": chave, "escolhido": versoes[0]["fname"], "data_rodape": versoes[0]["data_rodape"],
+                               "ignorados": [v["fname"] for v in versoes[1:]]})
+        avulsos.add(versoes[0]["fname"])
+    return [f for f in pdf_names if f in avulsos], duplicados
+
+def _row_from_cache(cached: dict, extraido: dict = None) -> dict:
+    """Monta a linha completa juntando campos do cache de extração com os recém-extraídos."""
+    row = {**cached, **(extraido or {})}
+    row["ultima_analise_feita"] = get_data_analise_agora()
+    return {**{col: row.get(col, "") for col in COLUMNS}, **row}
+
+def _plan_tasks(pdf_names, pdf_dir, existing_dates, drive_files, force_update, extraction_cache, versions,
+                manifest, checkpoint=None, refresh_extraction_cache=False, contadores=None, prefetcher=None):
+    """
+    Gerador de tarefas de extração (ordem fixa: nome do arquivo). Decide arquivo a arquivo, sem montar a lista toda:
+    pula pelo checkpoint (execução interrompida), pelo manifesto ou pela data do rodapé guardada no cache.
+    Com `prefetcher`, os próximos arquivos que o cache de extração não conhece (novos ou alterados: o hash vai
+    ler o arquivo inteiro) já começam a ser copiados para o disco local.
+    """
+    contadores = contadores if contadores is not None else {}
+    agendados = 0
+    for i, fname in enumerate(pdf_names):
+        pdf_path = os.path.join(pdf_dir, fname)
+        if prefetcher is not None and extraction_cache is not None:
+            while agendados < min(len(pdf_names), i + 1 + prefetcher.adiante):
+                proximo = os.path.join(pdf_dir, pdf_names[agendados])
+                agendados += 1
+                try:
+                    st_proximo = os.stat(proximo)
+                except OSError:
+                    continue
+                if not extraction_cache.knows(proximo, st_proximo): prefetcher.prefetch([(proximo, st_proximo)])
 
-    print(f"📊 Processos reconhecidos na planilha: {len(existing_dates)}")
+        # Tenta extrair números do nome do arquivo para comparar com a planilha
+        # Ex: "Processo_241900.pdf" -> "241900"; "24190000012345 (1).pdf" -> "24190000012345"
+        proa_digits_pdf = _proa_from_filename(fname)
 
-    # 4. Processa PDFs
-    for fname in os.listdir(pdf_dir):
-        if not fname.lower().endswith(".pdf"): continue
-        pdf_path = os.path.join(pdf_dir, fname)
+        # Impressão digital barata: stat local + modifiedTime do Drive
+        try:
+            st = os.stat(pdf_path)
+        except OSError as e:
+            print(f"   ❌ Erro ao acessar {fname}: {e}")
+            continue
 
-        should_process = True
+        # Já gravado na planilha por uma execução anterior que foi interrompida
+        if checkpoint is not None and checkpoint.is_done(fname, st.st_size, st.st_mtime):
+            contadores["retomados"] = contadores.get("retomados", 0) + 1
+            continue
 
-        # Tenta extrair números do nome do arquivo para comparar com a planilha
-        # Ex: "Processo_241900.pdf" -> "241900"
-        proa_digits_pdf = re.sub(r"\D", "", fname)
+        # Isolado numa execução anterior (ex: estourou o orçamento de tempo) e ainda não mudou
+        if not force_update and manifest is not None:
+            motivo = manifest.quarantine_reason(fname, st.st_size, st.st_mtime)
+            if motivo:
+                print(f"🚧 Pulando {fname} (em quarentena: {motivo})")
+                contadores["pulados_quarentena"] = contadores.get("pulados_quarentena", 0) + 1
+                continue
+
+        drive_modified = drive_files.get(fname, {}).get("modifiedTime", "")
+        visto = manifest.lookup(fname, st.st_size, st.st_mtime, drive_modified) if manifest is not None else None
+        # Sem números no nome, o PROA lido da última vez (manifesto) ainda identifica o processo
+        chave = proa_digits_pdf or (visto or {}).get("proa", "")
 
         # --- LÓGICA DE DECISÃO ---
+        # data_planilha = None -> extrai direto; senão o worker compara com o rodapé do PDF
+        data_planilha = None
+        logs = []
         if not force_update:
             # CASO 1: Arquivo SEM números no nome (não dá pra saber quem é sem ler) -> Processa
-            if not proa_digits_pdf:
-                should_process = True
-
-            # CASO 2: O processo JÁ ESTÁ na planilha -> Verifica a data
-            elif proa_digits_pdf in existing_dates:
-                data_pdf_str = get_ultima_atualizacao_processo(pdf_path)
-                data_pdf_obj = _parse_br_date(data_pdf_str)
-                data_planilha = existing_dates[proa_digits_pdf]
-
-                # Se conseguiu ler a data do PDF e ela é igual ou menor que a da planilha
-                if data_pdf_obj and data_pdf_obj <= data_planilha:
-                    print(f"⏩ Pulando {fname} (Já atualizado em {data_pdf_str})")
-                    should_process = False
-                else:
-                    print(f"🔄 Atualizando {fname} (Nova data encontrada)")
-                    should_process = True
+            if not chave:
+                pass
+
+            # CASO 2: O processo JÁ ESTÁ na planilha -> Verifica a data (manifesto, cache ou dentro do worker)
+            elif chave in existing_dates:
+                data_planilha = existing_dates[chave]
 
             # CASO 3: O processo NÃO ESTÁ na planilha (Seu caso de teste!)
             else:
-                print(f"🆕 Novo: {fname} -> Processando...")
-                should_process = True
+                logs.append(f"🆕 Novo: {fname} -> Processando...")
 
-        if not should_process:
-            continue
-
-        # --- EXTRAÇÃO E SALVAMENTO ---
-        print(f"   📂 Lendo PDF: {fname}...")
-        try:
-            row = extract_fields_from_pdf(pdf_path)
+        # Arquivo igual ao da última leitura: a data do rodapé vem do manifesto, sem abrir o PDF
+        if data_planilha is not None and visto and visto["data_rodape"]:
+            if _is_up_to_date(visto["data_rodape"], data_planilha):
+                print(f"⏩ Pulando {fname} (Já atualizado em {visto['data_rodape']})")
+                contadores["manifesto"] = contadores.get("manifesto", 0) + 1
+                continue
+            logs.append(f"🔄 Atualizando {fname} (Nova data encontrada)")
+            data_planilha = None
 
-            if row is None:
-                print("   ⚠️ Falha na extração. Pulando.")
+        # --- CACHE DE EXTRAÇÃO ---
+        # campos = None -> extrai tudo; set() -> tudo veio do cache; senão só os desatualizados
+        sha, cached, campos = None, {}, None
+        if extraction_cache is not None:
+            try:
+                sha = extraction_cache.fingerprint(pdf_path, prefetcher)
+                if not refresh_extraction_cache:
+                    cached, stale = extraction_cache.get(sha, versions)
+                    campos = stale if cached else None
+                    if cached and stale: contadores["cache_parcial"] = contadores.get("cache_parcial", 0) + 1
+            except Exception as e:
+                logs.append(f"   ⚠️ Cache de extração falhou para {fname}: {e}")
+
+        # Se a data do rodapé já está no cache, a checagem nem precisa abrir o PDF
+        if data_planilha is not None and "ultima_atualizacao_processo" in cached:
+            data_pdf_str = cached["ultima_atualizacao_processo"]
+            if _is_up_to_date(data_pdf_str, data_planilha):
+                print(f"⏩ Pulando {fname} (Já atualizado em {data_pdf_str})")
+                contadores["pulados_cache_rodape"] = contadores.get("pulados_cache_rodape", 0) + 1
+                if manifest is not None: manifest.record(fname, st.st_size, st.st_mtime, drive_modified, chave, data_pdf_str)
                 continue
+            logs.append(f"🔄 Atualizando {fname} (Nova data encontrada)")
+            data_planilha = None
+
+        yield {"fname": fname, "pdf_path": pdf_path, "data_planilha": data_planilha,
+               "logs": logs, "sha": sha, "cached": cached, "campos": campos,
+               "stat": st, "drive_modified": drive_modified, "chave": chave}
+
+def iter_extracted_rows(tarefas, force_update=False, workers=1, extraction_cache=None, versions=None,
+                        manifest=None, window=SHEET_FLUSH_BATCH, contadores=None, prefetcher=None, pool=None):
+    """
+    Gerador das linhas extraídas: consome as tarefas em janelas de `window` arquivos (o pool de processos
+    trabalha dentro da janela) e devolve (tarefa, linha) na ordem das tarefas. linha=None quando o PDF só
+    foi conferido (rodapé igual ao da planilha) ou deu erro. Com `prefetcher`, a janela seguinte é planejada
+    e começa a ser copiada para o disco local antes da extração da atual; nada fica acumulado além disso.
+    Sem `pool` e com workers > 1, cria (e fecha no fim) um ExtractionPool próprio.
+    """
+    contadores = contadores if contadores is not None else {}
+    tarefas = iter(tarefas)
+
+    def planejar():
+        with METRICS.timer("etapa.planejamento"):
+            janela = list(itertools.islice(tarefas, max(1, window)))
+        if prefetcher is not None:
+            prefetcher.prefetch([(t["pdf_path"], t["stat"]) for t in janela if t["campos"] != set()])
+        return janela
+
+    # Pool criado antes do primeiro agendamento de cópia (process_all_pdfs já passa o dele, criado antes de tudo)
+    proprio = pool is None and workers > 1
+    if proprio: pool = ExtractionPool(workers, prefetcher)
+    try:
+        proxima = planejar()
+        while True:
+            janela = proxima if proxima is not None else planejar()
+            if not janela: return
+            proxima = planejar() if prefetcher is not None else None
+
+            # Extração (sequencial ou em pool de processos) só do que o cache não cobre
+            a_extrair = [t for t in janela if t["campos"] != set()]
+            with METRICS.timer("etapa.extracao"):
+                resultados = dict(zip((t["fname"] for t in a_extrair),
+                                      _run_extraction(a_extrair, force_update, pool, prefetcher)))
+            for t in janela:
+                fname = t["fname"]
+                motivo = ""
+                if fname in resultados:
+                    row, logs_pdf, data_rodape, motivo = resultados.pop(fname)
+                else:
+                    row, logs_pdf = {}, [f"   💾 {fname}: todos os campos vieram do cache de extração"]
+                    data_rodape = t["cached"].get("ultima_atualizacao_processo", "")
+                    contadores["cache"] = contadores.get("cache", 0) + 1
+                for msg in t["logs"] + logs_pdf: print(msg)
+
+                # Registra no manifesto o que foi lido (extraído ou pulado pelo rodapé); erros não entram
+                if manifest is not None and (row is not None or data_rodape):
+                    proa_lido = RE_NAO_DIGITO.sub("", str((row or {}).get("proa_notificatorio") or t["cached"].get("proa_notificatorio", "")))
+                    manifest.record(fname, t["stat"].st_size, t["stat"].st_mtime, t["drive_modified"], proa_lido or t["chave"], data_rodape)
+                if motivo:
+                    if manifest is not None: manifest.quarantine(fname, t["stat"].st_size, t["stat"].st_mtime, motivo)
+                    METRICS.record("quarentena", {"arquivo": fname, "motivo": motivo})
+                    contadores["quarentena"] = contadores.get("quarentena", 0) + 1
+                    yield t, None
+                    continue
+                if row is None:
+                    chave = "pulados_rodape" if data_rodape else "falhas"
+                    contadores[chave] = contadores.get(chave, 0) + 1
+                    yield t, None
+                    continue
+                if manifest is not None: manifest.release(fname)
+
+                if extraction_cache is not None and t["sha"] and row:
+                    try: extraction_cache.put(t["sha"], row, versions)
+                    except Exception as e: print(f"   ⚠️ Não foi possível gravar {fname} no cache de extração: {e}")
+                contadores["extraidos"] = contadores.get("extraidos", 0) + 1
+                yield t, _row_from_cache(t["cached"], row)
+    finally:
+        if proprio: pool.close()
+
+
+class RunCheckpoint(_SqliteStore):
+    """
+    Arquivos cujas linhas já foram gravadas na planilha nesta execução (com tamanho/mtime da hora da leitura).
+    Se a execução cair no meio, a próxima com os mesmos parâmetros continua do último lote gravado;
+    ao terminar bem, o checkpoint é apagado.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS execucao (chave TEXT PRIMARY KEY, valor TEXT);
+        CREATE TABLE IF NOT EXISTS concluidos (nome TEXT PRIMARY KEY, tamanho INTEGER, mtime REAL);
+    """
 
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        super().__init__(path)
+
+    def begin(self, assinatura: str) -> int:
+        """Abre (ou retoma) a execução com estes parâmetros. Devolve quantos arquivos já estavam concluídos."""
+        row = self._conn.execute("SELECT valor FROM execucao WHERE chave = 'assinatura'").fetchone()
+        if not row or row[0] != assinatura:
+            self._conn.execute("DELETE FROM concluidos")
+            self._conn.execute("INSERT OR REPLACE INTO execucao (chave, valor) VALUES ('assinatura', ?)", (assinatura,))
+            self._conn.commit()
+        return self._conn.execute("SELECT COUNT(*) FROM concluidos").fetchone()[0]
+
+    def is_done(self, nome: str, tamanho: int, mtime: float) -> bool:
+        row = self._conn.execute("SELECT tamanho, mtime FROM concluidos WHERE nome = ?", (nome,)).fetchone()
+        return bool(row) and row[0] == tamanho and row[1] == mtime
+
+    def mark_done(self, tarefas):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO concluidos (nome, tamanho, mtime) VALUES (?, ?, ?)",
+            [(t["fname"], t["stat"].st_size, t["stat"].st_mtime) for t in tarefas],
+        )
+
+    def finish(self):
+        self._conn.execute("DELETE FROM concluidos")
+        self._conn.execute("DELETE FROM execucao")
+
+def _instante(valor) -> float:
+    """Epoch de um instante informado como número, date/datetime ou texto ISO ('2025-01-31' ou '2025-01-31T08:00')."""
+    if isinstance(valor, (int, float)): return float(valor)
+    if isinstance(valor, str): valor = datetime.datetime.fromisoformat(valor.strip())
+    if not isinstance(valor, datetime.datetime): valor = datetime.datetime.combine(valor, datetime.time())
+    return valor.timestamp()
+
+class StatusEventLog(_SqliteStore):
+    """
+    Log só de acréscimo das mudanças em CAMPOS_EVENTOS, por PROA (só dígitos): cada evento tem instante, campo,
+    valor anterior e valor novo (anterior vazio = primeira vez que o campo apareceu). O último valor visto de cada
+    campo fica em `atual`, que é a base da comparação. Valores vazios ou "ERRO..." (consulta adiada, extração que
+    falhou) não viram evento nem substituem o último valor bom.
+    O `id` crescente é o cursor: quem consome guarda o último id lido e pede só o que veio depois.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, registrado_em REAL NOT NULL, proa TEXT NOT NULL,
+            campo TEXT NOT NULL, anterior TEXT, novo TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS eventos_registrado_em ON eventos (registrado_em);
+        CREATE INDEX IF NOT EXISTS eventos_proa ON eventos (proa, id);
+        CREATE TABLE IF NOT EXISTS atual (proa TEXT, campo TEXT, valor TEXT, PRIMARY KEY (proa, campo));
+    """
+    COLUNAS = ["id", "registrado_em", "proa", "campo", "anterior", "novo"]
+
+    def __init__(self, path: str = EVENT_LOG_PATH):
+        super().__init__(path)
+        self._atual = {(proa, campo): valor for proa, campo, valor in self._conn.execute("SELECT * FROM atual")}
+
+    def observe(self, df: pd.DataFrame, agora: float = None) -> int:
+        """Compara as linhas de `df` com o último valor visto e acrescenta um evento por campo que mudou."""
+        if df is None or df.empty: return 0
+        agora = agora or time.time()
+        novos = {}
+        for proa, *valores in df.reindex(columns=["proa_notificatorio", *CAMPOS_EVENTOS]).to_numpy("object"):
+            proa = _extract_clean_proa(_cell_str(proa))
+            if not proa: continue
+            for campo, valor in zip(CAMPOS_EVENTOS, valores):
+                valor = _cell_str(valor).strip()
+                if valor and not valor.startswith("ERRO"): novos[(proa, campo)] = valor   # com PROA repetido, vale a última linha
+        mudancas = [(chave, valor) for chave, valor in novos.items() if self._atual.get(chave) != valor]
+        if not mudancas: return 0
+        self._conn.executemany(
+            "INSERT INTO eventos (registrado_em, proa, campo, anterior, novo) VALUES (?, ?, ?, ?, ?)",
+            [(agora, proa, campo, self._atual.get((proa, campo)), valor) for (proa, campo), valor in mudancas])
+        self._conn.executemany("INSERT OR REPLACE INTO atual (proa, campo, valor) VALUES (?, ?, ?)",
+                               [(proa, campo, valor) for (proa, campo), valor in mudancas])
+        self._atual.update(mudancas)
+        METRICS.inc("eventos.registrados", len(mudancas))
+        return len(mudancas)
+
+    def since(self, desde=None, cursor: int = None, proas=None, campos=None, limite: int = None) -> pd.DataFrame:
+        """
+        Eventos em ordem de registro, a partir do instante `desde` (inclusive) e/ou depois do id `cursor`,
+        opcionalmente só de alguns PROAs (qualquer formato) ou campos. `registrado_em` volta como datetime local.
+        """
+        filtros, params = [], []
+        if desde is not None:
+            filtros.append("registrado_em >= ?"); params.append(_instante(desde))
+        if cursor is not None:
+            filtros.append("id > ?"); params.append(int(cursor))
+        for coluna, valores in (("proa", [_extract_clean_proa(p) for p in proas or ()]), ("campo", list(campos or ()))):
+            if valores:
+                filtros.append(f"{coluna} IN ({', '.join('?' * len(valores))})"); params.extend(valores)
+        sql = f"SELECT {', '.join(self.COLUNAS)} FROM eventos"
+        if filtros: sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY id"
+        if limite: sql += f" LIMIT {int(limite)}"
+        eventos = pd.DataFrame(self._conn.execute(sql, params).fetchall(), columns=self.COLUNAS)
+        eventos["registrado_em"] = pd.to_datetime(eventos["registrado_em"].map(datetime.datetime.fromtimestamp))
+        return eventos
+
+    def timeline(self, proa: str) -> pd.DataFrame:
+        """Histórico completo de um processo."""
+        return self.since(proas=[proa])
+
+    def last_cursor(self) -> int:
+        return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM eventos").fetchone()[0]
+
+def status_events_since(desde=None, cursor: int = None, path: str = None, **filtros) -> pd.DataFrame:
+    """Atalho para consumidores: abre o log, consulta (ver StatusEventLog.since) e fecha. Sem log, volta vazio."""
+    path = path or EVENT_LOG_PATH
+    if not os.path.exists(path): return pd.DataFrame(columns=StatusEventLog.COLUNAS)
+    with StatusEventLog(path) as log:
+        return log.since(desde, cursor, **filtros)
+
+def _flush_to_sheet(ws, df, df_snapshot, lote, name_to_link, scheduler: StatusScheduler = None,
+                    write_mode=SHEET_WRITE_MODE, final=False, tabela=None, eventos: StatusEventLog = None):
+    """
+    Grava um lote de linhas: status em lote, upsert, hyperlinks e escrita (diff ou aba inteira).
+    No lote final, a fila de status do `scheduler` reconsulta também os vencidos do resto da planilha.
+    Devolve (df, df_snapshot) atualizados; o snapshot passa a ser o que está na planilha agora
+    (índice + 2 = linha da planilha) e, com `tabela`, também fica gravado na tabela local.
+    Com `eventos`, as mudanças gravadas entram no log: as linhas do lote e, no lote final, a planilha toda.
+    """
+    # Status Web em lote (concorrente, com limite de req/s e orçamento da execução) e junção nas linhas
+    scheduler = scheduler or StatusScheduler(orcamento=None)
+    if lote:
+        with METRICS.timer("etapa.status"):
+            status_map = scheduler.for_rows([row.get("proa_notificatorio", "") for _, row in lote])
+        for fname, row in lote:
+            num = RE_NAO_DIGITO.sub("", row.get("proa_notificatorio", ""))
+            row["status_processo"] = status_map.get(num, "")
             row["link_pdf"] = name_to_link.get(fname, "")
-            df = upsert_row(df, row)
 
+        # Upsert em lote: indexa a planilha uma vez e aplica tudo num passo só
+        try:
+            with METRICS.timer("etapa.upsert"):
+                df = upsert_rows(df, [row for _, row in lote])
         except Exception as e:
-            print(f"   ❌ Erro: {e}")
-            continue
+            print(f"   ❌ Erro ao atualizar as linhas: {e}")
 
-    # 5. Finalização
     df = df[df["proa_notificatorio"].notna() & (df["proa_notificatorio"].str.strip() != "")].copy()
+    if final:
+        with METRICS.timer("etapa.status"):
+            df = scheduler.refresh_stale(df)
 
     # Aplica hyperlinks
-    df_write = apply_drive_links(df, name_to_link)
+    with METRICS.timer("etapa.links"):
+        df_write, sem_link = apply_drive_links(df, name_to_link, return_unmatched=True)
+    if final: METRICS.inc("planilha.sem_link", len(sem_link))
+    if sem_link and final:
+        exemplos = ", ".join(df.loc[sem_link[:5], "proa_notificatorio"].astype(str))
+        print(f"🔗 Sem link único no Drive: {len(sem_link)} processos (ex: {exemplos})")
+
+    print("Atualizando planilha..." if final else f"💾 Gravando lote de {len(lote)} linhas na planilha...")
+    t_escrita = time.perf_counter()
+    if tabela is not None: tabela.begin_write()
+    resumo = None
+    if write_mode == "diff" and not df_snapshot.empty:
+        resumo = write_sheet_diff(ws, df_snapshot, df_write)
+        if resumo is None:
+            print("⚠️ Cabeçalho da aba diferente do esperado. Reescrevendo a aba inteira.")
+    if resumo is None:
+        ws.clear()
+        gspread_dataframe.set_with_dataframe(ws, df_write, include_index=False, resize=True)
+        METRICS.inc("planilha.reescritas_completas")
+    else:
+        METRICS.inc("planilha.celulas", resumo["celulas"])
+    METRICS.observe("etapa.escrita_planilha", time.perf_counter() - t_escrita)
+    if resumo is not None:
+        print(f"✏️ Células alteradas: {resumo['celulas']} em {resumo['intervalos']} intervalos "
+              f"(linhas novas: {resumo['linhas_novas']}, limpas: {resumo['linhas_limpas']})")
+    # Reescrita completa: linhas 2..n+1. Por diferença: cada linha fica onde o diff a colocou (linhas limpas no meio
+    # continuam ocupando o lugar delas na aba)
+    df_snapshot = df_write.reset_index(drop=True)
+    if resumo is not None: df_snapshot.index = [linha - 2 for linha in resumo["linhas"]]
+    if tabela is not None: tabela.end_write(df_snapshot)
+    if eventos is not None:
+        with METRICS.timer("etapa.eventos"):
+            if final:
+                eventos.observe(df)
+            elif lote:
+                eventos.observe(df[df["proa_notificatorio"].isin([row.get("proa_notificatorio", "") for _, row in lote])])
+    return df, df_snapshot
+
+# ==========================
+# RESUMO DA CARTEIRA (AGREGADOS PARA O PAINEL)
+# ==========================
+# Faixas de idade da última atualização do processo (limite superior em dias, rótulo); o resto é "mais de 1 ano"
+IDADE_FAIXAS = ((30, "até 30 dias"), (90, "31 a 90 dias"), (365, "91 a 365 dias"))
+STATUS_CLASSES = ("ativo", "erro", "final", "outro", "sem status")
+
+def status_class(status: pd.Series) -> pd.Series:
+    """Classe de cada status, com a mesma precedência das cores do painel: ativo, erro/falha, final, vazio, outro."""
+    s = status.fillna("").astype(str).str.strip().str.lower()
+    classe = pd.Series("outro", index=s.index)
+    classe[s.isin(["", "nan"])] = "sem status"
+    classe[s.str.contains("|".join(STATUS_FINAIS))] = "final"
+    classe[s.str.contains("erro|falha")] = "erro"
+    classe[s.str.contains("ativo", regex=False)] = "ativo"
+    return classe
+
+def _contagem(serie: pd.Series, limite: int = None) -> dict:
+    contagem = serie.value_counts()
+    return {str(k): int(v) for k, v in (contagem.head(limite) if limite else contagem).items()}
+
+def summarize_portfolio(df: pd.DataFrame, hoje=None) -> dict:
+    """
+    Agregados da carteira numa passada vetorizada: total, por classe de status, status mais comuns, por tipo de
+    penalidade, erros (mensagens de status e campos extraídos com "ERRO") e idade da última atualização.
+    O tamanho do resultado não cresce com o número de processos.
+    """
+    hoje = hoje or datetime.date.today()
+    df = df.reindex(columns=list(dict.fromkeys([*COLUMNS, *df.columns]))).fillna("")
+    status = df["status_processo"].astype(str).str.strip()
+    classe = status_class(status)
+    por_status = dict.fromkeys(STATUS_CLASSES, 0)
+    por_status.update(_contagem(classe))
+
+    datas = pd.to_datetime(df["ultima_atualizacao_processo"].astype(str).str.slice(0, 10), format="%d/%m/%Y", errors="coerce")
+    dias = (pd.Timestamp(hoje) - datas).dt.days
+    por_idade, anterior = {}, None
+    for limite, rotulo in IDADE_FAIXAS:
+        por_idade[rotulo] = int((dias <= limite).sum() - (0 if anterior is None else (dias <= anterior).sum()))
+        anterior = limite
+    por_idade["mais de 1 ano"] = int((dias > anterior).sum())
+    por_idade["sem data"] = int(dias.isna().sum())
+
+    erros_extracao = {col: int(df[col].astype(str).str.startswith("ERRO").sum())
+                      for col in COLUMNS if col != "status_processo"}
+    return {
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "total": int(len(df)),
+        "por_status": por_status,
+        "status_detalhado": _contagem(status.replace("", "Sem Status"), 20),
+        "por_tipo_penalidade": _contagem(df["tipo_penalidade"].astype(str).str.strip().replace("", "(sem tipo)")),
+        "erros": {"status": _contagem(status[classe == "erro"].str.slice(0, 80)),
+                  "extracao": {col: n for col, n in erros_extracao.items() if n}},
+        "por_idade": por_idade,
+    }
+
+def write_portfolio_summary(resumo: dict, path: str = None):
+    """Grava o resumo em JSON (escrita atômica, como o relatório de métricas)."""
+    path = path or PORTFOLIO_SUMMARY_PATH
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f: json.dump(resumo, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar {path}: {e}")
+
+def load_portfolio_summary(path: str = None):
+    """Resumo da última execução (ou None se ainda não existe)."""
+    try:
+        with open(path or PORTFOLIO_SUMMARY_PATH, encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    print("Atualizando planilha...")
-    ws.clear()
-    set_with_dataframe(ws, df_write, include_index=False, resize=True)
+def process_all_pdfs(gc, pdf_dir=None, force_update=False, workers=PDF_WORKERS, force_refresh_status=False,
+                     refresh_extraction_cache=False, write_mode=SHEET_WRITE_MODE, full_drive_sync=False,
+                     batch_size=SHEET_FLUSH_BATCH, resume=True, drive_service=None, read_mode=SHEET_READ_MODE,
+                     sync_from_sheet=False, status_budget=STATUS_REFRESH_BUDGET, prefetch=PDF_PREFETCH):
+    # Clientes injetados (connect_google ou parâmetros); pdf_dir=None usa o PDF_DIR configurado
+    pdf_dir = pdf_dir or PDF_DIR
+    drive_service = drive_service or drive
+    if gc is None or drive_service is None:
+        raise RuntimeError("Clientes do Google não conectados: chame connect_google() antes (ou passe gc/drive_service).")
+
+# 1. Carrega o estado da planilha: da tabela local (sem ler a aba) ou, se ela não estiver em dia, da aba inteira
+    # O snapshot é o que está na aba agora e serve de base para a escrita por diferença
+    METRICS.reset()
+    t_execucao = time.perf_counter()
+    try:
+        tabela = LocalTable(LOCAL_TABLE_PATH)
+    except Exception as e:
+        print(f"⚠️ Tabela local indisponível ({e}). Lendo a planilha inteira.")
+        tabela = None
+    with METRICS.timer("etapa.leitura_planilha"):
+        df, ws, existing_dates = load_sheet_state(gc, tabela, read_mode, sync_from_sheet)
+    df_snapshot = df.copy()
+
+    # 2. Mapeia Links do Drive (o modifiedTime alimenta o manifesto de pulo)
+    # Os PDFs da montagem local servem de conferência: se algum não estiver no índice, relista a pasta
+    pdfs_locais = sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+    with METRICS.timer("etapa.drive"):
+        drive_files = _map_pdf_files_in_folder(drive_service, FOLDER_ID_DRIVE, index_path=DRIVE_INDEX_PATH,
+                                               force_full=full_drive_sync, expected_names=pdfs_locais)
+    name_to_link = {name: meta["link"] for name, meta in drive_files.items()}
+
+    # 3. Mapa de datas existentes (PROA só dígitos -> última atualização) veio junto com o estado
+    print(f"📊 Processos reconhecidos na planilha: {len(existing_dates)}")
+
+    # 4. Abre os arquivos locais de apoio (cada um é opcional: se falhar, o pipeline segue sem ele)
+    # O cache de extração devolve os campos já extraídos deste mesmo conteúdo (refresh_extraction_cache=True ignora)
+    try:
+        extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH)
+        versions = field_versions()
+    except Exception as e:
+        print(f"⚠️ Cache de extração indisponível ({e}). Extraindo tudo.")
+        extraction_cache, versions = None, {}
+    # O manifesto decide o pulo só com stat + Drive, sem abrir nem reler o PDF
+    try:
+        manifest = SkipManifest(MANIFEST_PATH)
+    except Exception as e:
+        print(f"⚠️ Manifesto indisponível ({e}). A checagem de data vai abrir os PDFs.")
+        manifest = None
+    try:
+        status_cache = StatusCache(STATUS_CACHE_PATH)
+    except Exception as e:
+        print(f"⚠️ Cache de status indisponível ({e}). Consultando tudo no portal.")
+        status_cache = None
+    # O checkpoint guarda o que já foi gravado na planilha; resume=False começa do zero
+    checkpoint = None
+    if resume:
+        try:
+            checkpoint = RunCheckpoint(CHECKPOINT_PATH)
+            assinatura = json.dumps({"pdf_dir": pdf_dir, "force_update": force_update,
+                                     "refresh_extraction_cache": refresh_extraction_cache}, sort_keys=True)
+            if checkpoint.begin(assinatura):
+                print("↩️ Retomando execução interrompida a partir do último lote gravado.")
+        except Exception as e:
+            print(f"⚠️ Checkpoint indisponível ({e}). A execução não poderá ser retomada.")
+            checkpoint = None
+    # Log de mudanças de status/penalidade: gravado junto com o lote, para o consumo incremental
+    try:
+        eventos = StatusEventLog(EVENT_LOG_PATH)
+    except Exception as e:
+        print(f"⚠️ Log de eventos indisponível ({e}). As mudanças desta execução não serão registradas.")
+        eventos = None
+    stores = [s for s in (extraction_cache, manifest, status_cache, checkpoint, tabela, eventos) if s is not None]
+    # Pool de extração antes da cópia local: os workers nascem (fork) sem nenhuma thread de cópia rodando
+    pool = ExtractionPool(workers) if workers > 1 else None
+    # Leitura antecipada: os PDFs a ler são copiados da montagem do Drive para o disco local em segundo plano
+    prefetcher = None
+    if prefetch:
+        try:
+            prefetcher = PdfPrefetcher()
+        except Exception as e:
+            print(f"⚠️ Cópia local dos PDFs indisponível ({e}). Lendo direto da pasta.")
+    if pool is not None: pool.prefetcher = prefetcher   # se um worker morrer, o pool novo nasce com a cópia pausada
+    # Um disjuntor e um orçamento de consultas para a execução toda: se o portal cair, os lotes seguintes não
+    # esperam o timeout de novo; force_refresh_status=True trata todo status do cache como vencido
+    scheduler = StatusScheduler(status_cache, status_budget, CircuitBreaker(), force_refresh_status)
+
+    # 5. Versões repetidas do mesmo processo (re-downloads, volumes): só a mais nova de cada grupo é lida
+    contadores = {}
+    with METRICS.timer("etapa.duplicados"):
+        pdfs_unicos, duplicados = dedupe_pdf_versions(pdfs_locais, pdf_dir, drive_files, manifest, force_update,
+                                                      prefetcher)
+    if duplicados:
+        contadores["duplicados"] = len(pdfs_locais) - len(pdfs_unicos)
+        for g in duplicados: METRICS.record("duplicados", g)
+        print(f"🗂️ Versões repetidas: {len(duplicados)} processos com mais de um PDF; "
+              f"{contadores['duplicados']} versões antigas não serão lidas")
+        for g in duplicados[:5]:
+            print(f"   {g['proa']}: fica {g['escolhido']} (ignorados: {', '.join(g['ignorados'])})")
+
+    # 6. Extração em fluxo: a cada `batch_size` arquivos, grava o lote na planilha e faz o checkpoint
+    t_total = time.perf_counter()
+    tarefas = _plan_tasks(pdfs_unicos, pdf_dir, existing_dates, drive_files, force_update, extraction_cache,
+                          versions, manifest, checkpoint, refresh_extraction_cache, contadores, prefetcher)
+    lote, vistos = [], []
+    try:
+        for t, row in iter_extracted_rows(tarefas, force_update, workers, extraction_cache, versions,
+                                          manifest, batch_size, contadores, prefetcher, pool):
+            vistos.append(t)
+            if row is not None: lote.append((t["fname"], row))
+            if len(vistos) < batch_size: continue
+            if lote:
+                df, df_snapshot = _flush_to_sheet(ws, df, df_snapshot, lote, name_to_link, scheduler, write_mode,
+                                                  tabela=tabela, eventos=eventos)
+            # Só depois da planilha gravada: manifesto, caches e checkpoint passam a valer
+            if checkpoint is not None: checkpoint.mark_done(vistos)
+            for s in stores: s.commit()
+            lote, vistos = [], []
+
+        if contadores.get("retomados"):
+            print(f"↩️ Já gravados antes da interrupção: {contadores['retomados']}")
+        if contadores.get("manifesto"):
+            print(f"📒 Pulados pelo manifesto (sem abrir o PDF): {contadores['manifesto']}")
+        if contadores.get("quarentena") or contadores.get("pulados_quarentena"):
+            print(f"🚧 Quarentena: {contadores.get('quarentena', 0)} novos, {contadores.get('pulados_quarentena', 0)} pulados "
+                  f"(acima de {PDF_TEMPO_MAX_SEG:g}s; force_update=True tenta de novo)")
+        print(f"⏱️ PDFs extraídos: {contadores.get('extraidos', 0)} ({contadores.get('cache', 0)} direto do cache) "
+              f"em {time.perf_counter() - t_total:.2f}s")
+        copia = {k.rsplit(".", 1)[-1]: v for k, v in METRICS.contadores.items() if k.startswith("pdf.copia_local.")}
+        if prefetcher is not None and (copia.get("acertos") or copia.get("faltas")):
+            print(f"📥 Cópia local: {copia.get('acertos', 0)} leituras do disco local, {copia.get('faltas', 0)} direto "
+                  f"da pasta, {copia.get('bytes', 0) / 1e6:.1f} MB copiados, "
+                  f"{sum(METRICS.tempos.get('pdf.copia_local.espera', [])):.2f}s esperando cópia")
+
+        # 7. Último lote + finalização (sempre grava, mesmo sem linhas novas: hyperlinks e limpeza)
+        df, df_snapshot = _flush_to_sheet(ws, df, df_snapshot, lote, name_to_link, scheduler, write_mode,
+                                          final=True, tabela=tabela, eventos=eventos)
+        if METRICS.contadores.get("eventos.registrados"):
+            print(f"🔔 Mudanças de status/penalidade registradas: {METRICS.contadores['eventos.registrados']}")
+        if checkpoint is not None: checkpoint.finish()
+
+        # 8. Resumo agregado para o painel (o painel lê só ele, não varre a tabela)
+        with METRICS.timer("etapa.resumo"):
+            write_portfolio_summary(summarize_portfolio(df))
+    finally:
+        if prefetcher is not None: prefetcher.close()
+        if pool is not None: pool.close()
+        for s in stores: s.close()
+        # Relatório de desempenho (também numa execução que caiu no meio: mostra até onde foi)
+        METRICS.inc("arquivos.pdfs_na_pasta", len(pdfs_locais))
+        for nome, valor in contadores.items(): METRICS.inc(f"arquivos.{nome}", valor)
+        METRICS.observe("etapa.total", time.perf_counter() - t_execucao)
+        METRICS.write()
     print("Sucesso! ✅")
-    return df
\ No newline at end of file
+    return df
+
+# ==========================
+# LINHA DE COMANDO (servidor / cron)
+# ==========================
+_MODULOS_PESADOS = ("pandas", "numpy", "fitz", "pymupdf", "bs4", "requests", "gspread", "gspread_dataframe",
+                    "googleapiclient", "google.auth")
+
+def startup_report() -> dict:
+    """Tempo de import deste módulo e quais dependências pesadas já estão carregadas (o ideal na partida: nenhuma)."""
+    return {"import_ms": round((_T_IMPORT_FIM - _T_IMPORT_INICIO) * 1000, 2),
+            "partida_ms": round((time.perf_counter() - _T_IMPORT_INICIO) * 1000, 2),
+            "modulos_pesados_carregados": [m for m in _MODULOS_PESADOS if m in sys.modules]}
+
+def cli(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(prog="main.py", description="Lê os PDFs do Processo Notificatório, consulta o PROA e atualiza a planilha.")
+    parser.add_argument("--credentials", help="JSON da conta de serviço (sem ele: Application Default Credentials)")
+    parser.add_argument("--pdf-dir", help=f"pasta dos PDFs (padrão: {PDF_DIR})")
+    parser.add_argument("--cache-dir", help="pasta dos caches, manifesto, checkpoint e relatórios")
+    parser.add_argument("--sheet", help=f"nome da planilha (padrão: {GSHEET_NAME})")
+    parser.add_argument("--worksheet", help=f"nome da aba (padrão: {GSHEET_WORKSHEET_NAME})")
+    parser.add_argument("--folder-id", help="ID da pasta de PDFs no Drive")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS, help="processos de extração (1 = sequencial)")
+    parser.add_argument("--batch-size", type=int, default=SHEET_FLUSH_BATCH, help="PDFs por lote gravado na planilha")
+    parser.add_argument("--write-mode", choices=("diff", "full"), default=SHEET_WRITE_MODE)
+    parser.add_argument("--read-mode", choices=("local", "sheet"), default=SHEET_READ_MODE,
+                        help="de onde vem o estado: tabela local ou a aba inteira")
+    parser.add_argument("--sync-from-sheet", action="store_true", help="relê a aba inteira e renova a tabela local")
+    parser.add_argument("--force-update", action="store_true", help="relê todos os PDFs")
+    parser.add_argument("--force-refresh-status", action="store_true", help="ignora o cache de status")
+    parser.add_argument("--status-budget", type=int, default=STATUS_REFRESH_BUDGET,
+                        help="máximo de consultas ao portal nesta execução (negativo = sem limite)")
+    parser.add_argument("--refresh-extraction-cache", action="store_true", help="ignora o cache de extração")
+    parser.add_argument("--full-drive-sync", action="store_true", help="relista a pasta inteira do Drive")
+    parser.add_argument("--no-resume", action="store_true", help="ignora o checkpoint de execução interrompida")
+    parser.add_argument("--prefetch-dir", help=f"pasta local das cópias dos PDFs (padrão: {PDF_PREFETCH_DIR})")
+    parser.add_argument("--no-prefetch", action="store_true", help="lê os PDFs direto da pasta, sem cópia local")
+    parser.add_argument("--profile-startup", action="store_true", help="mostra o tempo de import/partida e sai")
+    parser.add_argument("--events-since", metavar="DATA", help="lista (JSON por linha) as mudanças desde a data ISO e sai")
+    parser.add_argument("--events-cursor", type=int, metavar="ID", help="lista as mudanças com id maior que ID e sai")
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        print(json.dumps(startup_report(), ensure_ascii=False))
+        return 0
+
+    configure(cache_dir=args.cache_dir, pdf_dir=args.pdf_dir, sheet_name=args.sheet, worksheet=args.worksheet,
+              folder_id=args.folder_id, prefetch_dir=args.prefetch_dir)
+    if args.events_since is not None or args.events_cursor is not None:
+        eventos = status_events_since(args.events_since, args.events_cursor)
+        eventos["registrado_em"] = eventos["registrado_em"].astype(str)
+        for evento in eventos.to_dict("records"): print(json.dumps(evento, ensure_ascii=False))
+        return 0
+    try:
+        connect_google(credentials_file=args.credentials)
+        process_all_pdfs(gc, force_update=args.force_update, workers=args.workers,
+                         force_refresh_status=args.force_refresh_status,
+                         refresh_extraction_cache=args.refresh_extraction_cache, write_mode=args.write_mode,
+                         full_drive_sync=args.full_drive_sync, batch_size=args.batch_size, resume=not args.no_resume,
+                         read_mode=args.read_mode, sync_from_sheet=args.sync_from_sheet,
+                         status_budget=args.status_budget if args.status_budget >= 0 else None,
+                         prefetch=not args.no_prefetch)
+    except Exception as e:
+        print(f"❌ Falha na execução: {e}")
+        return 1
+    return 0
+
+_T_IMPORT_FIM = time.perf_counter()
+
+# Em notebook (Colab/Jupyter) a célula só define as funções; pela linha de comando roda o pipeline
+if __name__ == "__main__" and "ipykernel" not in sys.modules:
+    sys.exit(cli())